@@ -0,0 +1,123 @@
+"""Compare the single-decode output parser with the old extract/loads/validate path.
+
+    python benchmarks/bench_parse.py [--log logs/turns.jsonl] [--number 2000]
+
+Samples come from tests/test_schema_validator_ollama_outputs.py, mock provider
+turns, and the raw_output field of any turn logs given with --log.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import sys
+import timeit
+from contextlib import suppress
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from pydantic import ValidationError
+
+from cbse.engine.llm import MockProvider
+from cbse.engine.models import LLMOutput
+from cbse.engine.schema_validator import SchemaError, SchemaValidator
+
+
+def legacy_parse(text: str) -> LLMOutput | None:
+    # The pre-single-decode pipeline: find/rfind slice, json.loads, model_validate,
+    # and a second extract + json.loads for coerce when validation fails.
+    def extract(raw: str) -> str:
+        raw = raw.strip()
+        if raw.startswith("{") and raw.endswith("}"):
+            return raw
+        start, end = raw.find("{"), raw.rfind("}")
+        if start != -1 and end > start:
+            return raw[start : end + 1]
+        raise SchemaError("No JSON object found")
+
+    try:
+        try:
+            return LLMOutput.model_validate(json.loads(extract(text)))
+        except (json.JSONDecodeError, ValidationError, SchemaError) as exc:
+            raise SchemaError(str(exc)) from exc
+    except SchemaError:
+        with suppress(ValueError, SchemaError):
+            json.loads(extract(text))
+        return None
+
+
+def current_parse(validator: SchemaValidator, text: str) -> LLMOutput | None:
+    try:
+        return validator.parse(text)
+    except SchemaError:
+        with suppress(ValueError, SchemaError):
+            validator.decode(text).data()
+        return None
+
+
+def load_samples(log_paths: list[Path]) -> dict[str, list[str]]:
+    spec = importlib.util.spec_from_file_location(
+        "ollama_outputs", ROOT / "tests" / "test_schema_validator_ollama_outputs.py"
+    )
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    invalid = [
+        value for name, value in vars(module).items() if name.startswith(("INVALID_", "VALID_"))
+    ]
+
+    mock = MockProvider({"clues", "location", "time"}, ["码头", "酒吧"])
+    valid = [mock.complete([{"role": "user", "content": "go"}]) for _ in range(20)]
+    prose = [
+        f"Here is the next turn:\n```json\n{text}\n```\nLet me know {{if}} you need more."
+        for text in valid
+    ]
+
+    logged: list[str] = []
+    for path in log_paths:
+        for line in path.read_text(encoding="utf-8").splitlines():
+            raw = json.loads(line).get("raw_output")
+            if isinstance(raw, str) and raw:
+                logged.append(raw)
+    samples = {"valid": valid, "with_prose": prose, "test_outputs": invalid}
+    if logged:
+        samples["logged"] = logged
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--log", action="append", default=[], help="turns.jsonl file(s) with raw_output"
+    )
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    samples = load_samples([Path(p) for p in args.log])
+    print(
+        f"{'samples':<14}{'n':>5}{'legacy us':>12}{'current us':>12}{'speedup':>9}"
+        f"{'legacy ok':>11}{'current ok':>12}"
+    )
+    for name, texts in samples.items():
+        validator = SchemaValidator()
+        legacy = timeit.timeit(
+            lambda texts=texts: [legacy_parse(t) for t in texts], number=args.number
+        )
+        current = timeit.timeit(
+            lambda texts=texts, validator=validator: [current_parse(validator, t) for t in texts],
+            number=args.number,
+        )
+        per = args.number * len(texts)
+        legacy_ok = sum(legacy_parse(t) is not None for t in texts)
+        current_ok = sum(current_parse(validator, t) is not None for t in texts)
+        print(
+            f"{name:<14}{len(texts):>5}{legacy / per * 1e6:>12.1f}{current / per * 1e6:>12.1f}"
+            f"{legacy / current:>8.2f}x{legacy_ok:>11}{current_ok:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
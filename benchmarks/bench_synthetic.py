@@ -0,0 +1,70 @@
+"""Measure how many turns per second the synthetic provider sustains per game.
+
+    python benchmarks/bench_synthetic.py [--turns 20000] [--ending win|lose]
+                                         [--bias 0.5] [--seed 0] [--game id ...]
+
+Each game is played by SyntheticProvider on its own copy of the state: every
+turn is generated, serialised to JSON and applied through the rules engine,
+and the game starts over whenever it reaches an ending. "generate" is the
+same provider reading a fixed state, i.e. the cost of the provider alone.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from pydantic import ValidationError
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from cbse.engine.content_loader import ContentLoader
+from cbse.engine.llm import SyntheticProvider
+
+MESSAGES = [{"role": "user", "content": "continue"}]
+
+
+def _rate(provider: SyntheticProvider, turns: int) -> float:
+    started = time.perf_counter()
+    for _ in range(turns):
+        provider.complete(MESSAGES)
+    return turns / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20000)
+    parser.add_argument("--ending", choices=("win", "lose"))
+    parser.add_argument("--bias", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--game", action="append", default=[])
+    args = parser.parse_args()
+
+    loader = ContentLoader(ROOT / "games")
+    games = args.game or sorted(path.parent.name for path in (ROOT / "games").glob("*/game.yaml"))
+    print(f"{'game':<18}{'turns/s':>10}{'generate/s':>12}{'rejected':>10}{'win':>7}{'lose':>7}")
+    for game_id in games:
+        try:
+            content = loader.load_game(game_id)
+        except ValidationError as exc:
+            print(f"{game_id:<18}skipped: {type(exc).__name__}")
+            continue
+        options = {"seed": args.seed, "ending": args.ending, "bias": args.bias}
+        played = SyntheticProvider(content.definition, content.triggers, **options)
+        rate = _rate(played, args.turns)
+        initial = content.definition.initial_state
+        generated = SyntheticProvider(
+            content.definition, content.triggers, state=lambda state=initial: state, **options
+        )
+        stats = played.stats()
+        print(
+            f"{game_id:<18}{rate:>10.0f}{_rate(generated, args.turns):>12.0f}"
+            f"{stats.get('rejected', 0):>10}{stats.get('win', 0):>7}{stats.get('lose', 0):>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
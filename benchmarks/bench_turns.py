@@ -0,0 +1,137 @@
+"""Measure end-to-end turn latency and recovery cost under injected LLM faults.
+
+    python benchmarks/bench_turns.py [--turns 20] [--game mist_harbor] [--seed 0]
+                                     [--scenario name=spec ...]
+
+Every scenario plays the same number of turns in the headless app against the
+mock provider wrapped in FaultInjectingClient (CBSE_LLM_FAULTS=spec), so the
+numbers need no model or network. Latency is wall time from submitting a choice
+until the app is idle again; recovery cost is the mean extra time per turn over
+the fault-free scenario.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from cbse.engine.app import CardBarApp
+from cbse.engine.budget_controller import percentile
+
+SCENARIOS = {
+    "clean": "",
+    "slow": "latency_ms=400,latency_sigma=0.5,chunk_ms=5",
+    "stalls": "latency_ms=200,stall_rate=0.3,stall_ms=1500",
+    "malformed": "malformed_rate=0.3,truncate_rate=0.15",
+    "invalid_paths": "invalid_path_rate=0.5",
+    "flaky": "error_rate=0.2,timeout_rate=0.05,timeout_s=2",
+}
+
+
+async def _idle(app: CardBarApp, pilot, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while app.turn_job is not None or app.queued_inputs:
+        if time.monotonic() > deadline:
+            raise TimeoutError("turn did not finish")
+        await pilot.pause(0.01)
+
+
+async def play(game_id: str, turns: int, log_dir: Path, spec: str, seed: int) -> list[float]:
+    # A game that ends early is started again, with the next seed, until
+    # enough turns are measured.
+    latencies: list[float] = []
+    while len(latencies) < turns:
+        if spec:
+            os.environ["CBSE_LLM_FAULTS"] = f"{spec},seed={seed}"
+            seed += 1
+        app = CardBarApp(game_id=game_id)
+        app.log_dir = log_dir
+        played = len(latencies)
+        async with app.run_test() as pilot:
+            await _idle(app, pilot)
+            while len(latencies) < turns:
+                history = app.store.history
+                if history and history[-1].end.is_game_over:
+                    break
+                app.query_one("#input").value = str(1 + len(latencies) % 3)
+                started = time.perf_counter()
+                await pilot.press("enter")
+                await _idle(app, pilot)
+                latencies.append((time.perf_counter() - started) * 1000)
+        if len(latencies) == played:
+            break
+    return latencies
+
+
+def run_scenario(spec: str, game_id: str, turns: int, seed: int) -> dict[str, float]:
+    os.environ["CBSE_LLM_PROVIDER"] = "mock"
+    for name in ("CBSE_LLM_CACHE", "CBSE_SPECULATE", "CBSE_LLM_ROUTES", "CBSE_CASSETTE"):
+        os.environ.pop(name, None)
+    os.environ.pop("CBSE_LLM_FAULTS", None)
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = Path(tmp)
+        latencies = asyncio.run(play(game_id, turns, log_dir, spec, seed))
+        log = log_dir / "turns.jsonl"
+        lines = log.read_text(encoding="utf-8").splitlines() if log.exists() else []
+        logged = [json.loads(line) for line in lines]
+    count = max(1, len(logged))
+    return {
+        "turns": len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": sum(latencies) / max(1, len(latencies)),
+        "attempts": sum(entry["attempts"] for entry in logged) / count,
+        "local": sum(entry["repaired_locally"] for entry in logged) / count,
+        "fallback": sum(entry["used_fallback"] for entry in logged) / count,
+        "rejected": sum(len(entry["rejected_updates"]) for entry in logged),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--game", default="mist_harbor")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        default=[],
+        help="name=spec, e.g. slow=latency_ms=800,latency_sigma=0.6 (repeatable)",
+    )
+    args = parser.parse_args()
+
+    scenarios = dict(SCENARIOS)
+    if args.scenario:
+        scenarios = {"clean": ""}
+        for item in args.scenario:
+            name, _, spec = item.partition("=")
+            scenarios[name] = spec
+
+    print(
+        f"{'scenario':<14}{'turns':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'attempts':>10}{'local':>8}{'fallback':>10}{'rejected':>10}{'cost ms':>9}"
+    )
+    baseline: float | None = None
+    for name, spec in scenarios.items():
+        stats = run_scenario(spec, args.game, args.turns, args.seed)
+        if baseline is None:
+            baseline = stats["mean"]
+        print(
+            f"{name:<14}{stats['turns']:>6}{stats['p50']:>9.0f}{stats['p95']:>9.0f}"
+            f"{stats['p99']:>9.0f}{stats['attempts']:>10.2f}{stats['local']:>8.0%}"
+            f"{stats['fallback']:>10.0%}{stats['rejected']:>10}{stats['mean'] - baseline:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
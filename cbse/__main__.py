@@ -1,4 +1,16 @@
-from cbse.engine.app import main
+import sys
+
+
+def main() -> None:
+    # `cbse run ...` plays replay files headless and never imports Textual;
+    # everything else opens the TUI.
+    if len(sys.argv) > 1 and sys.argv[1] == "run":
+        from cbse.engine.runner import main as run_main
+
+        sys.exit(run_main(sys.argv[2:]))
+    from cbse.engine.app import main as app_main
+
+    app_main()
 
 
 if __name__ == "__main__":
@@ -3,22 +3,36 @@ from __future__ import annotations
 import json
 import os
 import argparse
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from functools import partial
+from http.server import ThreadingHTTPServer
 from pathlib import Path
-from typing import Any
+from typing import Any, ClassVar
 
 from textual.app import App, ComposeResult
 from textual.containers import Horizontal, Vertical
+from textual.timer import Timer
 from textual.widgets import Footer, Input, Markdown, Static
 
-from cbse.engine.content_loader import ContentLoader, GameContent, index_variables
-from cbse.engine.llm import GeminiProvider, MockProvider, OpenAIProvider, OllamaProvider
+from cbse.engine.client_factory import create_client
+from cbse.engine.content_loader import ContentLoader, GameContent
+from cbse.engine.llm import (
+    CASSETTE_MODES,
+    HTTPClientPool,
+    LLMScheduler,
+    MetricsRegistry,
+    PoolConfig,
+    limits_from_env,
+    serve_metrics,
+)
+from cbse.engine.llm.cancel import CancelToken, LLMCancelled
 from cbse.engine.llm_service import LLMResult, LLMService
-from cbse.engine.models import Choice, EndState, Event, TurnRecord
-from cbse.engine.prompt_builder import PromptBuilder, PromptContext
+from cbse.engine.models import Choice, EndState, Event
 from cbse.engine.replay import load_replay_inputs
-from cbse.engine.rules_engine import RulesEngine
-from cbse.engine.save_system import SaveSystem
-from cbse.engine.schema_validator import SchemaValidator
+from cbse.engine.session import GameSession, TurnResult
+from cbse.engine.speculation import SpeculativeGenerator
 from cbse.engine.state_store import StateStore
 from cbse.engine.utils import deep_get
 
@@ -36,6 +50,18 @@ def _format_value(value: Any) -> str:
     return str(value)
 
 
+SPINNER_FRAMES = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
+
+
+@dataclass
+class TurnJob:
+    player_input: str
+    use_last_prompt: bool = False
+    from_replay: bool = False
+    started: float = field(default_factory=time.perf_counter)
+    cancel: CancelToken = field(default_factory=CancelToken)
+
+
 class StatusBarWidget(Static):
     def render_status(self, content: GameContent, store: StateStore) -> None:
         parts: list[str] = []
@@ -104,6 +130,10 @@ class EventsWidget(Static):
 
 
 class CardBarApp(App):
+    # A view over a GameSession: the session owns the game, the app owns
+    # input, rendering and the worker thread that waits on the model.
+    BINDINGS: ClassVar = [("escape", "cancel_turn", "Cancel turn")]
+
     CSS = """
     Screen { layout: vertical; }
     #header { height: 2; content-align: left middle; }
@@ -113,31 +143,61 @@ class CardBarApp(App):
     #story { border: round $accent; padding: 1; height: 1fr; }
     #choices { border: round $accent; padding: 1; height: 12; }
     #events { border: round $accent; padding: 1; height: 6; }
+    #progress { height: 1; color: $accent; }
     #input { height: 3; }
     """
 
-    def __init__(self, replay_file: str | None = None, game_id: str = "mist_harbor") -> None:
+    def __init__(
+        self,
+        replay_file: str | None = None,
+        game_id: str = "mist_harbor",
+        cassette: str | None = None,
+        cassette_mode: str | None = None,
+    ) -> None:
         super().__init__()
         self.base_dir = Path(__file__).resolve().parents[2]
         self.content_loader = ContentLoader(self.base_dir / "games")
-        self.content: GameContent | None = None
-        self.variables_index: dict[str, Any] = {}
-        self.store: StateStore | None = None
-        self.prompt_builder: PromptBuilder | None = None
-        self.rules_engine: RulesEngine | None = None
-        self.validator = SchemaValidator()
-        self.llm_service: LLMService | None = None
-        self.save_system = SaveSystem(self.base_dir / "saves")
+        self.session: GameSession | None = None
+        self.http_pool = HTTPClientPool(PoolConfig.from_env())
+        self.llm_scheduler = LLMScheduler(limits_from_env())
+        # Per-provider LLM counters and latency histograms for Prometheus:
+        # served on CBSE_METRICS_PORT and/or rewritten to CBSE_METRICS_FILE.
+        self.llm_metrics = MetricsRegistry()
+        self.metrics_server: ThreadingHTTPServer | None = None
         self.log_dir = self.base_dir / "logs"
         self.log_dir.mkdir(parents=True, exist_ok=True)
-        self.last_prompt: list[dict[str, str]] | None = None
-        self.last_failed: bool = False
-        self.latest_raw: str = ""
-        self.latest_events: list[Event] = []
         self.replay_file = replay_file
         self.replay_inputs: list[str] = []
         self.replay_active: bool = False
         self.game_id = game_id
+        # A cassette either records every LLM call ("record") or replaces the
+        # provider with the recorded responses ("strict" / "lenient").
+        cassette = cassette or os.getenv("CBSE_CASSETTE")
+        self.cassette = Path(cassette) if cassette else None
+        self.cassette_mode = (cassette_mode or os.getenv("CBSE_CASSETTE_MODE") or "strict").lower()
+        self.stream_enabled = os.getenv("CBSE_STREAM", "1") != "0"
+        self.turn_job: TurnJob | None = None
+        self.queued_inputs: list[str] = []
+        # What a new input does while a turn is generating: "queue" it behind
+        # the current turn, or "supersede" the stale request and run it now.
+        self.inflight_policy = os.getenv("CBSE_INFLIGHT_INPUT", "queue").lower()
+        self._progress_timer: Timer | None = None
+
+    @property
+    def content(self) -> GameContent | None:
+        return self.session.content if self.session else None
+
+    @property
+    def store(self) -> StateStore | None:
+        return self.session.store if self.session else None
+
+    @property
+    def llm_service(self) -> LLMService | None:
+        return self.session.llm_service if self.session else None
+
+    @property
+    def speculator(self) -> SpeculativeGenerator | None:
+        return self.session.speculator if self.session else None
 
     def compose(self) -> ComposeResult:
         yield Static("", id="header")
@@ -148,10 +208,14 @@ class CardBarApp(App):
                 yield Markdown("", id="story")
                 yield ChoicesWidget(id="choices")
                 yield EventsWidget(id="events")
+        yield Static("", id="progress")
         yield Input(placeholder="Enter a number or action...", id="input")
         yield Footer()
 
     def on_mount(self) -> None:
+        metrics_port = os.getenv("CBSE_METRICS_PORT")
+        if metrics_port:
+            self.metrics_server = serve_metrics(self.llm_metrics, int(metrics_port))
         self.load_game(self.game_id)
         self.refresh_ui()
         if self.replay_file:
@@ -159,20 +223,33 @@ class CardBarApp(App):
         else:
             self.call_later(self._auto_start_turn)
 
+    def on_unmount(self) -> None:
+        if self.session:
+            self.session.close()
+        self.http_pool.close()
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+
     def load_game(self, game_id: str) -> None:
         content = self.content_loader.load_game(game_id)
-        self.content = content
-        self.variables_index = index_variables(content.definition.variables)
-        self.store = StateStore(state=content.definition.initial_state)
-        self.store.update_last_state()
-        self.prompt_builder = PromptBuilder(self.variables_index)
-        self.rules_engine = RulesEngine(
-            self.variables_index,
-            content.triggers,
-            content.definition.win_conditions,
-            content.definition.lose_conditions,
+        client = create_client(
+            content,
+            self.http_pool,
+            self.llm_scheduler,
+            cassette=self.cassette,
+            cassette_mode=self.cassette_mode,
+            cache_dir=self.base_dir / ".cache" / "llm",
+        )
+        if self.session:
+            self.session.close()
+        self.session = GameSession(
+            content,
+            client,
+            metrics=self.llm_metrics,
+            log_dir=self.log_dir,
+            save_dir=self.base_dir / "saves",
         )
-        self.llm_service = self._create_llm_service()
+        self.session.start()
         header = self.query_one("#header", Static)
         header.update(f"{content.definition.title} - {content.definition.tone}")
 
@@ -185,43 +262,6 @@ class CardBarApp(App):
         choices = self.query_one("#choices", ChoicesWidget)
         choices.render_choices([])
 
-    def _create_llm_service(self) -> LLMService:
-        assert self.content is not None
-        provider = os.getenv("CBSE_LLM_PROVIDER", "mock").lower()
-        default_model = self.content.definition.llm.recommended_model or "gpt-4.1-mini"
-        model = os.getenv("CBSE_MODEL", default_model)
-        temp = self.content.definition.llm.temperature
-        max_tokens = self.content.definition.llm.max_output_tokens
-
-        if provider == "openai":
-            client = OpenAIProvider(model=model, temperature=temp, max_output_tokens=max_tokens)
-        elif provider == "gemini":
-            client = GeminiProvider(model=model, temperature=temp, max_output_tokens=max_tokens)
-        elif provider == "ollama":
-            model = os.getenv("CBSE_MODEL", "qwen3-vl:2b")
-            num_ctx_env = os.getenv("CBSE_OLLAMA_NUM_CTX")
-            num_ctx = int(num_ctx_env) if num_ctx_env else 4096
-            format_mode = os.getenv("CBSE_OLLAMA_FORMAT") or "json_schema"
-            if self.prompt_builder:
-                self.prompt_builder.compact = True
-                self.prompt_builder.world_max_chars = 1600
-            client = OllamaProvider(
-                model=model,
-                temperature=temp,
-                max_output_tokens=max_tokens,
-                json_schema=self.validator.json_schema(),
-                num_ctx=num_ctx,
-                format_mode=format_mode,
-            )
-        else:
-            locations = []
-            for var in self.content.definition.variables:
-                if var.id == "location" and var.enum_values:
-                    locations = var.enum_values
-            client = MockProvider(set(self.variables_index.keys()), locations)
-
-        return LLMService(client=client, validator=self.validator)
-
     def refresh_ui(self) -> None:
         if not self.content or not self.store:
             return
@@ -239,22 +279,23 @@ class CardBarApp(App):
         if text.startswith("/"):
             self._handle_command(text)
             return
-        if self.last_failed:
+        if self.session and self.session.last_failed:
             self._handle_failure_choice(text)
             return
         self._run_turn(text, from_replay=False)
 
     def _handle_failure_choice(self, text: str) -> None:
-        choice = self._resolve_choice(text)
+        assert self.session is not None
+        choice = self.session.resolve_choice(text)
         if not choice and text.lower() in {"retry", "rollback", "exit"}:
             choice = Choice(id=text.lower(), label=text, hint="", risk="low", tags=["system"])
         if not choice:
             return
-        if choice.id == "retry" and self.last_prompt:
+        if choice.id == "retry" and self.session.last_prompt:
             self._run_turn("retry", use_last_prompt=True)
             return
         if choice.id == "rollback":
-            self.last_failed = False
+            self.session.last_failed = False
             return
         if choice.id == "exit":
             self.exit()
@@ -267,9 +308,16 @@ class CardBarApp(App):
             return
         if command == "/help":
             self._show_system_message(
-                "Commands: /save <name>, /load <name>, /replay <path>, /replay stop, /quit, /help"
+                "Commands: /save <name>, /load <name>, /replay <path>, /replay stop, "
+                "/cancel, /quit, /help"
             )
             return
+        if command == "/cancel":
+            if not self._cancel_turn():
+                self._show_system_message("No turn in progress")
+                return
+            self._show_system_message("Turn cancelled")
+            return
         if command == "/save" and len(parts) >= 2:
             name = parts[1]
             self._save_game(name)
@@ -288,23 +336,22 @@ class CardBarApp(App):
         self._show_system_message("Unknown command")
 
     def _save_game(self, name: str) -> None:
-        if not self.content or not self.store:
+        if not self.session:
             return
-        self.save_system.save(name, self.store, self.content.definition.game_id, self.content.definition.version)
+        self.session.save(name)
         self._show_system_message(f"Saved: {name}")
 
     def _load_game(self, name: str) -> None:
-        if not self.content:
+        if not self.session:
             return
-        save = self.save_system.load(name)
-        if save.game_id != self.content.definition.game_id:
-            self._show_system_message("Save game_id mismatch")
+        if self.turn_job is not None:
+            self._show_system_message("Cannot load while a turn is in progress")
+            return
+        try:
+            self.session.load(name)
+        except (FileNotFoundError, ValueError) as exc:
+            self._show_system_message(str(exc))
             return
-        self.store = StateStore(state=save.state)
-        self.store.history = save.history
-        self.store.memory_summary = save.memory_summary
-        self.store.triggered_triggers = set(save.triggered_triggers)
-        self.store.update_last_state()
         self.refresh_ui()
         self._show_system_message(f"Loaded: {name}")
 
@@ -312,86 +359,160 @@ class CardBarApp(App):
         story = self.query_one("#story", Markdown)
         story.update(f"**System**: {message}")
 
-    def _resolve_choice(self, text: str) -> Choice | None:
-        if not self.store:
-            return None
-        if text.isdigit():
-            idx = int(text) - 1
-            if 0 <= idx < len(self.store.last_choices):
-                return self.store.last_choices[idx]
-        return None
-
-    def _run_turn(self, text: str, use_last_prompt: bool = False, from_replay: bool = False) -> None:
-        assert self.content is not None
-        assert self.store is not None
-        assert self.prompt_builder is not None
-        assert self.rules_engine is not None
-        assert self.llm_service is not None
+    def _run_turn(
+        self, text: str, use_last_prompt: bool = False, from_replay: bool = False
+    ) -> None:
+        assert self.session is not None
 
         if self.replay_active and not from_replay:
             self._stop_replay()
 
-        self.store.update_last_state()
-        choice = self._resolve_choice(text)
-        player_input = choice.label if choice else text
+        player_input = self.session.resolve_input(text)
 
-        if use_last_prompt and self.last_prompt:
-            messages = self.last_prompt
-        else:
-            ctx = PromptContext(
-                game=self.content.definition,
-                world_markdown=self.content.world_markdown,
-                memory_summary=self.store.memory_summary,
-                state=self.store.state,
-                recent_turns=self.store.history[-4:],
-                player_input=player_input,
-                last_choices=self.store.last_choices,
-            )
-            messages = self.prompt_builder.build_messages(ctx)
-            self.last_prompt = messages
-
-        result = self.llm_service.generate(messages)
-        self.latest_raw = result.raw
-        output = result.output
-
-        rules = self.rules_engine.apply(self.store.state, output.state_updates, self.store.triggered_triggers)
-        self.store.state = rules.state
-        self.store.triggered_triggers = rules.triggered_triggers
-        self.store.compute_deltas()
-        self.last_failed = result.used_fallback
-
-        events = output.events + rules.events
-        end = rules.end if rules.end.is_game_over else output.end
-
-        turn = TurnRecord(
-            turn_index=len(self.store.history) + 1,
-            player_input=player_input,
-            narrative_markdown=output.narrative_markdown,
-            choices=output.choices,
-            applied_updates=rules.applied_updates,
-            rejected_updates=rules.rejected_updates,
-            events=events,
-            end=end,
+        if self.turn_job is not None:
+            if self.inflight_policy == "supersede" and not from_replay:
+                self._cancel_turn()
+            else:
+                # Choices are resolved now, against the choices the player was looking at.
+                self.queued_inputs.append(player_input)
+                self._tick_progress()
+                return
+
+        job = TurnJob(
+            player_input=player_input, use_last_prompt=use_last_prompt, from_replay=from_replay
+        )
+        self.turn_job = job
+        self._set_busy(True)
+        self.run_worker(
+            partial(self._turn_worker, job), thread=True, group="turn", exit_on_error=False
         )
-        self.store.history.append(turn)
-        self.store.last_choices = output.choices
-        self._update_memory_summary()
 
-        self._update_turn_view(output.narrative_markdown, output.choices, events, end)
+    def _turn_worker(self, job: TurnJob) -> None:
+        # Runs on a worker thread: only prompt building and the LLM call happen
+        # here. Game state is mutated on the UI thread in _finish_turn.
+        session = self.session
+        assert session is not None
+        try:
+            messages = session.build_messages(job.player_input, job.use_last_prompt)
+            on_narrative = self._stream_callback(job) if self.stream_enabled else None
+            result, latency_ms, speculative = session.generate(
+                messages, cancel=job.cancel, on_narrative=on_narrative
+            )
+        except LLMCancelled:
+            return
+        except Exception as exc:
+            self._call_ui(self._abort_turn, job, f"Turn failed: {exc}")
+            return
+        turn = self._call_ui(self._finish_turn, job, messages, result, latency_ms, speculative)
+        if turn is not None:
+            session.log(turn)
+
+    def _call_ui(self, callback: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return self.call_from_thread(callback, *args)
+        except RuntimeError:
+            # The app is shutting down; there is no UI left to update.
+            return None
+
+    def _stream_callback(self, job: TurnJob) -> Callable[[str], None]:
+        last_render = 0.0
+
+        def on_narrative(narrative: str) -> None:
+            nonlocal last_render
+            # Re-rendering Markdown per token is wasteful; ~20 updates a second is plenty.
+            now = time.perf_counter()
+            if now - last_render < 0.05:
+                return
+            last_render = now
+            self._call_ui(self._show_partial_narrative, job, narrative)
+
+        return on_narrative
+
+    def _finish_turn(
+        self,
+        job: TurnJob,
+        messages: list[dict[str, str]],
+        result: LLMResult,
+        latency_ms: float,
+        speculative: bool,
+    ) -> TurnResult | None:
+        assert self.session is not None
+        if job is not self.turn_job:
+            return None
+        self.turn_job = None
+        self._set_busy(False)
+        turn = self.session.apply(job.player_input, messages, result, latency_ms, speculative)
+        record = turn.turn
+
+        self._update_turn_view(record.narrative_markdown, record.choices, record.events, record.end)
         self.refresh_ui()
-        self._log_turn(messages, result, turn)
 
-        if end.is_game_over:
-            self._show_system_message(f"Game Over: {end.reason}")
+        if record.end.is_game_over:
+            self._show_system_message(f"Game Over: {record.end.reason}")
             self._stop_replay()
-            return
-
-        if self.last_failed:
+            self.queued_inputs.clear()
+        elif self.session.last_failed:
             self._stop_replay()
+            self.queued_inputs.clear()
+        elif self.replay_active:
+            self.call_later(self._advance_replay)
+        elif self.queued_inputs:
+            self.call_later(self._run_turn, self.queued_inputs.pop(0))
+        else:
+            self.session.speculate(record.choices)
+        return turn
+
+    def _abort_turn(self, job: TurnJob, message: str) -> None:
+        if job is not self.turn_job:
             return
+        self.turn_job = None
+        self.queued_inputs.clear()
+        self._set_busy(False)
+        self._stop_replay()
+        self._show_system_message(message)
+
+    def action_cancel_turn(self) -> None:
+        if self._cancel_turn():
+            self._show_system_message("Turn cancelled")
+
+    def _cancel_turn(self) -> bool:
+        # Nothing has touched the session yet: state is only applied in
+        # _finish_turn, which ignores jobs that are no longer current.
+        job = self.turn_job
+        if job is None:
+            return False
+        job.cancel.cancel()
+        self.turn_job = None
+        self.queued_inputs.clear()
+        self._set_busy(False)
+        self._stop_replay()
+        return True
+
+    def _set_busy(self, busy: bool) -> None:
+        if self._progress_timer is not None:
+            self._progress_timer.stop()
+            self._progress_timer = None
+        if busy:
+            self._progress_timer = self.set_interval(0.1, self._tick_progress)
+            self._tick_progress()
+        else:
+            self.query_one("#progress", Static).update("")
 
-        if self.replay_active:
-            self.call_later(self._advance_replay)
+    def _tick_progress(self) -> None:
+        job = self.turn_job
+        if job is None:
+            return
+        elapsed = time.perf_counter() - job.started
+        frame = SPINNER_FRAMES[int(elapsed * 10) % len(SPINNER_FRAMES)]
+        text = f"{frame} Generating... {elapsed:.1f}s"
+        if self.queued_inputs:
+            text += f"  (queued: {len(self.queued_inputs)})"
+        self.query_one("#progress", Static).update(text)
+
+    def _show_partial_narrative(self, job: TurnJob, narrative: str) -> None:
+        if job is not self.turn_job:
+            return
+        self.query_one("#story", Markdown).update(narrative)
 
     def _update_turn_view(
         self,
@@ -407,35 +528,11 @@ class CardBarApp(App):
         events_widget = self.query_one("#events", EventsWidget)
         events_widget.render_events(events)
 
-    def _update_memory_summary(self) -> None:
-        if not self.store:
-            return
-        if len(self.store.history) % 5 != 0:
-            return
-        recent = self.store.history[-5:]
-        snippets = []
-        for turn in recent:
-            snippet = turn.narrative_markdown.strip().replace("\n", " ")
-            snippets.append(snippet[:120])
-        self.store.memory_summary = " | ".join(snippets)[:600]
-
-    def _log_turn(self, messages: list[dict[str, str]], result: LLMResult, turn: TurnRecord) -> None:
-        payload = {
-            "turn_index": turn.turn_index,
-            "player_input": turn.player_input,
-            "prompt": messages,
-            "raw_output": result.raw,
-            "used_fallback": result.used_fallback,
-            "applied_updates": [u.model_dump() for u in turn.applied_updates],
-            "rejected_updates": [u.model_dump() for u in turn.rejected_updates],
-            "events": [e.model_dump() for e in turn.events],
-            "end": turn.end.model_dump(),
-        }
-        path = self.log_dir / "turns.jsonl"
-        with path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
-
     def _start_replay(self, path_text: str) -> None:
+        # Replay inputs would interleave with the in-flight turn and its queue.
+        if self.turn_job is not None:
+            self._show_system_message("Cannot replay while a turn is in progress")
+            return
         path = Path(path_text)
         if not path.exists():
             alt = self.base_dir / path_text
@@ -478,5 +575,19 @@ def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--game", dest="game", default="mist_harbor", help="Game id under games/")
     parser.add_argument("--replay", dest="replay", help="Replay input bag file")
+    parser.add_argument(
+        "--cassette", dest="cassette", help="Record LLM calls to, or play them back from, this file"
+    )
+    parser.add_argument(
+        "--cassette-mode",
+        dest="cassette_mode",
+        choices=CASSETTE_MODES,
+        help="record, or play back with strict (default) or lenient prompt matching",
+    )
     args, _ = parser.parse_known_args()
-    CardBarApp(replay_file=args.replay, game_id=args.game).run()
+    CardBarApp(
+        replay_file=args.replay,
+        game_id=args.game,
+        cassette=args.cassette,
+        cassette_mode=args.cassette_mode,
+    ).run()
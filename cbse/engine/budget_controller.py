@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+from dataclasses import asdict, dataclass, replace
+from typing import Any
+
+from cbse.engine.llm.base import providers
+from cbse.engine.prompt_builder import PromptBuilder
+
+
+@dataclass(frozen=True)
+class PromptBudget:
+    compact: bool
+    world_max_chars: int | None
+    recent_turns: int
+    full_text_turns: int
+    num_ctx: int
+
+
+# Ordered from the richest context to the leanest.
+BUDGET_LEVELS: list[PromptBudget] = [
+    PromptBudget(
+        compact=False, world_max_chars=None, recent_turns=4, full_text_turns=1, num_ctx=8192
+    ),
+    PromptBudget(
+        compact=True, world_max_chars=3200, recent_turns=4, full_text_turns=1, num_ctx=6144
+    ),
+    PromptBudget(
+        compact=True, world_max_chars=1600, recent_turns=3, full_text_turns=1, num_ctx=4096
+    ),
+    PromptBudget(
+        compact=True, world_max_chars=800, recent_turns=2, full_text_turns=1, num_ctx=3072
+    ),
+    PromptBudget(
+        compact=True, world_max_chars=400, recent_turns=1, full_text_turns=0, num_ctx=2048
+    ),
+]
+
+
+@dataclass
+class TurnSample:
+    prompt_chars: int
+    prompt_tokens: int
+    latency_ms: float
+    attempts: int
+    used_fallback: bool
+
+
+@dataclass
+class BudgetDecision:
+    action: str
+    level: int
+    previous_level: int
+    reason: str
+    p95_ms: float | None
+    repair_rate: float
+    budget: PromptBudget
+
+    def to_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data["budget"] = asdict(self.budget)
+        return data
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(ordered)) - 1
+    return ordered[max(0, min(rank, len(ordered) - 1))]
+
+
+class PromptBudgetController:
+    def __init__(
+        self,
+        target_p95_ms: float,
+        start_level: int = 0,
+        levels: list[PromptBudget] | None = None,
+        window: int = 20,
+        min_samples: int = 5,
+        cooldown: int = 3,
+        max_repair_rate: float = 0.3,
+        expand_ratio: float = 0.6,
+        num_ctx: int | None = None,
+    ) -> None:
+        self.target_p95_ms = target_p95_ms
+        self.levels = levels or BUDGET_LEVELS
+        self.level = max(0, min(start_level, len(self.levels) - 1))
+        self.start_level = self.level
+        self.num_ctx = num_ctx
+        self.samples: deque[TurnSample] = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.max_repair_rate = max_repair_rate
+        self.expand_ratio = expand_ratio
+        self._turns_since_change = 0
+
+    @property
+    def budget(self) -> PromptBudget:
+        return self.levels[self.level]
+
+    def record(self, sample: TurnSample) -> BudgetDecision:
+        self.samples.append(sample)
+        self._turns_since_change += 1
+        latencies = [s.latency_ms for s in self.samples]
+        p95 = percentile(latencies, 95) if len(latencies) >= self.min_samples else None
+        repair_rate = sum(1 for s in self.samples if s.attempts > 1 or s.used_fallback) / len(
+            self.samples
+        )
+        previous = self.level
+
+        # A fallback means the model could not produce valid output at all;
+        # back off immediately rather than waiting for a full window.
+        if sample.used_fallback and self.level < len(self.levels) - 1:
+            return self._change(previous, +1, "fallback", p95, repair_rate)
+        if self._turns_since_change < self.cooldown:
+            return self._decision("hold", previous, "cooldown", p95, repair_rate)
+        if repair_rate > self.max_repair_rate and self.level < len(self.levels) - 1:
+            return self._change(previous, +1, "repairs", p95, repair_rate)
+        if p95 is None:
+            return self._decision("hold", previous, "warming up", p95, repair_rate)
+        if p95 > self.target_p95_ms and self.level < len(self.levels) - 1:
+            return self._change(previous, +1, "p95 over target", p95, repair_rate)
+        if p95 < self.target_p95_ms * self.expand_ratio and repair_rate == 0 and self.level > 0:
+            return self._change(previous, -1, "p95 well under target", p95, repair_rate)
+        return self._decision("hold", previous, "within target", p95, repair_rate)
+
+    def apply(self, builder: PromptBuilder, client: Any = None) -> None:
+        budget = self.budget
+        builder.compact = budget.compact
+        builder.world_max_chars = budget.world_max_chars
+        builder.recent_turns = budget.recent_turns
+        builder.full_text_turns = budget.full_text_turns
+        if client is not None:
+            num_ctx = self.context_size()
+            for provider in providers(client):
+                if getattr(provider, "num_ctx", None) is not None:
+                    provider.num_ctx = num_ctx
+
+    def context_size(self) -> int:
+        if self.num_ctx is None:
+            return self.budget.num_ctx
+        # An explicit context size holds until the controller backs off past
+        # where it started; only then may a leaner tier cap it.
+        if self.level <= self.start_level:
+            return self.num_ctx
+        return min(self.num_ctx, self.budget.num_ctx)
+
+    def _change(
+        self,
+        previous: int,
+        step: int,
+        reason: str,
+        p95: float | None,
+        repair_rate: float,
+    ) -> BudgetDecision:
+        self.level = max(0, min(self.level + step, len(self.levels) - 1))
+        # Samples taken at the old level say nothing about the new one.
+        self.samples.clear()
+        self._turns_since_change = 0
+        action = "shrink" if step > 0 else "expand"
+        return self._decision(action, previous, reason, p95, repair_rate)
+
+    def _decision(
+        self,
+        action: str,
+        previous: int,
+        reason: str,
+        p95: float | None,
+        repair_rate: float,
+    ) -> BudgetDecision:
+        return BudgetDecision(
+            action=action,
+            level=self.level,
+            previous_level=previous,
+            reason=reason,
+            p95_ms=p95,
+            repair_rate=repair_rate,
+            budget=replace(self.budget, num_ctx=self.context_size()),
+        )
+
+
+def level_for(builder: PromptBuilder, levels: list[PromptBudget] | None = None) -> int:
+    levels = levels or BUDGET_LEVELS
+    for idx, budget in enumerate(levels):
+        if budget.compact == builder.compact and budget.world_max_chars == builder.world_max_chars:
+            return idx
+    return 0
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from cbse.engine.content_loader import GameContent, index_variables
+from cbse.engine.llm import (
+    CacheConfig,
+    CachingClient,
+    CassetteClient,
+    CircuitBreaker,
+    FaultConfig,
+    FaultInjectingClient,
+    GeminiProvider,
+    HTTPClientPool,
+    LLMClient,
+    LLMScheduler,
+    MockProvider,
+    OllamaProvider,
+    OpenAIProvider,
+    RecordingClient,
+    ResponseCache,
+    Route,
+    RouterClient,
+    ScheduledClient,
+    SyntheticProvider,
+)
+from cbse.engine.models import LLMRoute
+from cbse.engine.schema_generator import OutputSchemaGenerator
+
+
+def create_client(
+    content: GameContent,
+    pool: HTTPClientPool,
+    scheduler: LLMScheduler,
+    cassette: Path | None = None,
+    cassette_mode: str = "strict",
+    cache_dir: Path | None = None,
+    provider: str | None = None,
+    model: str | None = None,
+) -> LLMClient:
+    # The full wrapper chain for a game, configured from the environment:
+    # provider(s) behind the scheduler, optional router, cassette and cache.
+    if cassette and cassette_mode != "record":
+        client: LLMClient = CassetteClient(cassette, cassette_mode)
+    else:
+        client = create_provider(content, pool, scheduler, provider, model)
+        if cassette:
+            client = RecordingClient(client, cassette)
+
+    if os.getenv("CBSE_LLM_CACHE") == "1":
+        cache = ResponseCache(CacheConfig.from_env(cache_dir or Path(".cache") / "llm"))
+        client = CachingClient(client, cache)
+    return client
+
+
+def create_provider(
+    content: GameContent,
+    pool: HTTPClientPool,
+    scheduler: LLMScheduler,
+    provider: str | None = None,
+    model: str | None = None,
+) -> LLMClient:
+    # An explicit provider wins over CBSE_LLM_PROVIDER and the game's routes.
+    if provider:
+        return build_provider(content, provider.lower(), pool, scheduler, model)
+    routes = llm_routes(content)
+    if not routes:
+        provider = os.getenv("CBSE_LLM_PROVIDER", "mock").lower()
+        return build_provider(content, provider, pool, scheduler, model)
+    failures_env = os.getenv("CBSE_LLM_BREAKER_FAILURES")
+    reset_env = os.getenv("CBSE_LLM_BREAKER_RESET_S")
+    slo_env = os.getenv("CBSE_LLM_SLO_MS")
+    return RouterClient(
+        [
+            Route(
+                client=build_provider(
+                    content, route.provider, pool, scheduler, route.model, route.base_url
+                ),
+                label=f"{route.provider}:{route.model or 'default'}",
+                breaker=CircuitBreaker(
+                    failures=int(failures_env) if failures_env else 3,
+                    reset_after=float(reset_env) if reset_env else 30.0,
+                ),
+            )
+            for route in routes
+        ],
+        slo_ms=float(slo_env) if slo_env else content.definition.llm.slo_ms,
+        hedge=os.getenv("CBSE_LLM_HEDGE") != "0",
+    )
+
+
+def llm_routes(content: GameContent) -> list[LLMRoute]:
+    # CBSE_LLM_ROUTES="ollama:qwen3:1.7b,ollama:qwen3:8b,openai:gpt-4.1-mini"
+    # overrides the game's llm.routes; the model is everything after the
+    # first colon.
+    routes_env = os.getenv("CBSE_LLM_ROUTES")
+    if not routes_env:
+        return content.definition.llm.routes
+    routes = []
+    for item in routes_env.split(","):
+        provider, _, model = item.strip().partition(":")
+        routes.append(LLMRoute(provider=provider.lower(), model=model or None))
+    return routes
+
+
+def build_provider(
+    content: GameContent,
+    provider: str,
+    pool: HTTPClientPool,
+    scheduler: LLMScheduler,
+    model: str | None = None,
+    base_url: str | None = None,
+) -> LLMClient:
+    definition = content.definition
+    default_model = definition.llm.recommended_model or "gpt-4.1-mini"
+    temp = definition.llm.temperature
+    max_tokens = definition.llm.max_output_tokens
+    # Sessions refresh the schema from the live state after every turn.
+    variables = index_variables(definition.variables)
+    schema = OutputSchemaGenerator(variables).schema(definition.initial_state)
+
+    if provider in ("openai", "gemini"):
+        model = model or os.getenv("CBSE_MODEL", default_model)
+    if provider == "openai":
+        client: LLMClient = OpenAIProvider(
+            model=model,
+            temperature=temp,
+            max_output_tokens=max_tokens,
+            base_url=base_url,
+            pool=pool,
+            json_schema=schema,
+        )
+    elif provider == "gemini":
+        client = GeminiProvider(
+            model=model,
+            temperature=temp,
+            max_output_tokens=max_tokens,
+            base_url=base_url,
+            pool=pool,
+            json_schema=schema,
+        )
+    elif provider == "ollama":
+        model = model or os.getenv("CBSE_MODEL", "qwen3-vl:2b")
+        num_ctx_env = os.getenv("CBSE_OLLAMA_NUM_CTX")
+        num_ctx = int(num_ctx_env) if num_ctx_env else 4096
+        format_mode = os.getenv("CBSE_OLLAMA_FORMAT") or "json_schema"
+        client = OllamaProvider(
+            model=model,
+            temperature=temp,
+            max_output_tokens=max_tokens,
+            base_url=base_url,
+            json_schema=schema,
+            num_ctx=num_ctx,
+            format_mode=format_mode,
+            pool=pool,
+        )
+    elif provider == "synthetic":
+        # CBSE_SYNTHETIC_ENDING=win|lose steers the play toward that ending.
+        # A GameSession attaches its live state to the provider.
+        seed_env = os.getenv("CBSE_SYNTHETIC_SEED")
+        bias_env = os.getenv("CBSE_SYNTHETIC_BIAS")
+        client = SyntheticProvider(
+            definition,
+            content.triggers,
+            seed=int(seed_env) if seed_env else 0,
+            ending=os.getenv("CBSE_SYNTHETIC_ENDING") or None,
+            bias=float(bias_env) if bias_env else 0.5,
+        )
+    else:
+        locations = []
+        for var in definition.variables:
+            if var.id == "location" and var.enum_values:
+                locations = var.enum_values
+        client = MockProvider(set(variables.keys()), locations)
+    faults = FaultConfig.from_env()
+    if faults is not None:
+        # CBSE_LLM_FAULTS makes the provider slow or wrong on purpose, below
+        # the router so failover and breakers see the faults too.
+        client = FaultInjectingClient(client, faults)
+    # Turns, repairs, speculation and memory summaries share the endpoint's
+    # slots by priority.
+    return ScheduledClient(client, scheduler)
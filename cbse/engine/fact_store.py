@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+from cbse.engine.models import Fact
+from cbse.engine.utils import estimate_tokens
+
+_WORD = re.compile(r"[a-z0-9_]{2,}")
+_CJK_RUN = re.compile(r"[㐀-鿿豈-﫿]+")
+_TRAILING_PUNCT = "。.!！?？;；,，、 "
+_STOPWORDS = {"the", "a", "an", "and", "or", "of", "to", "in", "on", "at", "is", "was", "are", "it"}
+
+
+def normalize_fact(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = " ".join(text.split())
+    return text.strip(_TRAILING_PUNCT)
+
+
+def fact_id(text: str) -> str:
+    return hashlib.sha1(normalize_fact(text).encode("utf-8")).hexdigest()[:16]
+
+
+def extract_keywords(text: str) -> set[str]:
+    norm = normalize_fact(text)
+    words = {w for w in _WORD.findall(norm) if w not in _STOPWORDS}
+    # CJK text has no word boundaries; character bigrams make names and places
+    # such as 旧电厂 or 林 match without a segmenter.
+    for run in _CJK_RUN.findall(norm):
+        if len(run) == 1:
+            words.add(run)
+        words.update(run[i : i + 2] for i in range(len(run) - 1))
+    return words
+
+
+@dataclass
+class FactStore:
+    facts: dict[str, Fact] = field(default_factory=dict)
+    index: dict[str, set[str]] = field(default_factory=dict)
+
+    def add(self, text: str, turn_index: int) -> Fact | None:
+        text = text.strip()
+        if not normalize_fact(text):
+            return None
+        key = fact_id(text)
+        existing = self.facts.get(key)
+        if existing is not None:
+            existing.last_seen_turn = max(existing.last_seen_turn, turn_index)
+            existing.mentions += 1
+            return existing
+        fact = Fact(id=key, text=text, turn_index=turn_index, last_seen_turn=turn_index)
+        self.facts[key] = fact
+        for word in extract_keywords(text):
+            self.index.setdefault(word, set()).add(key)
+        return fact
+
+    def add_many(self, texts: list[str], turn_index: int) -> list[Fact]:
+        added = []
+        for text in texts:
+            fact = self.add(text, turn_index)
+            if fact is not None:
+                added.append(fact)
+        return added
+
+    def lookup(self, term: str) -> list[Fact]:
+        ids: set[str] | None = None
+        for word in extract_keywords(term):
+            matches = self.index.get(word, set())
+            ids = set(matches) if ids is None else ids & matches
+        if not ids:
+            return []
+        return sorted((self.facts[i] for i in ids), key=lambda f: f.turn_index)
+
+    def relevant(self, query: str, limit: int = 8, token_budget: int = 200) -> list[Fact]:
+        if not self.facts or limit <= 0:
+            return []
+        total = len(self.facts)
+        latest = max(f.last_seen_turn for f in self.facts.values())
+        scores: dict[str, float] = {}
+        for word in extract_keywords(query):
+            matches = self.index.get(word)
+            if not matches:
+                continue
+            idf = math.log(1 + total / len(matches))
+            for key in matches:
+                scores[key] = scores.get(key, 0.0) + idf
+        for key, fact in self.facts.items():
+            # Recency and repetition break ties and fill the list when the query
+            # matches little.
+            recency = 1.0 / (1 + latest - fact.last_seen_turn)
+            scores[key] = scores.get(key, 0.0) + 0.5 * recency + 0.1 * min(fact.mentions, 5)
+
+        ranked = sorted(self.facts.values(), key=lambda f: (-scores[f.id], -f.turn_index))
+        picked: list[Fact] = []
+        used = 0
+        for fact in ranked:
+            cost = estimate_tokens(fact.text) + 2
+            if used + cost > token_budget:
+                continue
+            picked.append(fact)
+            used += cost
+            if len(picked) >= limit:
+                break
+        return sorted(picked, key=lambda f: f.turn_index)
+
+    def snapshot(self) -> list[Fact]:
+        return [fact.model_copy() for fact in self.facts.values()]
+
+    @classmethod
+    def from_facts(cls, facts: list[Fact]) -> FactStore:
+        store = cls()
+        for fact in facts:
+            store.facts[fact.id] = fact.model_copy()
+            for word in extract_keywords(fact.text):
+                store.index.setdefault(word, set()).add(fact.id)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.facts)
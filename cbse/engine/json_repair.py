@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any
+
+_FENCE = re.compile(r"```[a-zA-Z]*\s*(.*?)(?:```|$)", re.DOTALL)
+_LITERALS = {
+    "true": "true",
+    "false": "false",
+    "null": "null",
+    "True": "true",
+    "False": "false",
+    "None": "null",
+}
+_FULLWIDTH = {"：": ":", "，": ",", "｛": "{", "｝": "}", "［": "[", "］": "]"}
+_CLOSERS = {"{": "}", "[": "]"}
+_VALUE_END = (
+    set('"}]') | set("0123456789") | set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+)
+_ESCAPES = set('"\\/bfnrtu')
+_CONTROL = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+def repair_json_text(text: str) -> str:
+    # Mechanical fixes only: code fences, prose around the object, single quotes,
+    # raw newlines and stray inner quotes in strings, Python literals, bare keys,
+    # full-width punctuation, missing/trailing commas and truncated endings.
+    match = _FENCE.search(text)
+    if match:
+        text = match.group(1)
+    start = text.find("{")
+    if start == -1:
+        raise JSONRepairError("No JSON object found")
+    return _Repairer(text[start:]).run()
+
+
+class _Repairer:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.out: list[str] = []
+        self.stack: list[str] = []
+        # (output length, open containers) after each complete member, for
+        # cutting a truncated object back to its last whole value.
+        self.safe: list[tuple[int, tuple[str, ...]]] = []
+
+    def run(self) -> str:
+        text = self.text
+        i = 0
+        while i < len(text):
+            ch = _FULLWIDTH.get(text[i], text[i])
+            if ch in "\"'":
+                i = self._string(i + 1, ch)
+                continue
+            if ch in "{[":
+                self._comma_if_needed()
+                self.stack.append(_CLOSERS[ch])
+                self.out.append(ch)
+            elif ch in "}]":
+                self._drop_trailing_comma()
+                if self.stack:
+                    self.out.append(self.stack.pop())
+                    self._mark_safe()
+                if not self.stack:
+                    # The top-level object is closed; anything after it is chatter.
+                    return "".join(self.out)
+            elif ch == ",":
+                self._mark_safe()
+                if self._last_significant() not in ",{[":
+                    self.out.append(",")
+            elif ch.isalnum() or ch in "-_":
+                i = self._word(i)
+                continue
+            elif ch == ":" or ch.isspace():
+                self.out.append(ch)
+            i += 1
+        return self._close_truncated()
+
+    def _string(self, i: int, quote: str) -> int:
+        text = self.text
+        self._comma_if_needed()
+        self.out.append('"')
+        while i < len(text):
+            ch = text[i]
+            if ch == "\\" and i + 1 < len(text):
+                nxt = text[i + 1]
+                if nxt == "'":
+                    self.out.append("'")
+                elif nxt in _ESCAPES:
+                    self.out.append(text[i : i + 2])
+                else:
+                    self.out.append("\\\\" + nxt)
+                i += 2
+                continue
+            if ch == quote and self._closes_string(i + 1):
+                self.out.append('"')
+                return i + 1
+            if ch == '"':
+                self.out.append('\\"')
+            elif ch in _CONTROL:
+                self.out.append(_CONTROL[ch])
+            elif ord(ch) < 0x20:
+                self.out.append(f"\\u{ord(ch):04x}")
+            else:
+                self.out.append(ch)
+            i += 1
+        # Truncated inside a string: close it and let the caller close the rest.
+        self.out.append('"')
+        return i
+
+    def _closes_string(self, i: int) -> bool:
+        # A double quote only ends the string if JSON punctuation follows;
+        # otherwise it is an unescaped quote inside the text (他说"你好").
+        rest = self.text[i:].lstrip()
+        return not rest or _FULLWIDTH.get(rest[0], rest[0]) in ",:}]"
+
+    def _word(self, i: int) -> int:
+        text = self.text
+        j = i
+        while j < len(text) and (text[j].isalnum() or text[j] in "-_.+"):
+            j += 1
+        word = text[i:j]
+        self._comma_if_needed()
+        if word in _LITERALS:
+            self.out.append(_LITERALS[word])
+        elif _is_number(word):
+            self.out.append(word)
+        else:
+            self.out.append(json.dumps(word, ensure_ascii=False))
+        return j
+
+    def _last_significant(self) -> str:
+        for piece in reversed(self.out):
+            stripped = piece.rstrip()
+            if stripped:
+                return stripped[-1]
+        return ""
+
+    def _comma_if_needed(self) -> None:
+        if self.stack and self._last_significant() in _VALUE_END:
+            self._mark_safe()
+            self.out.append(",")
+
+    def _drop_trailing_comma(self) -> None:
+        for idx in range(len(self.out) - 1, -1, -1):
+            stripped = self.out[idx].strip()
+            if not stripped:
+                continue
+            if stripped == ",":
+                del self.out[idx]
+            return
+
+    def _mark_safe(self) -> None:
+        if self._last_significant() in _VALUE_END:
+            self.safe.append((len(self.out), tuple(self.stack)))
+
+    def _close_truncated(self) -> str:
+        self._drop_trailing_comma()
+        if self._last_significant() == ":":
+            self.out.append("null")
+        candidate = "".join(self.out) + "".join(reversed(self.stack))
+        if _parses(candidate):
+            return candidate
+        # E.g. cut off right after a key: fall back to the last whole member.
+        for length, stack in reversed(self.safe):
+            candidate = "".join(self.out[:length]) + "".join(reversed(stack))
+            if _parses(candidate):
+                return candidate
+        return "".join(self.out) + "".join(reversed(self.stack))
+
+
+def _is_number(word: str) -> bool:
+    try:
+        float(word)
+    except ValueError:
+        return False
+    return word.lower() not in {"nan", "inf", "infinity", "-inf", "-infinity"}
+
+
+def _parses(text: str) -> bool:
+    try:
+        json.loads(text)
+    except ValueError:
+        return False
+    return True
+
+
+_FIELD_ALIASES = {
+    "narrative_markdown": "narrative_markdown",
+    "narrative": "narrative_markdown",
+    "story": "narrative_markdown",
+    "markdown": "narrative_markdown",
+    "choices": "choices",
+    "options": "choices",
+    "actions": "choices",
+    "state_updates": "state_updates",
+    "updates": "state_updates",
+    "state_update": "state_updates",
+    "new_facts": "new_facts",
+    "facts": "new_facts",
+    "events": "events",
+    "end": "end",
+    "ending": "end",
+}
+_RISKS = {"low", "medium", "high"}
+_BOOLEANS = {"true": True, "yes": True, "1": True, "false": False, "no": False, "0": False}
+
+
+def normalize_output(data: Any) -> dict[str, Any]:
+    # Field-level fixes for an object that parsed but does not match LLMOutput:
+    # aliased or mis-cased keys, missing empty lists, string choices/events and
+    # extra keys. Nothing is invented: a missing narrative or too few choices
+    # still fails validation.
+    if not isinstance(data, dict):
+        raise JSONRepairError("Expected a JSON object")
+    fields: dict[str, Any] = {}
+    # Exact field names win over aliases when a model sends both.
+    for key, value in sorted(
+        data.items(), key=lambda item: _canonical(item[0]) not in _FIELD_ALIASES.values()
+    ):
+        name = _FIELD_ALIASES.get(_canonical(key))
+        if name and name not in fields:
+            fields[name] = value
+
+    fields.setdefault("state_updates", [])
+    fields.setdefault("new_facts", [])
+    fields.setdefault("events", [])
+    fields.setdefault("end", {})
+    fields["choices"] = [
+        _choice(item, idx) for idx, item in enumerate(_as_list(fields.get("choices")))
+    ]
+    fields["state_updates"] = [_update(item) for item in _as_list(fields["state_updates"])]
+    fields["new_facts"] = [str(fact) for fact in _as_list(fields["new_facts"]) if fact]
+    fields["events"] = [_event(item) for item in _as_list(fields["events"])]
+    fields["end"] = _end(fields["end"])
+    return fields
+
+
+def parse_bool(value: Any) -> Any:
+    # bool("false") is True; anything unrecognised is left for validation.
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (str, int)):
+        return _BOOLEANS.get(str(value).strip().lower(), value)
+    return value
+
+
+def _canonical(key: Any) -> str:
+    return str(key).strip().lower().replace("-", "_")
+
+
+def _as_list(value: Any) -> list[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _choice(item: Any, idx: int) -> Any:
+    if isinstance(item, str):
+        return {"id": f"choice_{idx + 1}", "label": item, "hint": "", "risk": "low", "tags": []}
+    if not isinstance(item, dict):
+        return item
+    risk = str(item.get("risk", "low")).lower()
+    tags = item.get("tags")
+    return {
+        "id": str(item.get("id") or f"choice_{idx + 1}"),
+        "label": item.get("label") or item.get("text") or item.get("title"),
+        "hint": str(item.get("hint") or ""),
+        "risk": risk if risk in _RISKS else "low",
+        "tags": [str(tag) for tag in _as_list(tags)],
+    }
+
+
+def _update(item: Any) -> Any:
+    if not isinstance(item, dict):
+        return item
+    return {
+        "op": item.get("op"),
+        "path": item.get("path"),
+        "value": item.get("value"),
+        "reason": str(item.get("reason") or ""),
+    }
+
+
+def _event(item: Any) -> Any:
+    if isinstance(item, str):
+        return {"type": "info", "message": item}
+    if not isinstance(item, dict):
+        return item
+    return {"type": str(item.get("type") or "info"), "message": item.get("message")}
+
+
+def _end(value: Any) -> Any:
+    if isinstance(parse_bool(value), bool):
+        return {"is_game_over": parse_bool(value), "ending_id": "", "reason": ""}
+    if not isinstance(value, dict):
+        return value
+    return {
+        "is_game_over": parse_bool(value.get("is_game_over", False)),
+        "ending_id": str(value.get("ending_id") or ""),
+        "reason": str(value.get("reason") or ""),
+    }
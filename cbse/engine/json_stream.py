@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import re
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class StringFieldScanner:
+    # Pulls the value of one string field out of a JSON object while it is still
+    # arriving, so the UI can show it before the object closes.
+    def __init__(self, field: str = "narrative_markdown") -> None:
+        self._key = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._buffer = ""
+        self._pos = -1
+        self._parts: list[str] = []
+        self._pending_high: int | None = None
+        self.done = False
+
+    @property
+    def value(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> str | None:
+        if self.done:
+            return None
+        self._buffer += chunk
+        if self._pos < 0:
+            match = self._key.search(self._buffer)
+            if match is None:
+                return None
+            self._pos = match.end()
+        before = len(self._parts)
+        self._scan()
+        return self.value if len(self._parts) != before else None
+
+    def _scan(self) -> None:
+        buf = self._buffer
+        pos = self._pos
+        start = pos
+        while pos < len(buf):
+            ch = buf[pos]
+            if ch == '"':
+                self._flush(buf[start:pos])
+                self.done = True
+                pos += 1
+                break
+            if ch != "\\":
+                pos += 1
+                continue
+            self._flush(buf[start:pos])
+            if pos + 1 >= len(buf):
+                break
+            esc = buf[pos + 1]
+            if esc == "u":
+                if pos + 6 > len(buf):
+                    break
+                self._unicode(buf[pos + 2 : pos + 6])
+                pos += 6
+            else:
+                self._parts.append(_ESCAPES.get(esc, esc))
+                pos += 2
+            start = pos
+        else:
+            self._flush(buf[start:pos])
+        self._pos = pos
+
+    def _flush(self, text: str) -> None:
+        if text:
+            self._parts.append(text)
+
+    def _unicode(self, digits: str) -> None:
+        try:
+            code = int(digits, 16)
+        except ValueError:
+            return
+        if 0xD800 <= code < 0xDC00:
+            self._pending_high = code
+            return
+        if 0xDC00 <= code < 0xE000 and self._pending_high is not None:
+            code = 0x10000 + ((self._pending_high - 0xD800) << 10) + (code - 0xDC00)
+            self._pending_high = None
+        self._parts.append(chr(code))
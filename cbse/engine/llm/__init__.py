@@ -1,7 +1,65 @@
-from cbse.engine.llm.base import LLMClient
+from cbse.engine.llm.base import LLMClient, providers, unwrap
+from cbse.engine.llm.batch import MicroBatcher
+from cbse.engine.llm.cache import CacheConfig, CachingClient, ResponseCache
+from cbse.engine.llm.cancel import CancelToken, LLMCancelled
+from cbse.engine.llm.cassette import CASSETTE_MODES, CassetteClient, CassetteError, RecordingClient
+from cbse.engine.llm.faults import FaultConfig, FaultInjectingClient, InjectedFault
 from cbse.engine.llm.gemini_provider import GeminiProvider
+from cbse.engine.llm.http_pool import HTTPClientPool, PoolConfig
+from cbse.engine.llm.metrics import LLMMetrics, MetricsRegistry, serve_metrics
 from cbse.engine.llm.mock_provider import MockProvider
 from cbse.engine.llm.ollama_provider import OllamaProvider
 from cbse.engine.llm.openai_provider import OpenAIProvider
+from cbse.engine.llm.router import CircuitBreaker, LLMUnavailable, Route, RouterClient
+from cbse.engine.llm.scheduler import (
+    BACKGROUND,
+    INTERACTIVE,
+    REPAIR,
+    LLMScheduler,
+    ProviderLimits,
+    ScheduledClient,
+    limits_from_env,
+    llm_priority,
+)
+from cbse.engine.llm.synthetic_provider import SyntheticProvider
 
-__all__ = ["LLMClient", "MockProvider", "OpenAIProvider", "GeminiProvider", "OllamaProvider"]
+__all__ = [
+    "LLMClient",
+    "providers",
+    "unwrap",
+    "MicroBatcher",
+    "CacheConfig",
+    "CachingClient",
+    "ResponseCache",
+    "CASSETTE_MODES",
+    "CassetteClient",
+    "CassetteError",
+    "RecordingClient",
+    "CancelToken",
+    "LLMCancelled",
+    "MockProvider",
+    "SyntheticProvider",
+    "FaultConfig",
+    "FaultInjectingClient",
+    "InjectedFault",
+    "OpenAIProvider",
+    "GeminiProvider",
+    "OllamaProvider",
+    "CircuitBreaker",
+    "LLMUnavailable",
+    "Route",
+    "RouterClient",
+    "BACKGROUND",
+    "INTERACTIVE",
+    "REPAIR",
+    "LLMScheduler",
+    "ProviderLimits",
+    "ScheduledClient",
+    "limits_from_env",
+    "llm_priority",
+    "HTTPClientPool",
+    "PoolConfig",
+    "LLMMetrics",
+    "MetricsRegistry",
+    "serve_metrics",
+]
@@ -1,9 +1,107 @@
 from __future__ import annotations
 
+import contextvars
+import os
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Self
+
+from cbse.engine.llm.cancel import CancelToken, check_cancelled
 
 
 class LLMClient(ABC):
+    name = "llm"
+    # How many requests complete_many keeps in flight against this backend.
+    max_parallel = 1
+
     @abstractmethod
-    def complete(self, messages: list[dict[str, str]]) -> str:
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
         raise NotImplementedError
+
+    def stream(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> Iterator[str]:
+        # Providers without a streaming endpoint yield the whole completion once.
+        content = self.complete(messages, cancel=cancel)
+        check_cancelled(cancel)
+        yield content
+
+    def escalate(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> str | None:
+        # Asks a stronger tier for the same prompt after output that failed
+        # validation; None when there is no tier left. Only a router has tiers,
+        # wrappers pass the call down (cache and cassette also keep the answer).
+        inner = getattr(self, "inner", None)
+        if isinstance(inner, LLMClient):
+            return inner.escalate(messages, cancel=cancel)
+        return None
+
+    def complete_many(
+        self, batch: list[list[dict[str, str]]], cancel: CancelToken | None = None
+    ) -> list[str | Exception]:
+        # One conversation per entry. Results keep the input order and a failed
+        # entry comes back as its exception instead of failing the whole batch.
+        results = run_batch(self, [BatchRequest(messages, cancel) for messages in batch])
+        check_cancelled(cancel)
+        return results
+
+    def close(self) -> None:
+        return None
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def unwrap(client: LLMClient) -> LLMClient:
+    # Wrappers (cache, cassette, ...) keep the wrapped client on `inner`; provider
+    # knobs such as temperature or num_ctx live on the innermost one.
+    while isinstance(getattr(client, "inner", None), LLMClient):
+        client = client.inner  # type: ignore[attr-defined]
+    return client
+
+
+def providers(client: LLMClient) -> list[LLMClient]:
+    # A router fans out to several providers; every other client wraps one.
+    client = unwrap(client)
+    routes = getattr(client, "routes", None)
+    if routes is None:
+        return [client]
+    return [provider for route in routes for provider in providers(route.client)]
+
+
+def batch_parallelism(client: LLMClient) -> int:
+    parallel_env = os.getenv("CBSE_LLM_BATCH_PARALLEL")
+    if parallel_env:
+        return max(1, int(parallel_env))
+    # Wrappers such as the scheduler do not change what the backend can take;
+    # behind a router the most parallel route decides.
+    return max(1, *(int(getattr(p, "max_parallel", 1)) for p in providers(client)))
+
+
+@dataclass
+class BatchRequest:
+    messages: list[dict[str, str]]
+    cancel: CancelToken | None = None
+    # Each request runs in its caller's context, so priority and metrics
+    # collection follow it onto the worker thread.
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+def run_batch(client: LLMClient, requests: list[BatchRequest]) -> list[str | Exception]:
+    def run(request: BatchRequest) -> str | Exception:
+        try:
+            return request.context.run(client.complete, request.messages, request.cancel)
+        except Exception as exc:
+            return exc
+
+    workers = min(len(requests), batch_parallelism(client))
+    if workers <= 1:
+        return [run(request) for request in requests]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cbse-batch") as executor:
+        return list(executor.map(run, requests))
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from cbse.engine.llm.base import BatchRequest, LLMClient, run_batch
+from cbse.engine.llm.cancel import CancelToken, check_cancelled
+
+# How often a waiting caller checks its own cancel token.
+_POLL_SECONDS = 0.05
+
+
+@dataclass
+class _Pending:
+    request: BatchRequest
+    future: Future[str | Exception] = field(default_factory=Future)
+
+
+class MicroBatcher(LLMClient):
+    # Groups complete() calls made by many sessions on their own threads: the
+    # first request opens a window of `window_ms`, everything that arrives
+    # within it (up to `max_batch`) goes to the backend together. Ollama then
+    # prefills and decodes the group in its parallel slots instead of one
+    # conversation at a time. Streaming calls pass straight through.
+    def __init__(self, inner: LLMClient, window_ms: float = 20.0, max_batch: int = 8) -> None:
+        self.inner = inner
+        self.name = inner.name
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.requests = 0
+        self._queue: queue.Queue[_Pending | None] = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="cbse-batcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def max_parallel(self) -> int:
+        return self.max_batch
+
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        check_cancelled(cancel)
+        pending = _Pending(BatchRequest(messages, cancel))
+        self._queue.put(pending)
+        while True:
+            try:
+                result = pending.future.result(timeout=_POLL_SECONDS)
+                break
+            except TimeoutError:
+                # The request still runs to the end of its batch; the caller
+                # just stops waiting for it.
+                check_cancelled(cancel)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def stream(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> Iterator[str]:
+        return self.inner.stream(messages, cancel=cancel)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self.inner.close()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    pending = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if pending is None:
+                    stop = True
+                    break
+                batch.append(pending)
+            self.batches += 1
+            self.requests += len(batch)
+            results = run_batch(self.inner, [pending.request for pending in batch])
+            for pending, result in zip(batch, results):
+                pending.future.set_result(result)
+            if stop:
+                return
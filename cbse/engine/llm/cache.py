@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from cbse.engine.llm.base import LLMClient, providers, unwrap
+from cbse.engine.llm.cancel import CancelToken, check_cancelled
+
+
+@dataclass(frozen=True)
+class CacheConfig:
+    directory: Path | None = None
+    max_entries: int = 256
+    max_disk_bytes: int = 64 * 1024 * 1024
+    force: bool = False
+
+    @classmethod
+    def from_env(cls, default_dir: Path) -> CacheConfig:
+        directory = os.getenv("CBSE_LLM_CACHE_DIR")
+        entries = os.getenv("CBSE_LLM_CACHE_ENTRIES")
+        max_mb = os.getenv("CBSE_LLM_CACHE_MAX_MB")
+        return cls(
+            directory=Path(directory) if directory else default_dir,
+            max_entries=int(entries) if entries else cls.max_entries,
+            max_disk_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else cls.max_disk_bytes,
+            force=os.getenv("CBSE_LLM_CACHE_FORCE") == "1",
+        )
+
+
+def cache_key(client: LLMClient, messages: list[dict[str, str]], escalated: bool = False) -> str:
+    # Everything that changes what the model would say belongs in the key, for
+    # every provider a router could send the prompt to. The output schema is
+    # rebuilt from the live state each turn, so it is part of the key too.
+    data = {
+        "providers": [
+            {
+                "provider": provider.name,
+                "model": getattr(provider, "model", None),
+                "temperature": getattr(provider, "temperature", None),
+                "max_output_tokens": getattr(provider, "max_output_tokens", None),
+                "num_ctx": getattr(provider, "num_ctx", None),
+                "json_schema": getattr(provider, "json_schema", None),
+                "format_mode": getattr(provider, "format_mode", None),
+                "output_mode": getattr(provider, "output_mode", None),
+            }
+            for provider in providers(client)
+        ],
+        "messages": messages,
+    }
+    if escalated:
+        # Same prompt, answered by a stronger tier.
+        data["escalated"] = True
+    text = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    # In-memory LRU in front of a directory of one JSON file per key. The disk
+    # store is trimmed oldest-access-first once it outgrows max_disk_bytes.
+    def __init__(self, config: CacheConfig | None = None) -> None:
+        self.config = config or CacheConfig()
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: int | None = None
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                return value
+            value = self._read_disk(key)
+            if value is not None:
+                self._remember(key, value)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._remember(key, value)
+            self._write_disk(key, value)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def _remember(self, key: str, value: str) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config.max_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> Path | None:
+        if self.config.directory is None:
+            return None
+        return self.config.directory / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> str | None:
+        path = self._path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        # Touch on read so eviction follows access order, not write order.
+        os.utime(path)
+        return data.get("response")
+
+    def _write_disk(self, key: str, value: str) -> None:
+        path = self._path(key)
+        if path is None:
+            return
+        usage = self._disk_usage()
+        previous = path.stat().st_size if path.exists() else 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(
+            {"key": key, "created": time.time(), "response": value}, ensure_ascii=False
+        )
+        path.write_text(data, encoding="utf-8")
+        self._disk_bytes = usage + path.stat().st_size - previous
+        if self._disk_bytes > self.config.max_disk_bytes:
+            self._evict_disk()
+
+    def _disk_usage(self) -> int:
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(p.stat().st_size for p in self._disk_files())
+        return self._disk_bytes
+
+    def _disk_files(self) -> list[Path]:
+        assert self.config.directory is not None
+        if not self.config.directory.exists():
+            return []
+        return list(self.config.directory.glob("*/*.json"))
+
+    def _evict_disk(self) -> None:
+        files = sorted(self._disk_files(), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        for path in files:
+            if total <= self.config.max_disk_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+        self._disk_bytes = total
+
+
+class CachingClient(LLMClient):
+    # Serves repeated prompts from a ResponseCache. Sampled output (temperature
+    # above zero) is passed through untouched unless the cache is forced.
+    def __init__(self, inner: LLMClient, cache: ResponseCache) -> None:
+        self.inner = inner
+        self.cache = cache
+        self.name = inner.name
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @property
+    def cacheable(self) -> bool:
+        temperature = getattr(unwrap(self.inner), "temperature", 0.0) or 0.0
+        return self.cache.config.force or temperature <= 0
+
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        if not self.cacheable:
+            self.bypassed += 1
+            return self.inner.complete(messages, cancel=cancel)
+        key = cache_key(self.inner, messages)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        content = self.inner.complete(messages, cancel=cancel)
+        self.cache.put(key, content)
+        return content
+
+    def stream(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> Iterator[str]:
+        if not self.cacheable:
+            self.bypassed += 1
+            yield from self.inner.stream(messages, cancel=cancel)
+            return
+        key = cache_key(self.inner, messages)
+        cached = self._lookup(key)
+        if cached is not None:
+            check_cancelled(cancel)
+            yield cached
+            return
+        chunks: list[str] = []
+        for chunk in self.inner.stream(messages, cancel=cancel):
+            chunks.append(chunk)
+            yield chunk
+        # Only a stream that ran to the end is a complete response.
+        self.cache.put(key, "".join(chunks))
+
+    def escalate(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> str | None:
+        if not self.cacheable:
+            self.bypassed += 1
+            return self.inner.escalate(messages, cancel=cancel)
+        key = cache_key(self.inner, messages, escalated=True)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        content = self.inner.escalate(messages, cancel=cancel)
+        if content is not None:
+            self.cache.put(key, content)
+        return content
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "bypassed": self.bypassed}
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def _lookup(self, key: str) -> str | None:
+        cached = self.cache.get(key)
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import threading
+
+
+class LLMCancelled(RuntimeError):
+    pass
+
+
+class CancelToken:
+    # Shared between the caller and the thread running the request. Providers
+    # check it between streamed chunks and drop the connection once it is set,
+    # which is what makes Ollama stop generating. A child token is also
+    # cancelled by its parent, so the scheduler can preempt a request without
+    # owning the caller's token.
+    def __init__(self, parent: CancelToken | None = None) -> None:
+        self._event = threading.Event()
+        self.parent = parent
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise LLMCancelled("LLM request was cancelled")
+
+
+def check_cancelled(cancel: CancelToken | None) -> None:
+    if cancel is not None:
+        cancel.raise_if_cancelled()
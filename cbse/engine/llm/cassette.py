@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from cbse.engine.llm.base import LLMClient, unwrap
+from cbse.engine.llm.cancel import CancelToken, check_cancelled
+
+CASSETTE_MODES = ("record", "strict", "lenient")
+
+
+class CassetteError(RuntimeError):
+    pass
+
+
+def prompt_hash(messages: list[dict[str, str]]) -> str:
+    data = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CassetteEntry:
+    seq: int
+    key: str
+    messages: list[dict[str, str]]
+    response: str
+    # Answered by LLMClient.escalate, i.e. by a stronger router tier.
+    escalated: bool = False
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {
+            "seq": self.seq,
+            "key": self.key,
+            "messages": self.messages,
+            "response": self.response,
+        }
+        if self.escalated:
+            data["escalated"] = True
+        return data
+
+
+def load_cassette(path: Path) -> list[CassetteEntry]:
+    entries: list[CassetteEntry] = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        data = json.loads(line)
+        if "seq" not in data:
+            # Header line written by the recorder.
+            continue
+        entries.append(
+            CassetteEntry(
+                seq=data["seq"],
+                key=data["key"],
+                messages=data["messages"],
+                response=data["response"],
+                escalated=data.get("escalated", False),
+            )
+        )
+    return entries
+
+
+class RecordingClient(LLMClient):
+    # Passes every call through to the live client and appends the request and
+    # response to a JSONL cassette, repair calls and escalations included.
+    def __init__(self, inner: LLMClient, path: Path) -> None:
+        self.inner = inner
+        self.name = inner.name
+        self.path = path
+        self._seq = 0
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        provider = unwrap(inner)
+        header = {
+            "cassette": 1,
+            "provider": provider.name,
+            "model": getattr(provider, "model", None),
+            "temperature": getattr(provider, "temperature", None),
+        }
+        path.write_text(json.dumps(header, ensure_ascii=False) + "\n", encoding="utf-8")
+
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        content = self.inner.complete(messages, cancel=cancel)
+        self._record(messages, content)
+        return content
+
+    def stream(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> Iterator[str]:
+        chunks: list[str] = []
+        for chunk in self.inner.stream(messages, cancel=cancel):
+            chunks.append(chunk)
+            yield chunk
+        self._record(messages, "".join(chunks))
+
+    def escalate(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> str | None:
+        content = self.inner.escalate(messages, cancel=cancel)
+        if content is not None:
+            self._record(messages, content, escalated=True)
+        return content
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def _record(
+        self, messages: list[dict[str, str]], response: str, escalated: bool = False
+    ) -> None:
+        with self._lock:
+            self._seq += 1
+            entry = CassetteEntry(
+                seq=self._seq,
+                key=prompt_hash(messages),
+                messages=messages,
+                response=response,
+                escalated=escalated,
+            )
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry.to_dict(), ensure_ascii=False) + "\n")
+
+
+class CassetteClient(LLMClient):
+    # Serves recorded responses without touching a model. Strict playback
+    # expects the exact recorded sequence of prompts; lenient playback matches
+    # by prompt hash first and otherwise hands out the next unused response.
+    name = "cassette"
+
+    def __init__(self, path: Path, mode: str = "strict") -> None:
+        if mode not in ("strict", "lenient"):
+            raise ValueError(f"Unknown cassette playback mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.entries = load_cassette(path)
+        self._used = [False] * len(self.entries)
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> int:
+        return self._used.count(False)
+
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        check_cancelled(cancel)
+        with self._lock:
+            return self._take(self._match(prompt_hash(messages)))
+
+    def escalate(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> str | None:
+        # Replays an escalation only where the recording made one; otherwise
+        # the service moves on to its repair prompt, as it did when recording.
+        check_cancelled(cancel)
+        with self._lock:
+            index = self._match_escalation(prompt_hash(messages))
+            return None if index is None else self._take(index)
+
+    def _take(self, index: int) -> str:
+        self._used[index] = True
+        while self._cursor < len(self._used) and self._used[self._cursor]:
+            self._cursor += 1
+        return self.entries[index].response
+
+    def _match(self, key: str) -> int:
+        if self._cursor >= len(self.entries):
+            raise CassetteError(
+                f"Cassette {self.path.name} is exhausted after {len(self.entries)} calls"
+            )
+        if self.mode == "strict":
+            expected = self.entries[self._cursor]
+            if expected.key != key:
+                raise CassetteError(
+                    f"Cassette mismatch at call {expected.seq}: prompt differs from the recording"
+                )
+            if expected.escalated:
+                raise CassetteError(
+                    f"Cassette mismatch at call {expected.seq}: the recording escalated here"
+                )
+            return self._cursor
+        for index in range(self._cursor, len(self.entries)):
+            if not self._used[index] and self.entries[index].key == key:
+                return index
+        return self._cursor
+
+    def _match_escalation(self, key: str) -> int | None:
+        if self.mode == "strict":
+            if self._cursor >= len(self.entries) or not self.entries[self._cursor].escalated:
+                return None
+            expected = self.entries[self._cursor]
+            if expected.key != key:
+                raise CassetteError(
+                    f"Cassette mismatch at call {expected.seq}: prompt differs from the recording"
+                )
+            return self._cursor
+        for index in range(self._cursor, len(self.entries)):
+            entry = self.entries[index]
+            if not self._used[index] and entry.escalated and entry.key == key:
+                return index
+        return None
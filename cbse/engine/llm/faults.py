@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, fields
+
+from cbse.engine.llm.base import LLMClient, unwrap
+from cbse.engine.llm.cancel import CancelToken, check_cancelled
+
+_POLL_SECONDS = 0.02
+_ERROR_STATUSES = (429, 500, 503)
+# Faults that rewrite the response text.
+_CONTENT_FAULTS = ("truncated", "malformed", "invalid_path")
+
+
+class InjectedFault(RuntimeError):
+    # Looks like a provider HTTP error to LLMService and the router.
+    def __init__(self, message: str, status_code: int, raw: str = "") -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.raw = raw
+
+
+@dataclass(frozen=True)
+class FaultConfig:
+    # Latency before the first output: lognormal around latency_ms, with
+    # latency_sigma 0 meaning a fixed delay. Rates are per request; at most
+    # one of error / timeout / malformed / truncate / invalid_path fires.
+    latency_ms: float = 0.0
+    latency_sigma: float = 0.0
+    stall_rate: float = 0.0
+    stall_ms: float = 2000.0
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_s: float = 30.0
+    malformed_rate: float = 0.0
+    truncate_rate: float = 0.0
+    invalid_path_rate: float = 0.0
+    # Streams are re-chunked: chunk_chars per chunk, chunk_ms between chunks.
+    chunk_chars: int = 24
+    chunk_ms: float = 0.0
+    seed: int = 0
+
+    @classmethod
+    def from_spec(cls, spec: str) -> FaultConfig:
+        # "latency_ms=800,latency_sigma=0.6,malformed_rate=0.2,seed=7"
+        types = {field.name: field.type for field in fields(cls)}
+        values: dict[str, object] = {}
+        for item in spec.split(","):
+            if not item.strip():
+                continue
+            key, _, value = item.partition("=")
+            key = key.strip()
+            if key not in types:
+                raise ValueError(f"Unknown fault setting: {key}")
+            values[key] = int(value) if types[key] == "int" else float(value)
+        return cls(**values)  # type: ignore[arg-type]
+
+    @classmethod
+    def from_env(cls) -> FaultConfig | None:
+        spec = os.getenv("CBSE_LLM_FAULTS")
+        return cls.from_spec(spec) if spec else None
+
+
+@dataclass
+class _Plan:
+    latency: float
+    fault: str | None
+    stall: bool
+    rng: random.Random
+
+
+class FaultInjectingClient(LLMClient):
+    # Wraps a provider and makes it slow, stalling, failing or wrong in a
+    # reproducible way, so the repair loop, fallback, router and UI can be
+    # exercised without a real model. Each request draws its own generator
+    # from the seeded one, so a run replays identically in request order.
+    def __init__(self, inner: LLMClient, config: FaultConfig) -> None:
+        self.inner = inner
+        self.config = config
+        self.name = inner.name
+        provider = unwrap(inner)
+        # Routes wrapping different models get different fault sequences.
+        model = getattr(provider, "model", "")
+        self._rng = random.Random(f"{config.seed}:{provider.name}:{model}")
+        self._lock = threading.Lock()
+        self.injected: Counter[str] = Counter()
+
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        plan = self._plan()
+        self._sleep(plan.latency, cancel)
+        self._raise_fault(plan, cancel)
+        content = self.inner.complete(messages, cancel=cancel)
+        if plan.stall:
+            self._sleep(self.config.stall_ms / 1000, cancel)
+        return self._corrupt(content, plan)
+
+    def stream(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> Iterator[str]:
+        plan = self._plan()
+        self._sleep(plan.latency, cancel)
+        self._raise_fault(plan, cancel)
+        size = max(1, self.config.chunk_chars)
+        chunks = self.inner.stream(messages, cancel=cancel)
+        if plan.fault in _CONTENT_FAULTS:
+            # Damage needs the whole text, so these streams start late.
+            content = self._corrupt("".join(chunks), plan)
+            pieces: Iterable[str] = [content[i : i + size] for i in range(0, len(content), size)]
+            stall_at = len(pieces) // 2
+        else:
+            # Passed through as the provider sends it, so time to first output
+            # stays a streaming measure. The length is unknown up front; the
+            # stall follows the first chunk.
+            pieces = _rechunk(chunks, size)
+            stall_at = 1
+        stalled = not plan.stall
+        for index, piece in enumerate(pieces):
+            if index and self.config.chunk_ms:
+                self._sleep(self.config.chunk_ms / 1000, cancel)
+            if not stalled and index == stall_at:
+                self._sleep(self.config.stall_ms / 1000, cancel)
+                stalled = True
+            check_cancelled(cancel)
+            yield piece
+        if not stalled:
+            self._sleep(self.config.stall_ms / 1000, cancel)
+
+    def stats(self) -> dict[str, int]:
+        return dict(self.injected)
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def _plan(self) -> _Plan:
+        config = self.config
+        with self._lock:
+            rng = random.Random(self._rng.getrandbits(64))
+        latency = config.latency_ms / 1000
+        if latency and config.latency_sigma:
+            latency *= math.exp(rng.gauss(0.0, config.latency_sigma))
+        fault = None
+        roll = rng.random()
+        for name, rate in (
+            ("error", config.error_rate),
+            ("timeout", config.timeout_rate),
+            ("malformed", config.malformed_rate),
+            ("truncated", config.truncate_rate),
+            ("invalid_path", config.invalid_path_rate),
+        ):
+            if roll < rate:
+                fault = name
+                break
+            roll -= rate
+        stall = rng.random() < config.stall_rate
+        with self._lock:
+            self.injected["requests"] += 1
+            if fault:
+                self.injected[fault] += 1
+            if stall:
+                self.injected["stall"] += 1
+        return _Plan(latency=latency, fault=fault, stall=stall, rng=rng)
+
+    def _raise_fault(self, plan: _Plan, cancel: CancelToken | None) -> None:
+        if plan.fault == "error":
+            status = plan.rng.choice(_ERROR_STATUSES)
+            body = json.dumps({"error": {"message": "injected fault", "code": status}})
+            raise InjectedFault(f"HTTP error: {status} (injected)", status, raw=body)
+        if plan.fault == "timeout":
+            self._sleep(self.config.timeout_s, cancel)
+            raise TimeoutError(f"No response within {self.config.timeout_s:g} s (injected)")
+
+    def _corrupt(self, content: str, plan: _Plan) -> str:
+        rng = plan.rng
+        if plan.fault == "truncated":
+            return content[: max(1, int(len(content) * rng.uniform(0.3, 0.95)))]
+        if plan.fault == "malformed":
+            # The kinds of damage small models actually produce; some are
+            # fixed by local repair, the rest need a repair round-trip.
+            damage = rng.choice(
+                [
+                    lambda text: f"Sure! Here is the turn:\n```json\n{text}\n```",
+                    lambda text: text.replace('"', "'"),
+                    lambda text: text.replace("}", ",}", 1),
+                    lambda text: text.replace('", "', '" "', 1),
+                    lambda text: text.replace(":", "", 1),
+                ]
+            )
+            return damage(content)
+        if plan.fault == "invalid_path":
+            try:
+                data = json.loads(content)
+                data.setdefault("state_updates", []).append(
+                    {
+                        "op": "set",
+                        "path": f"ghost.value_{rng.randrange(1000)}",
+                        "value": 1,
+                        "reason": "injected",
+                    }
+                )
+            except (ValueError, AttributeError):
+                return content
+            return json.dumps(data, ensure_ascii=False)
+        return content
+
+    def _sleep(self, seconds: float, cancel: CancelToken | None) -> None:
+        deadline = time.monotonic() + seconds
+        while True:
+            check_cancelled(cancel)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, _POLL_SECONDS))
+
+
+def _rechunk(chunks: Iterable[str], size: int) -> Iterator[str]:
+    for chunk in chunks:
+        for start in range(0, len(chunk), size):
+            yield chunk[start : start + size]
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
+import json
 import os
+from collections.abc import Iterator
 from typing import Any
 
-import httpx
-
 from cbse.engine.llm.base import LLMClient
+from cbse.engine.llm.cancel import CancelToken, check_cancelled
+from cbse.engine.llm.http_pool import HTTPClientPool, iter_sse_data
+from cbse.engine.llm.metrics import record_call
+from cbse.engine.llm.structured import fallback_mode, gemini_response_schema, output_mode_from_env
+
+_ROLES = {"user": "user", "assistant": "model", "model": "model"}
 
 
 class GeminiProvider(LLMClient):
+    name = "gemini"
+    max_parallel = 8
+
     def __init__(
         self,
         model: str,
@@ -16,6 +25,10 @@ class GeminiProvider(LLMClient):
         max_output_tokens: int,
         api_key: str | None = None,
         base_url: str | None = None,
+        pool: HTTPClientPool | None = None,
+        timeout: float = 60.0,
+        json_schema: dict | None = None,
+        output_mode: str | None = None,
     ) -> None:
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
@@ -24,21 +37,34 @@ class GeminiProvider(LLMClient):
         self.temperature = temperature
         self.max_output_tokens = max_output_tokens
         self.base_url = base_url or "https://generativelanguage.googleapis.com/v1beta"
+        self.timeout = timeout
+        # schema -> responseSchema, json -> responseMimeType only, text -> the
+        # old single flattened user turn for models without JSON mode or
+        # system instructions; steps down when the model rejects a mode.
+        self.json_schema = json_schema
+        self.output_mode = output_mode or output_mode_from_env()
+        self._schema_source: dict | None = None
+        self._response_schema: dict[str, Any] = {}
+        self._owns_pool = pool is None
+        self.pool = pool or HTTPClientPool()
 
-    def complete(self, messages: list[dict[str, str]]) -> str:
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        check_cancelled(cancel)
         url = f"{self.base_url}/models/{self.model}:generateContent"
-        text = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
-        payload: dict[str, Any] = {
-            "contents": [{"role": "user", "parts": [{"text": text}]}],
-            "generationConfig": {
-                "temperature": self.temperature,
-                "maxOutputTokens": self.max_output_tokens,
-            },
-        }
-        with httpx.Client(timeout=60.0) as client:
-            response = client.post(url, params={"key": self.api_key}, json=payload)
-            response.raise_for_status()
-            data = response.json()
+        client = self.pool.get(url)
+        while True:
+            response = client.post(
+                url,
+                params={"key": self.api_key},
+                json=self._payload(messages),
+                timeout=self.timeout,
+            )
+            check_cancelled(cancel)
+            if not self._fall_back(response.status_code, response.text):
+                break
+        response.raise_for_status()
+        data = response.json()
+        self._record(data.get("usageMetadata"))
         candidates = data.get("candidates", [])
         if not candidates:
             raise RuntimeError("No candidates returned from Gemini")
@@ -46,3 +72,106 @@ class GeminiProvider(LLMClient):
         if not parts:
             raise RuntimeError("Empty Gemini response")
         return parts[0].get("text", "")
+
+    def stream(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> Iterator[str]:
+        check_cancelled(cancel)
+        url = f"{self.base_url}/models/{self.model}:streamGenerateContent"
+        params = {"key": self.api_key, "alt": "sse"}
+        client = self.pool.get(url)
+        received = False
+        usage: dict[str, Any] | None = None
+        while True:
+            with client.stream(
+                "POST", url, params=params, json=self._payload(messages), timeout=self.timeout
+            ) as response:
+                if response.status_code >= 400:
+                    body = response.read().decode("utf-8", "replace")
+                    # Rejected before any output, so retrying in a weaker mode is safe.
+                    if self._fall_back(response.status_code, body):
+                        continue
+                response.raise_for_status()
+                for data in iter_sse_data(response):
+                    check_cancelled(cancel)
+                    event = json.loads(data)
+                    # Every chunk repeats the running totals; the last one wins.
+                    usage = event.get("usageMetadata") or usage
+                    for candidate in event.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            text = part.get("text", "")
+                            if text:
+                                received = True
+                                yield text
+            break
+        self._record(usage)
+        if not received:
+            raise RuntimeError("Empty Gemini response")
+
+    def _payload(self, messages: list[dict[str, str]]) -> dict[str, Any]:
+        mode = self._mode()
+        config: dict[str, Any] = {
+            "temperature": self.temperature,
+            "maxOutputTokens": self.max_output_tokens,
+        }
+        if mode == "text":
+            text = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+            return {
+                "contents": [{"role": "user", "parts": [{"text": text}]}],
+                "generationConfig": config,
+            }
+
+        config["responseMimeType"] = "application/json"
+        if mode == "schema":
+            config["responseSchema"] = self._schema()
+        payload: dict[str, Any] = {"contents": self._contents(messages), "generationConfig": config}
+        # Gemini has no developer role; instructions of any non-chat role go here.
+        system = [{"text": m["content"]} for m in messages if m["role"] not in _ROLES]
+        if system:
+            payload["systemInstruction"] = {"parts": system}
+        return payload
+
+    def _contents(self, messages: list[dict[str, str]]) -> list[dict[str, Any]]:
+        # Consecutive messages of one role become parts of a single turn.
+        contents: list[dict[str, Any]] = []
+        for message in messages:
+            role = _ROLES.get(message["role"])
+            if role is None:
+                continue
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"].append({"text": message["content"]})
+            else:
+                contents.append({"role": role, "parts": [{"text": message["content"]}]})
+        return contents
+
+    def _schema(self) -> dict[str, Any]:
+        # GameSession swaps json_schema after every turn (_refresh_output_schema).
+        if self.json_schema is not self._schema_source:
+            self._schema_source = self.json_schema
+            self._response_schema = gemini_response_schema(self.json_schema or {})
+        return self._response_schema
+
+    def _mode(self) -> str:
+        if self.output_mode == "schema" and not self.json_schema:
+            return "json"
+        return self.output_mode
+
+    def _fall_back(self, status_code: int, body: str) -> bool:
+        mode = fallback_mode(self._mode(), status_code, body)
+        if mode is None:
+            return False
+        self.output_mode = mode
+        return True
+
+    def _record(self, usage: dict[str, Any] | None) -> None:
+        usage = usage or {}
+        record_call(
+            self.name,
+            self.model,
+            prompt_tokens=usage.get("promptTokenCount"),
+            completion_tokens=usage.get("candidatesTokenCount"),
+        )
+
+    def close(self) -> None:
+        if self._owns_pool:
+            self.pool.close()
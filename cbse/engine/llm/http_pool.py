@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+import threading
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Self
+from urllib.parse import urlsplit
+
+import httpx
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections: int = 10
+    max_keepalive_connections: int = 5
+    keepalive_expiry: float = 60.0
+    http2: bool = False
+
+    @classmethod
+    def from_env(cls) -> PoolConfig:
+        max_conn = os.getenv("CBSE_HTTP_MAX_CONNECTIONS")
+        max_keepalive = os.getenv("CBSE_HTTP_MAX_KEEPALIVE")
+        expiry = os.getenv("CBSE_HTTP_KEEPALIVE_EXPIRY")
+        return cls(
+            max_connections=int(max_conn) if max_conn else cls.max_connections,
+            max_keepalive_connections=int(max_keepalive)
+            if max_keepalive
+            else cls.max_keepalive_connections,
+            keepalive_expiry=float(expiry) if expiry else cls.keepalive_expiry,
+            http2=os.getenv("CBSE_HTTP2") == "1",
+        )
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class HTTPClientPool:
+    # One keep-alive httpx.Client per origin. A pool can be shared by every
+    # provider (and every session) in a process; whoever created it closes it.
+    def __init__(self, config: PoolConfig | None = None) -> None:
+        self.config = config or PoolConfig()
+        self._clients: dict[str, httpx.Client] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def get(self, url: str) -> httpx.Client:
+        origin = _origin(url)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("HTTP client pool is closed")
+            client = self._clients.get(origin)
+            if client is None:
+                client = self._create_client()
+                self._clients[origin] = client
+            return client
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._closed = True
+        for client in clients:
+            client.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _create_client(self) -> httpx.Client:
+        limits = httpx.Limits(
+            max_connections=self.config.max_connections,
+            max_keepalive_connections=self.config.max_keepalive_connections,
+            keepalive_expiry=self.config.keepalive_expiry,
+        )
+        # HTTP/2 needs the optional h2 package; quietly stay on HTTP/1.1 without it.
+        http2 = self.config.http2 and http2_available()
+        return httpx.Client(limits=limits, http2=http2, timeout=60.0)
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def iter_sse_data(response: httpx.Response) -> Iterator[str]:
+    # Server-sent events as used by the OpenAI and Gemini streaming endpoints:
+    # only the data fields matter here, one JSON document per event.
+    data_lines: list[str] = []
+    for line in response.iter_lines():
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+        elif not line.strip() and data_lines:
+            yield "\n".join(data_lines)
+            data_lines = []
+    if data_lines:
+        yield "\n".join(data_lines)
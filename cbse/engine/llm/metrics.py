@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+# Seconds; covers a cached hit up to a cold local model on CPU.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+@dataclass
+class CallRecord:
+    # One provider HTTP call as the provider reported it; None means the API
+    # did not say.
+    provider: str
+    model: str
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    load_ms: float | None = None
+    prompt_eval_ms: float | None = None
+    eval_ms: float | None = None
+
+
+_calls: ContextVar[list[CallRecord] | None] = ContextVar("cbse_llm_calls", default=None)
+
+
+@contextmanager
+def collect_calls() -> Iterator[list[CallRecord]]:
+    # Gathers every provider call made in this context, repairs and hedged
+    # router attempts included (they run in a copy of the caller's context).
+    calls: list[CallRecord] = []
+    token = _calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _calls.reset(token)
+
+
+def record_call(provider: str, model: str, **fields: Any) -> None:
+    calls = _calls.get()
+    if calls is not None:
+        calls.append(CallRecord(provider=provider, model=model, **fields))
+
+
+def _total(values: list[Any]) -> Any:
+    present = [value for value in values if isinstance(value, (int, float))]
+    return sum(present) if present else None
+
+
+@dataclass
+class LLMMetrics:
+    # One LLMService.generate: everything it cost to get a usable output.
+    provider: str
+    model: str
+    outcome: str
+    attempts: int
+    calls: int
+    total_ms: float
+    ttft_ms: float | None = None
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    load_ms: float | None = None
+    prompt_eval_ms: float | None = None
+    eval_ms: float | None = None
+    # "speculative" for guesses generated while the player reads.
+    kind: str = "turn"
+
+    @classmethod
+    def from_calls(
+        cls,
+        calls: list[CallRecord],
+        provider: str,
+        model: str,
+        outcome: str,
+        attempts: int,
+        total_ms: float,
+        ttft_ms: float | None,
+        kind: str = "turn",
+    ) -> LLMMetrics:
+        # The last call produced the output, so it names the provider.
+        if calls:
+            provider, model = calls[-1].provider, calls[-1].model
+
+        def total(name: str) -> Any:
+            value = _total([getattr(call, name) for call in calls])
+            return round(value, 1) if isinstance(value, float) else value
+
+        return cls(
+            provider=provider,
+            model=model,
+            outcome=outcome,
+            attempts=attempts,
+            calls=len(calls),
+            total_ms=round(total_ms, 1),
+            ttft_ms=round(ttft_ms, 1) if ttft_ms is not None else None,
+            prompt_tokens=total("prompt_tokens"),
+            completion_tokens=total("completion_tokens"),
+            load_ms=total("load_ms"),
+            prompt_eval_ms=total("prompt_eval_ms"),
+            eval_ms=total("eval_ms"),
+            kind=kind,
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class _Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+_COUNTERS = {
+    "cbse_llm_requests_total": "LLM generations by outcome.",
+    # Counts LLMResult.attempts, not provider calls: router hedges and
+    # failovers are not attempts of their own.
+    "cbse_llm_attempts_total": "Prompts tried by generations: the turn, escalations and repairs.",
+    "cbse_llm_prompt_tokens_total": "Prompt tokens reported by the provider.",
+    "cbse_llm_completion_tokens_total": "Completion tokens reported by the provider.",
+    "cbse_llm_model_load_seconds_total": "Time the provider spent loading the model.",
+}
+_HISTOGRAMS = {
+    "cbse_llm_request_duration_seconds": "Wall time of a generation, repairs included.",
+    "cbse_llm_time_to_first_token_seconds": "Wall time until the first output arrived.",
+}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple[tuple[str, str], ...], le: str | None = None) -> str:
+    pairs = list(labels) + ([("le", le)] if le is not None else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    # In-memory aggregates of LLMMetrics per provider and model, rendered in
+    # the Prometheus text exposition format.
+    def __init__(self) -> None:
+        self._counters: dict[str, defaultdict[tuple[tuple[str, str], ...], float]] = {
+            name: defaultdict(float) for name in _COUNTERS
+        }
+        self._histograms: dict[str, defaultdict[tuple[tuple[str, str], ...], _Histogram]] = {
+            name: defaultdict(_Histogram) for name in _HISTOGRAMS
+        }
+        self._lock = threading.Lock()
+
+    def observe(self, metrics: LLMMetrics) -> None:
+        key = (("provider", metrics.provider), ("model", metrics.model), ("kind", metrics.kind))
+        counters = self._counters
+        with self._lock:
+            counters["cbse_llm_requests_total"][key + (("outcome", metrics.outcome),)] += 1
+            counters["cbse_llm_attempts_total"][key] += metrics.attempts
+            if metrics.prompt_tokens is not None:
+                counters["cbse_llm_prompt_tokens_total"][key] += metrics.prompt_tokens
+            if metrics.completion_tokens is not None:
+                counters["cbse_llm_completion_tokens_total"][key] += metrics.completion_tokens
+            if metrics.load_ms:
+                counters["cbse_llm_model_load_seconds_total"][key] += metrics.load_ms / 1000
+            histograms = self._histograms
+            histograms["cbse_llm_request_duration_seconds"][key].observe(metrics.total_ms / 1000)
+            if metrics.ttft_ms is not None:
+                histograms["cbse_llm_time_to_first_token_seconds"][key].observe(
+                    metrics.ttft_ms / 1000
+                )
+
+    def value(self, name: str, **labels: str) -> float:
+        key = tuple(labels.items())
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name].get(key, 0.0)
+            histogram = self._histograms[name].get(key)
+            return float(histogram.count) if histogram else 0.0
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for name, help_text in _COUNTERS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_labels(key)} {value:g}")
+            for name, help_text in _HISTOGRAMS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for key, histogram in sorted(self._histograms[name].items()):
+                    for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                        lines.append(f"{name}_bucket{_labels(key, f'{bound:g}')} {count}")
+                    lines.append(f"{name}_bucket{_labels(key, '+Inf')} {histogram.count}")
+                    lines.append(f"{name}_sum{_labels(key)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> None:
+        # Written whole and renamed, so a textfile collector never reads half.
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def serve_metrics(
+    registry: MetricsRegistry, port: int, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    # Serves GET /metrics from a daemon thread; call shutdown() to stop it.
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            return None
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="cbse-metrics", daemon=True).start()
+    return server
@@ -5,16 +5,20 @@ import random
 from typing import Any
 
 from cbse.engine.llm.base import LLMClient
+from cbse.engine.llm.cancel import CancelToken, check_cancelled
 
 
 class MockProvider(LLMClient):
+    name = "mock"
+
     def __init__(self, variable_ids: set[str], location_values: list[str] | None = None) -> None:
         self.variable_ids = variable_ids
         self.location_values = location_values or []
         self.turn_index = 0
         self.rng = random.Random(42)
 
-    def complete(self, messages: list[dict[str, str]]) -> str:
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        check_cancelled(cancel)
         self.turn_index += 1
         idx = self.turn_index
 
@@ -1,11 +1,24 @@
 from __future__ import annotations
 
+import json
 import os
+import time
+from collections.abc import Iterator
 from typing import Any
 
 import httpx
 
 from cbse.engine.llm.base import LLMClient
+from cbse.engine.llm.cancel import CancelToken, check_cancelled
+from cbse.engine.llm.http_pool import HTTPClientPool
+from cbse.engine.llm.metrics import record_call
+
+# Ollama reports durations in nanoseconds on the final response object.
+_DURATIONS = {
+    "load_duration": "load_ms",
+    "prompt_eval_duration": "prompt_eval_ms",
+    "eval_duration": "eval_ms",
+}
 
 
 class OllamaProviderError(RuntimeError):
@@ -15,6 +28,10 @@ class OllamaProviderError(RuntimeError):
 
 
 class OllamaProvider(LLMClient):
+    name = "ollama"
+    # Ollama serves OLLAMA_NUM_PARALLEL (default 4) requests per loaded model.
+    max_parallel = 4
+
     def __init__(
         self,
         model: str,
@@ -25,6 +42,8 @@ class OllamaProvider(LLMClient):
         timeout: float | None = None,
         format_mode: str | None = None,
         num_ctx: int | None = None,
+        pool: HTTPClientPool | None = None,
+        keep_alive: str | None = None,
     ) -> None:
         self.model = model
         self.temperature = temperature
@@ -42,28 +61,76 @@ class OllamaProvider(LLMClient):
             num_ctx_env = os.getenv("CBSE_OLLAMA_NUM_CTX") or os.getenv("OLLAMA_NUM_CTX")
             num_ctx = int(num_ctx_env) if num_ctx_env else None
         self.num_ctx = num_ctx
+        # How long Ollama keeps the model resident after a request; its own
+        # default (5m) unloads it during a long read and the next turn reloads.
+        self.keep_alive = keep_alive or os.getenv("CBSE_OLLAMA_KEEP_ALIVE") or "30m"
+        self._owns_pool = pool is None
+        self.pool = pool or HTTPClientPool()
+
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        check_cancelled(cancel)
+        fmt = self._format()
+        content, raw = self._request(messages, fmt=fmt)
+        check_cancelled(cancel)
+        if not content.strip():
+            raise OllamaProviderError(self._empty_message(), raw=raw)
+        return content
 
-    def complete(self, messages: list[dict[str, str]]) -> str:
+    def stream(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> Iterator[str]:
+        check_cancelled(cancel)
+        url = f"{self.base_url}/api/chat"
+        payload = self._payload(messages, self._format(), stream=True)
+        client = self.pool.get(url)
+        received = False
+        with client.stream("POST", url, json=payload, timeout=self.timeout) as response:
+            if response.status_code >= 400:
+                body = response.read().decode("utf-8", "replace")
+                raise OllamaProviderError(f"Ollama HTTP error: {response.status_code}", raw=body)
+            for line in response.iter_lines():
+                # Leaving the with-block on cancel drops the connection, so
+                # Ollama stops generating instead of finishing a dead turn.
+                check_cancelled(cancel)
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError as exc:
+                    raise OllamaProviderError(
+                        "Ollama returned non-JSON stream line.", raw=line
+                    ) from exc
+                if isinstance(data, dict) and data.get("error"):
+                    raise OllamaProviderError(f"Ollama error: {data['error']}", raw=line)
+                content = str(data.get("message", {}).get("content", ""))
+                if content:
+                    received = True
+                    yield content
+                if data.get("done"):
+                    self._record(data)
+                    break
+        if not received:
+            raise OllamaProviderError(self._empty_message())
+
+    def _format(self) -> Any:
         if self.format_mode == "json_schema":
             if not self.json_schema:
                 raise OllamaProviderError("json_schema format requires a schema.")
-            content, raw = self._request(messages, fmt=self.json_schema)
-            if not content.strip():
-                raise OllamaProviderError("Ollama returned empty content for json_schema format.", raw=raw)
-            return content
+            return self.json_schema
+        return "json"
 
-        content, raw = self._request(messages, fmt="json")
-        if not content.strip():
-            raise OllamaProviderError("Ollama returned empty content.", raw=raw)
-        return content
+    def _empty_message(self) -> str:
+        if self.format_mode == "json_schema":
+            return "Ollama returned empty content for json_schema format."
+        return "Ollama returned empty content."
 
-    def _request(self, messages: list[dict[str, str]], fmt: Any) -> tuple[str, str]:
-        url = f"{self.base_url}/api/chat"
+    def _payload(self, messages: list[dict[str, str]], fmt: Any, stream: bool) -> dict[str, Any]:
         payload: dict[str, Any] = {
             "model": self.model,
             "messages": messages,
-            "stream": False,
+            "stream": stream,
             "format": fmt,
+            "keep_alive": self.keep_alive,
             "options": {
                 "temperature": self.temperature,
                 "num_predict": self.max_output_tokens,
@@ -71,18 +138,75 @@ class OllamaProvider(LLMClient):
         }
         if self.num_ctx is not None:
             payload["options"]["num_ctx"] = self.num_ctx
-        with httpx.Client(timeout=self.timeout) as client:
-            response = client.post(url, json=payload)
-            response_text = response.text
-            try:
-                response.raise_for_status()
-            except httpx.HTTPStatusError as exc:
-                raise OllamaProviderError(f"Ollama HTTP error: {exc}", raw=response_text) from exc
-            try:
-                data = response.json()
-            except ValueError as exc:
-                raise OllamaProviderError("Ollama returned non-JSON response.", raw=response_text) from exc
+        return payload
+
+    def _request(self, messages: list[dict[str, str]], fmt: Any) -> tuple[str, str]:
+        url = f"{self.base_url}/api/chat"
+        payload = self._payload(messages, fmt, stream=False)
+        client = self.pool.get(url)
+        response = client.post(url, json=payload, timeout=self.timeout)
+        response_text = response.text
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            raise OllamaProviderError(f"Ollama HTTP error: {exc}", raw=response_text) from exc
+        try:
+            data = response.json()
+        except ValueError as exc:
+            raise OllamaProviderError(
+                "Ollama returned non-JSON response.", raw=response_text
+            ) from exc
         if isinstance(data, dict) and data.get("error"):
             raise OllamaProviderError(f"Ollama error: {data['error']}", raw=response_text)
+        self._record(data)
         message = data.get("message", {})
         return str(message.get("content", "")), response_text
+
+    def _record(self, data: dict[str, Any]) -> None:
+        # Token counts and the load / prompt / generation split of one call,
+        # so a slow turn can be told apart from a model reload.
+        durations = {
+            name: round(data[key] / 1e6, 1)
+            for key, name in _DURATIONS.items()
+            if isinstance(data.get(key), (int, float))
+        }
+        record_call(
+            self.name,
+            self.model,
+            prompt_tokens=data.get("prompt_eval_count"),
+            completion_tokens=data.get("eval_count"),
+            **durations,
+        )
+
+    def loaded_models(self) -> list[str]:
+        # /api/ps lists the models currently resident in memory.
+        url = f"{self.base_url}/api/ps"
+        response = self.pool.get(url).get(url, timeout=self.timeout)
+        response.raise_for_status()
+        models = response.json().get("models", [])
+        return [str(item.get("name") or item.get("model")) for item in models]
+
+    def is_loaded(self) -> bool:
+        names = self.loaded_models()
+        # "qwen3" and "qwen3:latest" name the same model.
+        return any(name == self.model or name == f"{self.model}:latest" for name in names)
+
+    def warm_up(self) -> float:
+        # A chat request without messages only loads the model; returns the
+        # load time in ms (0 when it was already resident).
+        if self.is_loaded():
+            return 0.0
+        url = f"{self.base_url}/api/chat"
+        payload = {"model": self.model, "messages": [], "keep_alive": self.keep_alive}
+        started = time.perf_counter()
+        response = self.pool.get(url).post(url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        load = data.get("load_duration")
+        if not isinstance(load, (int, float)):
+            return round((time.perf_counter() - started) * 1000, 1)
+        return round(load / 1e6, 1)
+
+    def close(self) -> None:
+        if self._owns_pool:
+            self.pool.close()
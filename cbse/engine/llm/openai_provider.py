@@ -1,14 +1,25 @@
 from __future__ import annotations
 
+import json
 import os
+import time
+from collections.abc import Iterator
 from typing import Any
 
-import httpx
-
 from cbse.engine.llm.base import LLMClient
+from cbse.engine.llm.cancel import CancelToken, check_cancelled
+from cbse.engine.llm.http_pool import HTTPClientPool, iter_sse_data
+from cbse.engine.llm.metrics import record_call
+from cbse.engine.llm.structured import fallback_mode, openai_strict_schema, output_mode_from_env
+
+# Batch states after which no more results will appear.
+_BATCH_DONE = {"completed", "failed", "expired", "cancelled"}
 
 
 class OpenAIProvider(LLMClient):
+    name = "openai"
+    max_parallel = 8
+
     def __init__(
         self,
         model: str,
@@ -16,6 +27,10 @@ class OpenAIProvider(LLMClient):
         max_output_tokens: int,
         api_key: str | None = None,
         base_url: str | None = None,
+        pool: HTTPClientPool | None = None,
+        timeout: float = 60.0,
+        json_schema: dict | None = None,
+        output_mode: str | None = None,
     ) -> None:
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
@@ -24,22 +39,215 @@ class OpenAIProvider(LLMClient):
         self.temperature = temperature
         self.max_output_tokens = max_output_tokens
         self.base_url = base_url or "https://api.openai.com/v1"
+        self.timeout = timeout
+        # schema -> json_schema strict, json -> json_object, text -> no
+        # response_format; steps down when the model rejects a mode.
+        self.json_schema = json_schema
+        self.output_mode = output_mode or output_mode_from_env()
+        self._strict_source: dict | None = None
+        self._strict_schema: dict[str, Any] = {}
+        self._owns_pool = pool is None
+        self.pool = pool or HTTPClientPool()
 
-    def complete(self, messages: list[dict[str, str]]) -> str:
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        check_cancelled(cancel)
         url = f"{self.base_url}/chat/completions"
+        client = self.pool.get(url)
+        while True:
+            response = client.post(
+                url, json=self._payload(messages), headers=self._headers(), timeout=self.timeout
+            )
+            check_cancelled(cancel)
+            if not self._fall_back(response.status_code, response.text):
+                break
+        response.raise_for_status()
+        data = response.json()
+        self._record(data.get("usage"))
+        return data["choices"][0]["message"]["content"]
+
+    def stream(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> Iterator[str]:
+        check_cancelled(cancel)
+        url = f"{self.base_url}/chat/completions"
+        client = self.pool.get(url)
+        while True:
+            payload = self._payload(messages)
+            payload["stream"] = True
+            # Usage arrives on a final chunk with no choices.
+            payload["stream_options"] = {"include_usage": True}
+            with client.stream(
+                "POST", url, json=payload, headers=self._headers(), timeout=self.timeout
+            ) as response:
+                if response.status_code >= 400:
+                    body = response.read().decode("utf-8", "replace")
+                    # Rejected before any output, so retrying in a weaker mode is safe.
+                    if self._fall_back(response.status_code, body):
+                        continue
+                response.raise_for_status()
+                for data in iter_sse_data(response):
+                    check_cancelled(cancel)
+                    if data == "[DONE]":
+                        break
+                    event = json.loads(data)
+                    if event.get("usage"):
+                        self._record(event["usage"])
+                    choices = event.get("choices") or []
+                    if not choices:
+                        continue
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+                return
+
+    def _payload(self, messages: list[dict[str, str]]) -> dict[str, Any]:
         payload: dict[str, Any] = {
             "model": self.model,
             "messages": messages,
             "temperature": self.temperature,
             "max_tokens": self.max_output_tokens,
-            "response_format": {"type": "json_object"},
         }
-        headers = {
+        mode = self._mode()
+        if mode == "schema":
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "turn_output", "strict": True, "schema": self._strict()},
+            }
+        elif mode == "json":
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def _strict(self) -> dict[str, Any]:
+        # GameSession swaps json_schema after every turn (_refresh_output_schema).
+        if self.json_schema is not self._strict_source:
+            self._strict_source = self.json_schema
+            self._strict_schema = openai_strict_schema(self.json_schema or {})
+        return self._strict_schema
+
+    def _mode(self) -> str:
+        if self.output_mode == "schema" and not self.json_schema:
+            return "json"
+        return self.output_mode
+
+    def _fall_back(self, status_code: int, body: str) -> bool:
+        mode = fallback_mode(self._mode(), status_code, body)
+        if mode is None:
+            return False
+        self.output_mode = mode
+        return True
+
+    def submit_batch(
+        self, batch: list[list[dict[str, str]]], completion_window: str = "24h"
+    ) -> str:
+        # Offline Batch API: cheaper and not rate limited like live calls, but
+        # results can take up to the completion window. For simulation runs,
+        # never for live play. Returns the batch id for batch_results().
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": f"request-{index}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": self._payload(messages),
+                },
+                ensure_ascii=False,
+            )
+            for index, messages in enumerate(batch)
+        ]
+        url = f"{self.base_url}/files"
+        client = self.pool.get(url)
+        response = client.post(
+            url,
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")},
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        payload = {
+            "input_file_id": response.json()["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": completion_window,
+        }
+        response = client.post(
+            f"{self.base_url}/batches", json=payload, headers=self._headers(), timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def batch_results(
+        self,
+        batch_id: str,
+        size: int,
+        poll_interval: float = 30.0,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> list[str | Exception]:
+        # Waits for the batch to finish and returns its outputs in submission
+        # order; requests that failed or never ran come back as exceptions.
+        url = f"{self.base_url}/batches/{batch_id}"
+        client = self.pool.get(url)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            check_cancelled(cancel)
+            response = client.get(url, headers=self._headers(), timeout=self.timeout)
+            response.raise_for_status()
+            info = response.json()
+            if info.get("status") in _BATCH_DONE:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"OpenAI batch {batch_id} still {info.get('status')}")
+            time.sleep(poll_interval)
+
+        missing = f"Request missing from OpenAI batch {batch_id} ({info.get('status')})"
+        results: list[str | Exception] = [RuntimeError(missing) for _ in range(size)]
+        for file_id in (info.get("output_file_id"), info.get("error_file_id")):
+            if not file_id:
+                continue
+            url = f"{self.base_url}/files/{file_id}/content"
+            response = client.get(url, headers=self._headers(), timeout=self.timeout)
+            response.raise_for_status()
+            for line in response.text.splitlines():
+                if line.strip():
+                    self._batch_line(json.loads(line), results)
+        return results
+
+    def complete_offline(
+        self,
+        batch: list[list[dict[str, str]]],
+        poll_interval: float = 30.0,
+        timeout: float | None = None,
+        cancel: CancelToken | None = None,
+    ) -> list[str | Exception]:
+        batch_id = self.submit_batch(batch)
+        return self.batch_results(batch_id, len(batch), poll_interval, timeout, cancel)
+
+    def _batch_line(self, item: dict[str, Any], results: list[str | Exception]) -> None:
+        index = int(str(item.get("custom_id", "")).rsplit("-", 1)[-1])
+        response = item.get("response") or {}
+        body = response.get("body") or {}
+        if response.get("status_code") == 200:
+            self._record(body.get("usage"))
+            results[index] = body["choices"][0]["message"]["content"]
+        else:
+            error = item.get("error") or body.get("error") or response.get("status_code")
+            results[index] = RuntimeError(f"OpenAI batch request failed: {error}")
+
+    def _record(self, usage: dict[str, Any] | None) -> None:
+        usage = usage or {}
+        record_call(
+            self.name,
+            self.model,
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+        )
+
+    def _headers(self) -> dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
-        with httpx.Client(timeout=60.0) as client:
-            response = client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-        return data["choices"][0]["message"]["content"]
+
+    def close(self) -> None:
+        if self._owns_pool:
+            self.pool.close()
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import contextvars
+import queue
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+from cbse.engine.llm.base import LLMClient, unwrap
+from cbse.engine.llm.cancel import CancelToken, LLMCancelled, check_cancelled
+
+# How often the race loop wakes up to notice the caller cancelling.
+_POLL_SECONDS = 0.1
+
+
+class LLMUnavailable(RuntimeError):
+    # No route answered: every breaker is open, every route failed, or the
+    # latency SLO ran out. Not worth an LLM repair round-trip.
+    pass
+
+
+class CircuitBreaker:
+    # Opens after `failures` consecutive errors; once `reset_after` seconds have
+    # passed a single probe request is let through to decide whether to close.
+    def __init__(
+        self,
+        failures: int = 3,
+        reset_after: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failures = failures
+        self.reset_after = reset_after
+        self.clock = clock
+        self.consecutive = 0
+        self.opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_after:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive += 1
+            self._probing = False
+            if self.consecutive >= self.failures or self.opened_at is not None:
+                self.opened_at = self.clock()
+
+    def release(self) -> None:
+        # An abandoned request says nothing about health; free the probe slot.
+        with self._lock:
+            self._probing = False
+
+
+@dataclass
+class Route:
+    client: LLMClient
+    label: str
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    # Time to first output, kept apart for streaming and whole completions.
+    latencies: dict[bool, deque[float]] = field(
+        default_factory=lambda: {False: deque(maxlen=64), True: deque(maxlen=64)}
+    )
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_latency(self, streaming: bool, seconds: float) -> None:
+        with self._lock:
+            self.latencies[streaming].append(seconds)
+
+    def quantile(self, streaming: bool, q: float, min_samples: int = 5) -> float | None:
+        with self._lock:
+            samples = sorted(self.latencies[streaming])
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class RouterClient(LLMClient):
+    # Sends each request down an ordered list of routes (cheapest first).
+    # Routes with an open breaker are skipped; a route that errors fails over to
+    # the next one; a route that has not produced output by its own p90 latency
+    # gets a hedged request on the next route, and the first to answer wins.
+    # With an SLO the whole race is bounded: no first output by then raises
+    # LLMUnavailable. escalate() asks the next tier after output that failed
+    # validation.
+    name = "router"
+
+    def __init__(
+        self,
+        routes: list[Route],
+        slo_ms: float | None = None,
+        hedge_quantile: float = 0.9,
+        hedge: bool = True,
+    ) -> None:
+        if not routes:
+            raise ValueError("RouterClient needs at least one route")
+        self.routes = routes
+        self.slo = slo_ms / 1000 if slo_ms else None
+        self.hedge_quantile = hedge_quantile
+        self.hedge = hedge
+        self._executor = ThreadPoolExecutor(
+            max_workers=2 * len(routes), thread_name_prefix="cbse-route"
+        )
+        self._local = threading.local()
+        self.served: Counter[str] = Counter()
+        self.hedges = 0
+        self.failovers = 0
+        self.escalations = 0
+        self.unavailable = 0
+
+    @property
+    def model(self) -> str:
+        return "+".join(route.label for route in self.routes)
+
+    @property
+    def max_parallel(self) -> int:
+        return max(getattr(unwrap(route.client), "max_parallel", 1) for route in self.routes)
+
+    @property
+    def temperature(self) -> float:
+        return max(
+            getattr(unwrap(route.client), "temperature", 0.0) or 0.0 for route in self.routes
+        )
+
+    @property
+    def last_route(self) -> str | None:
+        # Route that served the latest request made from this thread.
+        tier = getattr(self._local, "tier", None)
+        return None if tier is None else self.routes[tier].label
+
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        return "".join(self._race(messages, cancel, streaming=False, start=0))
+
+    def stream(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> Iterator[str]:
+        yield from self._race(messages, cancel, streaming=True, start=0)
+
+    def escalate(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> str | None:
+        tier = getattr(self._local, "tier", None)
+        start = 0 if tier is None else tier + 1
+        if start >= len(self.routes):
+            return None
+        self.escalations += 1
+        return "".join(self._race(messages, cancel, streaming=False, start=start))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "served": dict(self.served),
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+            "escalations": self.escalations,
+            "unavailable": self.unavailable,
+            "open": [route.label for route in self.routes if route.breaker.state == "open"],
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for route in self.routes:
+            route.client.close()
+
+    def _race(
+        self,
+        messages: list[dict[str, str]],
+        cancel: CancelToken | None,
+        streaming: bool,
+        start: int,
+    ) -> Iterator[str]:
+        check_cancelled(cancel)
+        candidates = list(range(start, len(self.routes)))
+        events: queue.Queue[tuple[str, int, Any]] = queue.Queue()
+        running: dict[int, CancelToken] = {}
+        errors: list[str] = []
+        winner: int | None = None
+        started = time.monotonic()
+        deadline = started + self.slo if self.slo else None
+
+        def launch() -> float | None:
+            # Starts the next route whose breaker allows it; returns when to
+            # hedge it, or None if nothing could be started.
+            while candidates:
+                index = candidates.pop(0)
+                route = self.routes[index]
+                if not route.breaker.allow():
+                    errors.append(f"{route.label}: circuit open")
+                    continue
+                token = CancelToken()
+                running[index] = token
+                # Attempts run in the caller's context so they keep its priority.
+                context = contextvars.copy_context()
+                self._executor.submit(
+                    context.run, self._attempt, index, messages, token, streaming, events
+                )
+                return time.monotonic() + self._hedge_delay(route, streaming)
+            return None
+
+        next_hedge = launch()
+        if next_hedge is None:
+            self.unavailable += 1
+            raise LLMUnavailable("No LLM route available: " + "; ".join(errors))
+        try:
+            while True:
+                check_cancelled(cancel)
+                waits = [_POLL_SECONDS]
+                if winner is None:
+                    waits += [t - time.monotonic() for t in (next_hedge, deadline) if t is not None]
+                try:
+                    kind, index, payload = events.get(timeout=max(0.0, min(waits)))
+                except queue.Empty:
+                    if winner is not None:
+                        continue
+                    now = time.monotonic()
+                    if deadline is not None and now >= deadline:
+                        self.unavailable += 1
+                        raise LLMUnavailable(
+                            f"No LLM response within {self.slo * 1000:.0f} ms"
+                        ) from None
+                    if next_hedge is not None and now >= next_hedge:
+                        next_hedge = launch() if candidates else None
+                        if next_hedge is not None:
+                            self.hedges += 1
+                    continue
+                if winner is not None and index != winner:
+                    continue
+                if kind == "error":
+                    running.pop(index, None)
+                    if winner is not None:
+                        # Output already reached the caller; no clean failover.
+                        raise payload
+                    errors.append(f"{self.routes[index].label}: {payload}")
+                    if running:
+                        continue
+                    next_hedge = launch()
+                    if next_hedge is None:
+                        self.unavailable += 1
+                        raise LLMUnavailable("All LLM routes failed: " + "; ".join(errors))
+                    self.failovers += 1
+                    continue
+                if winner is None:
+                    winner = index
+                    self._local.tier = index
+                    self.served[self.routes[index].label] += 1
+                    for other, token in running.items():
+                        if other != index:
+                            token.cancel()
+                if kind == "chunk":
+                    yield payload
+                else:
+                    return
+        finally:
+            # Covers losers, the SLO timeout, caller cancel and a consumer that
+            # stopped reading; cancelling a finished attempt is a no-op.
+            for token in running.values():
+                token.cancel()
+
+    def _hedge_delay(self, route: Route, streaming: bool) -> float:
+        if not self.hedge:
+            return float("inf")
+        delay = route.quantile(streaming, self.hedge_quantile)
+        if delay is None:
+            # No history yet: hedge halfway to the SLO, or not at all.
+            return self.slo / 2 if self.slo else float("inf")
+        return delay
+
+    def _attempt(
+        self,
+        index: int,
+        messages: list[dict[str, str]],
+        token: CancelToken,
+        streaming: bool,
+        events: queue.Queue[tuple[str, int, Any]],
+    ) -> None:
+        route = self.routes[index]
+        started = time.monotonic()
+        try:
+            if streaming:
+                first = True
+                for chunk in route.client.stream(messages, cancel=token):
+                    if first:
+                        route.record_latency(True, time.monotonic() - started)
+                        first = False
+                    events.put(("chunk", index, chunk))
+            else:
+                content = route.client.complete(messages, cancel=token)
+                route.record_latency(False, time.monotonic() - started)
+                events.put(("chunk", index, content))
+        except Exception as exc:
+            if token.cancelled or isinstance(exc, LLMCancelled):
+                route.breaker.release()
+                return
+            route.breaker.record_failure()
+            events.put(("error", index, exc))
+            return
+        route.breaker.record_success()
+        events.put(("done", index, None))
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from cbse.engine.llm.base import LLMClient, unwrap
+from cbse.engine.llm.cancel import CancelToken
+from cbse.engine.llm.ollama_provider import OllamaProvider
+from cbse.engine.utils import estimate_tokens
+
+INTERACTIVE = 0
+REPAIR = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", REPAIR: "repair", BACKGROUND: "background"}
+
+# How often a waiting request wakes up to notice its caller cancelling.
+_POLL_SECONDS = 0.1
+
+_priority: ContextVar[int] = ContextVar("cbse_llm_priority", default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    # Only ever lowers urgency, so a repair made on behalf of background work
+    # stays background.
+    token = _priority.set(max(priority, _priority.get()))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass(frozen=True)
+class ProviderLimits:
+    # Zero means unlimited.
+    concurrency: int = 0
+    tokens_per_minute: int = 0
+
+
+# A local Ollama runs OLLAMA_NUM_PARALLEL requests per model (as many as
+# OllamaProvider.max_parallel); more only queue inside Ollama, where priority
+# no longer applies. Hosted APIs queue on their side.
+DEFAULT_LIMITS = {"ollama": ProviderLimits(concurrency=OllamaProvider.max_parallel)}
+
+
+def limits_from_env() -> dict[str, ProviderLimits]:
+    # CBSE_LLM_CONCURRENCY="ollama=1,openai=4", CBSE_LLM_TOKENS_PER_MIN="openai=90000"
+    concurrency = _parse_pairs(os.getenv("CBSE_LLM_CONCURRENCY"))
+    tokens = _parse_pairs(os.getenv("CBSE_LLM_TOKENS_PER_MIN"))
+    limits = dict(DEFAULT_LIMITS)
+    for name in set(concurrency) | set(tokens):
+        base = limits.get(name, ProviderLimits())
+        limits[name] = ProviderLimits(
+            concurrency=concurrency.get(name, base.concurrency),
+            tokens_per_minute=tokens.get(name, base.tokens_per_minute),
+        )
+    return limits
+
+
+def _parse_pairs(text: str | None) -> dict[str, int]:
+    pairs: dict[str, int] = {}
+    for item in (text or "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            pairs[name.strip().lower()] = int(value)
+    return pairs
+
+
+@dataclass
+class Ticket:
+    priority: int
+    cost: int
+    token: CancelToken
+    enqueued: float
+    started: float = 0.0
+
+
+@dataclass
+class _Lane:
+    limits: ProviderLimits
+    running: list[Ticket] = field(default_factory=list)
+    waiting: list[tuple[int, int, Ticket]] = field(default_factory=list)
+    tokens: float = 0.0
+    refilled: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self) -> None:
+        self.tokens = float(self.limits.tokens_per_minute)
+
+    def refill(self, now: float) -> None:
+        capacity = self.limits.tokens_per_minute
+        if capacity:
+            self.tokens = min(capacity, self.tokens + (now - self.refilled) * capacity / 60)
+        self.refilled = now
+
+    def token_wait(self, cost: int) -> float:
+        # Seconds until the bucket holds `cost` tokens; requests larger than
+        # the whole bucket only wait for it to be full.
+        capacity = self.limits.tokens_per_minute
+        if not capacity:
+            return 0.0
+        needed = min(cost, capacity) - self.tokens
+        return max(0.0, needed * 60 / capacity)
+
+    def slot_free(self) -> bool:
+        return not self.limits.concurrency or len(self.running) < self.limits.concurrency
+
+
+class LLMScheduler:
+    # One lane per provider endpoint. Waiting requests are served strictly by
+    # priority (interactive, then repair, then background) and FIFO within a
+    # priority, subject to the lane's concurrency and token-rate limits. When
+    # foreground work finds the lane full, running background requests are
+    # cancelled to make room.
+    def __init__(self, limits: dict[str, ProviderLimits] | None = None) -> None:
+        self.limits = DEFAULT_LIMITS if limits is None else limits
+        self._lanes: dict[tuple[str, str | None], _Lane] = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self.queue_ms: dict[int, deque[float]] = {
+            priority: deque(maxlen=256) for priority in PRIORITY_NAMES
+        }
+        self.completed: Counter[int] = Counter()
+        self.preempted = 0
+
+    def acquire(
+        self,
+        key: tuple[str, str | None],
+        priority: int,
+        cost: int,
+        cancel: CancelToken | None = None,
+    ) -> Ticket:
+        ticket = Ticket(
+            priority=priority, cost=cost, token=CancelToken(cancel), enqueued=time.monotonic()
+        )
+        entry = (priority, next(self._seq), ticket)
+        with self._cond:
+            lane = self._lane(key)
+            heapq.heappush(lane.waiting, entry)
+            try:
+                while True:
+                    ticket.token.raise_if_cancelled()
+                    now = time.monotonic()
+                    lane.refill(now)
+                    wait = self._start_wait(lane, ticket)
+                    if wait == 0:
+                        break
+                    if (
+                        not lane.slot_free()
+                        and priority < BACKGROUND
+                        and lane.waiting[0][2] is ticket
+                    ):
+                        self._preempt(lane)
+                    self._cond.wait(timeout=min(wait, _POLL_SECONDS))
+            except BaseException:
+                lane.waiting.remove(entry)
+                heapq.heapify(lane.waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(lane.waiting)
+            lane.running.append(ticket)
+            if lane.limits.tokens_per_minute:
+                lane.tokens -= cost
+            ticket.started = now
+            self.queue_ms[priority].append((now - ticket.enqueued) * 1000)
+            # The next waiter may be able to start too.
+            self._cond.notify_all()
+        return ticket
+
+    def release(self, key: tuple[str, str | None], ticket: Ticket) -> None:
+        with self._cond:
+            lane = self._lane(key)
+            if ticket in lane.running:
+                lane.running.remove(ticket)
+                self.completed[ticket.priority] += 1
+            self._cond.notify_all()
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            queue_ms = {
+                PRIORITY_NAMES[priority]: {
+                    "count": len(samples),
+                    "p50": round(_quantile(samples, 0.5), 1),
+                    "p95": round(_quantile(samples, 0.95), 1),
+                }
+                for priority, samples in self.queue_ms.items()
+                if samples
+            }
+            return {
+                "queue_ms": queue_ms,
+                "completed": {PRIORITY_NAMES[p]: n for p, n in self.completed.items()},
+                "preempted": self.preempted,
+                "running": sum(len(lane.running) for lane in self._lanes.values()),
+                "waiting": sum(len(lane.waiting) for lane in self._lanes.values()),
+            }
+
+    def _lane(self, key: tuple[str, str | None]) -> _Lane:
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane(self.limits.get(key[0], ProviderLimits()))
+        return lane
+
+    def _start_wait(self, lane: _Lane, ticket: Ticket) -> float:
+        if lane.waiting[0][2] is not ticket or not lane.slot_free():
+            return _POLL_SECONDS
+        return lane.token_wait(ticket.cost)
+
+    def _preempt(self, lane: _Lane) -> None:
+        # Newest background request first: it has done the least work. One at
+        # a time; a cancelled request frees its slot once its provider notices.
+        if any(running.token.cancelled for running in lane.running):
+            return
+        for running in reversed(lane.running):
+            if running.priority == BACKGROUND and not running.token.cancelled:
+                running.token.cancel()
+                self.preempted += 1
+                return
+
+
+def _quantile(samples: deque[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ScheduledClient(LLMClient):
+    # Takes a scheduler slot for the provider endpoint before every call, at
+    # the priority of the calling context (see llm_priority).
+    def __init__(self, inner: LLMClient, scheduler: LLMScheduler) -> None:
+        self.inner = inner
+        self.scheduler = scheduler
+        self.name = inner.name
+        provider = unwrap(inner)
+        self.key = (provider.name, getattr(provider, "base_url", None))
+
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        ticket = self.scheduler.acquire(self.key, current_priority(), self._cost(messages), cancel)
+        try:
+            return self.inner.complete(messages, cancel=ticket.token)
+        finally:
+            self.scheduler.release(self.key, ticket)
+
+    def stream(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None = None
+    ) -> Iterator[str]:
+        ticket = self.scheduler.acquire(self.key, current_priority(), self._cost(messages), cancel)
+        try:
+            yield from self.inner.stream(messages, cancel=ticket.token)
+        finally:
+            self.scheduler.release(self.key, ticket)
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def _cost(self, messages: list[dict[str, str]]) -> int:
+        prompt = sum(estimate_tokens(m["content"]) for m in messages)
+        return prompt + (getattr(unwrap(self.inner), "max_output_tokens", 0) or 0)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import os
+from typing import Any
+
+# Output modes from most to least constrained. Providers start at the first one
+# the model accepts and step down when the API rejects the request format.
+OUTPUT_MODES = ("schema", "json", "text")
+
+_ALL_TYPES = ["string", "number", "boolean", "array", "object", "null"]
+_OPENAI_DROP = {"minItems", "maxItems", "default", "title"}
+_GEMINI_DROP = {"additionalProperties", "default", "title"}
+# Words that appear in 400 responses when a model or endpoint does not support
+# the structured-output fields, as opposed to e.g. an over-long prompt.
+_FORMAT_ERROR_HINTS = ("response_format", "schema", "json", "mime", "instruction")
+
+
+def output_mode_from_env(default: str = "schema") -> str:
+    mode = os.getenv("CBSE_STRUCTURED_OUTPUT") or default
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown structured output mode: {mode}")
+    return mode
+
+
+def fallback_mode(mode: str, status_code: int, body: str) -> str | None:
+    if status_code != 400 or mode == OUTPUT_MODES[-1]:
+        return None
+    text = body.lower()
+    if not any(hint in text for hint in _FORMAT_ERROR_HINTS):
+        return None
+    return OUTPUT_MODES[OUTPUT_MODES.index(mode) + 1]
+
+
+def _value_variants(types: list[str]) -> list[dict[str, Any]]:
+    # Free-form values (state_updates[].value) cannot stay untyped in either
+    # dialect. Objects have no fixed shape, so they are left out; arrays are
+    # lists of strings like inventories.
+    variants: list[dict[str, Any]] = []
+    for type_name in types:
+        if type_name == "array":
+            variants.append({"type": "array", "items": {"type": "string"}})
+        elif type_name != "object":
+            variants.append({"type": type_name})
+    return variants
+
+
+def openai_strict_schema(schema: dict[str, Any]) -> dict[str, Any]:
+    # Strict mode wants every property required, additionalProperties false on
+    # every object and a type on every node. Item counts are left to
+    # SchemaValidator.
+    if "anyOf" in schema:
+        return {"anyOf": [openai_strict_schema(item) for item in schema["anyOf"]]}
+    type_name = schema.get("type")
+    if type_name is None or isinstance(type_name, list):
+        return {"anyOf": _value_variants(type_name or _ALL_TYPES)}
+    out = {key: value for key, value in schema.items() if key not in _OPENAI_DROP}
+    if type_name == "object":
+        properties = schema.get("properties", {})
+        out["properties"] = {key: openai_strict_schema(value) for key, value in properties.items()}
+        out["required"] = list(properties)
+        out["additionalProperties"] = False
+    elif type_name == "array":
+        out["items"] = openai_strict_schema(schema.get("items", {}))
+    return out
+
+
+def gemini_response_schema(schema: dict[str, Any]) -> dict[str, Any]:
+    # Gemini's responseSchema is an OpenAPI subset: upper-case single types,
+    # nullable instead of a null type, no additionalProperties.
+    if "anyOf" in schema:
+        return {"anyOf": [gemini_response_schema(item) for item in schema["anyOf"]]}
+    type_name = schema.get("type")
+    if type_name is None or isinstance(type_name, list):
+        types = type_name or _ALL_TYPES
+        variants = [
+            gemini_response_schema(item)
+            for item in _value_variants([t for t in types if t != "null"])
+        ]
+        out: dict[str, Any] = variants[0] if len(variants) == 1 else {"anyOf": variants}
+        if "null" in types:
+            out["nullable"] = True
+        return out
+    out = {key: value for key, value in schema.items() if key not in _GEMINI_DROP}
+    out["type"] = type_name.upper()
+    if type_name == "object":
+        properties = schema.get("properties", {})
+        out["properties"] = {
+            key: gemini_response_schema(value) for key, value in properties.items()
+        }
+        out["propertyOrdering"] = list(properties)
+    elif type_name == "array":
+        out["items"] = gemini_response_schema(schema.get("items", {}))
+    return out
@@ -0,0 +1,415 @@
+from __future__ import annotations
+
+import ast
+import json
+import random
+import threading
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from cbse.engine.llm.base import LLMClient
+from cbse.engine.llm.cancel import CancelToken, check_cancelled
+from cbse.engine.models import GameDefinition, StateUpdateOp, Trigger, VariableDefinition
+from cbse.engine.rules_engine import RulesEngine
+from cbse.engine.utils import PathError, clone_state, deep_get, is_number
+
+_OPS = {
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+}
+_FLIPPED = {"==": "==", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+_LITERALS = {"true": True, "True": True, "false": False, "False": False}
+_RISKS = ("low", "medium", "high")
+_TEXT = {
+    "zh": {
+        "narrative": "第 {turn} 回合。{changes}",
+        "changed": "{labels}起了变化。",
+        "quiet": "一切暂时平静。",
+        "separator": "、",
+        "verbs": ("关注", "推进", "回避", "试探"),
+        "hint": "可能影响{label}。",
+        "item": "第 {turn} 回合的记录",
+        "fact": "第 {turn} 回合：{label}发生变化",
+    },
+    "en": {
+        "narrative": "Turn {turn}. {changes}",
+        "changed": "{labels} shift.",
+        "quiet": "Nothing moves for now.",
+        "separator": ", ",
+        "verbs": ("Watch ", "Push ", "Avoid ", "Probe "),
+        "hint": "May affect {label}.",
+        "item": "Entry from turn {turn}",
+        "fact": "Turn {turn}: {label} changed",
+    },
+}
+
+
+@dataclass(frozen=True)
+class Goal:
+    # One "path op constant" comparison of a trigger or ending condition.
+    path: str
+    op: str
+    value: Any
+
+
+def condition_goals(expr: str) -> list[Goal]:
+    # Comparisons under `or` and `not` are returned as well; steering toward
+    # any of them is still a plausible move.
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError:
+        return []
+    goals = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Compare):
+            continue
+        operands = [node.left, *node.comparators]
+        for left, op, right in zip(operands, node.ops, operands[1:]):
+            symbol = _OPS.get(type(op))
+            if symbol is None:
+                continue
+            path, value = _dotted(left), _constant(right)
+            if path is None:
+                path, value, symbol = _dotted(right), _constant(left), _FLIPPED[symbol]
+            if path is not None and value is not _MISSING:
+                goals.append(Goal(path, symbol, value))
+    return goals
+
+
+_MISSING = object()
+
+
+def _dotted(node: ast.AST) -> str | None:
+    if isinstance(node, ast.Name) and node.id not in _LITERALS:
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted(node.value)
+        return f"{base}.{node.attr}" if base else None
+    return None
+
+
+def _constant(node: ast.AST) -> Any:
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in _LITERALS:
+        return _LITERALS[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _constant(node.operand)
+        return -value if is_number(value) else _MISSING
+    return _MISSING
+
+
+def _met(current: Any, goal: Goal) -> bool:
+    try:
+        if goal.op == "==":
+            return current == goal.value
+        if goal.op == "!=":
+            return current != goal.value
+        if goal.op == "<":
+            return current < goal.value
+        if goal.op == "<=":
+            return current <= goal.value
+        if goal.op == ">":
+            return current > goal.value
+        return current >= goal.value
+    except TypeError:
+        return True
+
+
+@dataclass(frozen=True)
+class _Target:
+    path: str
+    var: VariableDefinition
+    kind: str
+
+
+class SyntheticProvider(LLMClient):
+    # Plays any game without a model: state_updates are drawn from the
+    # game's own variables (type, bounds, enum values, update policy,
+    # readonly) and nudged toward trigger conditions and, with `ending` set
+    # to "win" or "lose", toward one of that ending's conditions with
+    # probability `bias`. `state` returns the live game state; without it the
+    # provider plays its own copy through the rules engine and starts over
+    # whenever that copy reaches an ending, so it can run unattended.
+    name = "synthetic"
+    max_parallel = 64
+
+    def __init__(
+        self,
+        definition: GameDefinition,
+        triggers: list[Trigger] | None = None,
+        seed: int = 0,
+        ending: str | None = None,
+        bias: float = 0.5,
+        trigger_bias: float = 0.3,
+        state: Callable[[], dict[str, Any]] | None = None,
+    ) -> None:
+        if ending not in (None, "win", "lose"):
+            raise ValueError(f"Unknown ending: {ending}")
+        self.definition = definition
+        self.ending = ending
+        self.bias = bias
+        self.trigger_bias = trigger_bias
+        self.rng = random.Random(f"{seed}:{definition.game_id}")
+        self.text = _TEXT["zh" if definition.language.startswith("zh") else "en"]
+        self.variables = {var.id: var for var in definition.variables}
+        self.labels = [var.label for var in definition.variables]
+        self.targets = [
+            target
+            for var in definition.variables
+            if not var.rules.readonly
+            for target in self._targets(var, definition.initial_state.get(var.id), var.id)
+        ]
+        self.trigger_goals = [
+            goals for goals in (condition_goals(t.when) for t in triggers or []) if goals
+        ]
+        conditions = {
+            "win": definition.win_conditions,
+            "lose": definition.lose_conditions,
+        }.get(ending or "", [])
+        self.ending_goals = condition_goals(self.rng.choice(conditions)) if conditions else []
+        self.turn_index = 0
+        self.stats_counter: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._state = state
+        self._rules: RulesEngine | None = None
+        if state is None:
+            self._rules = RulesEngine(
+                self.variables,
+                triggers or [],
+                definition.win_conditions,
+                definition.lose_conditions,
+            )
+            self._restart()
+
+    def complete(self, messages: list[dict[str, str]], cancel: CancelToken | None = None) -> str:
+        check_cancelled(cancel)
+        with self._lock:
+            self.turn_index += 1
+            state = self._state() if self._state else self._shadow
+            updates = self._updates(state)
+            payload = self._payload(updates)
+            if self._rules is not None:
+                self._advance(updates)
+        return json.dumps(payload, ensure_ascii=False)
+
+    def attach(self, state: Callable[[], dict[str, Any]]) -> None:
+        # A game session hands over its live state; the private copy is dropped.
+        with self._lock:
+            self._state = state
+            self._rules = None
+
+    def stats(self) -> dict[str, int]:
+        return dict(self.stats_counter)
+
+    def _restart(self) -> None:
+        self._shadow = clone_state(self.definition.initial_state)
+        self._triggered: set[str] = set()
+
+    def _advance(self, updates: list[dict[str, Any]]) -> None:
+        assert self._rules is not None
+        result = self._rules.apply(
+            self._shadow, [StateUpdateOp(**update) for update in updates], self._triggered
+        )
+        self.stats_counter["turns"] += 1
+        self.stats_counter["updates"] += len(result.applied_updates)
+        self.stats_counter["rejected"] += len(result.rejected_updates)
+        if result.end.is_game_over:
+            self.stats_counter[result.end.ending_id] += 1
+            self._restart()
+
+    def _targets(self, var: VariableDefinition, value: Any, path: str) -> list[_Target]:
+        # Object variables contribute their leaves, typed by the initial value.
+        if isinstance(value, dict):
+            return [
+                target
+                for key, item in value.items()
+                for target in self._targets(var, item, f"{path}.{key}")
+            ]
+        if path == var.id and var.type in ("integer", "number", "boolean", "string", "list"):
+            kind = var.type
+        elif path == var.id and var.type == "enum":
+            if not var.enum_values:
+                return []
+            kind = "enum"
+        elif isinstance(value, bool):
+            kind = "boolean"
+        elif is_number(value):
+            kind = "integer" if isinstance(value, int) else "number"
+        elif isinstance(value, str):
+            kind = "string"
+        elif isinstance(value, list):
+            kind = "list"
+        else:
+            return []
+        if var.rules.update_policy == "inc_dec_only" and kind not in ("integer", "number"):
+            return []
+        return [_Target(path, var, kind)]
+
+    def _updates(self, state: dict[str, Any]) -> list[dict[str, Any]]:
+        rng = self.rng
+        updates: list[dict[str, Any]] = []
+        touched: set[str] = set()
+        steered = []
+        if self.ending_goals and rng.random() < self.bias:
+            steered.append(self.ending_goals)
+        if self.trigger_goals and rng.random() < self.trigger_bias:
+            steered.append(rng.choice(self.trigger_goals))
+        for goals in steered:
+            unmet = [goal for goal in goals if self._unmet(state, goal)]
+            if unmet:
+                update = self._toward(state, rng.choice(unmet))
+                if update and update["path"] not in touched:
+                    touched.add(update["path"])
+                    updates.append(update)
+        if self.targets:
+            for _ in range(rng.randint(1, 3)):
+                target = rng.choice(self.targets)
+                if target.path in touched or len(updates) >= 4:
+                    continue
+                update = self._random_update(state, target)
+                if update:
+                    touched.add(target.path)
+                    updates.append(update)
+        return updates
+
+    def _unmet(self, state: dict[str, Any], goal: Goal) -> bool:
+        try:
+            return not _met(deep_get(state, goal.path), goal)
+        except PathError:
+            return False
+
+    def _toward(self, state: dict[str, Any], goal: Goal) -> dict[str, Any] | None:
+        var = self.variables.get(goal.path.split(".")[0])
+        if var is None or var.rules.readonly:
+            return None
+        current = deep_get(state, goal.path)
+        policy = var.rules.update_policy
+        if is_number(current) and is_number(goal.value):
+            step = self._step(var, goal.path)
+            if goal.op in ("<", "<="):
+                op = "dec"
+            elif goal.op in (">", ">=", "!="):
+                op = "inc"
+            else:
+                op = "inc" if goal.value > current else "dec"
+                step = min(step, abs(goal.value - current))
+            return self._numeric(goal.path, current, op, step, policy)
+        if goal.op != "==" or policy == "inc_dec_only":
+            return None
+        if isinstance(current, bool) != isinstance(goal.value, bool):
+            return None
+        if var.type == "enum" and goal.path == var.id and goal.value not in (var.enum_values or []):
+            return None
+        return self._update("set", goal.path, goal.value)
+
+    def _random_update(self, state: dict[str, Any], target: _Target) -> dict[str, Any] | None:
+        rng = self.rng
+        try:
+            current = deep_get(state, target.path)
+        except PathError:
+            return None
+        policy = target.var.rules.update_policy
+        kind = target.kind
+        if kind in ("integer", "number"):
+            if not is_number(current):
+                return None
+            var = target.var
+            bounded = target.path == var.id and var.min is not None and var.max is not None
+            # Unbounded counters (time, years, tallies) mostly move forward.
+            op = rng.choice(("inc", "dec")) if bounded else rng.choices(("inc", "dec"), (3, 1))[0]
+            return self._numeric(target.path, current, op, self._step(var, target.path), policy)
+        if kind == "boolean":
+            if not isinstance(current, bool):
+                return None
+            if policy == "set_only":
+                return self._update("set", target.path, not current)
+            return self._update("toggle", target.path, None)
+        if kind == "enum":
+            options = [value for value in target.var.enum_values or [] if value != current]
+            return self._update("set", target.path, rng.choice(options)) if options else None
+        if kind == "string":
+            if not isinstance(current, str):
+                return None
+            return self._update("set", target.path, self._format("item"))
+        if not isinstance(current, list):
+            return None
+        if policy == "set_only":
+            return self._update("set", target.path, [*current, self._format("item")])
+        if current and rng.random() < 0.3:
+            return self._update("remove", target.path, rng.choice(current))
+        return self._update("push", target.path, self._format("item"))
+
+    def _numeric(
+        self, path: str, current: float, op: str, step: float, policy: str
+    ) -> dict[str, Any]:
+        if policy != "set_only":
+            return self._update(op, path, step)
+        value = current + step if op == "inc" else current - step
+        var = self.variables[path.split(".")[0]]
+        if path == var.id:
+            if var.min is not None:
+                value = max(var.min, value)
+            if var.max is not None:
+                value = min(var.max, value)
+        return self._update("set", path, value)
+
+    def _step(self, var: VariableDefinition, path: str) -> float:
+        rng = self.rng
+        if path == var.id and var.min is not None and var.max is not None:
+            span = var.max - var.min
+            if var.type == "number" and span < 20:
+                return round(span * rng.uniform(0.02, 0.1), 2)
+            return max(1, round(span * rng.uniform(0.02, 0.1)))
+        return rng.randint(1, 5)
+
+    def _update(self, op: str, path: str, value: Any) -> dict[str, Any]:
+        return {"op": op, "path": path, "value": value, "reason": "synthetic"}
+
+    def _label(self, path: str) -> str:
+        var = self.variables.get(path.partition(".")[0])
+        return var.label if var else path
+
+    def _format(self, key: str, **values: Any) -> str:
+        return self.text[key].format(turn=self.turn_index, **values)
+
+    def _payload(self, updates: list[dict[str, Any]]) -> dict[str, Any]:
+        text = self.text
+        labels = list(dict.fromkeys(self._label(update["path"]) for update in updates))
+        changes = (
+            self._format("changed", labels=text["separator"].join(labels))
+            if labels
+            else text["quiet"]
+        )
+        pool = labels + self.labels
+        verbs = text["verbs"]
+        choices = []
+        for index in range(3):
+            verb = verbs[(self.turn_index + index) % len(verbs)]
+            label = pool[index % len(pool)] if pool else ""
+            choices.append(
+                {
+                    "id": f"choice_{index + 1}",
+                    "label": f"{verb}{label}",
+                    "hint": text["hint"].format(label=label),
+                    "risk": _RISKS[index],
+                    "tags": ["synthetic"],
+                }
+            )
+        facts = (
+            [self._format("fact", label=labels[0])] if labels and self.rng.random() < 0.2 else []
+        )
+        return {
+            "narrative_markdown": self._format("narrative", changes=changes),
+            "choices": choices,
+            "state_updates": updates,
+            "new_facts": facts,
+            "events": [],
+            "end": {"is_game_over": False, "ending_id": "", "reason": ""},
+        }
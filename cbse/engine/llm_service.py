@@ -1,8 +1,16 @@
 from __future__ import annotations
 
+import time
+from collections.abc import Callable
 from dataclasses import dataclass
 
-from cbse.engine.llm.base import LLMClient
+from cbse.engine.json_stream import StringFieldScanner
+from cbse.engine.llm.base import LLMClient, unwrap
+from cbse.engine.llm.cancel import CancelToken, LLMCancelled, check_cancelled
+from cbse.engine.llm.cassette import CassetteError
+from cbse.engine.llm.metrics import LLMMetrics, MetricsRegistry, collect_calls
+from cbse.engine.llm.router import LLMUnavailable
+from cbse.engine.llm.scheduler import REPAIR, llm_priority
 from cbse.engine.models import Choice, EndState, Event, LLMOutput, StateUpdateOp
 from cbse.engine.schema_validator import SchemaError, SchemaValidator
 
@@ -13,6 +21,18 @@ class LLMResult:
     raw: str
     used_fallback: bool
     error: str | None = None
+    attempts: int = 1
+    repaired_locally: bool = False
+    escalated: bool = False
+    metrics: LLMMetrics | None = None
+
+
+def _outcome(result: LLMResult) -> str:
+    if result.used_fallback:
+        return "fallback"
+    if result.attempts > 1:
+        return "retried"
+    return "repaired_locally" if result.repaired_locally else "ok"
 
 
 class LLMService:
@@ -21,31 +41,157 @@ class LLMService:
         client: LLMClient,
         validator: SchemaValidator,
         max_retries: int = 2,
+        metrics: MetricsRegistry | None = None,
     ) -> None:
         self.client = client
         self.validator = validator
         self.max_retries = max_retries
+        self.metrics = metrics
+
+    def generate(
+        self,
+        messages: list[dict[str, str]],
+        on_narrative: Callable[[str], None] | None = None,
+        cancel: CancelToken | None = None,
+        speculative: bool = False,
+    ) -> LLMResult:
+        started = time.perf_counter()
+        first_output: list[float] = []
+        with collect_calls() as calls:
+            result = self._generate(messages, on_narrative, cancel, first_output)
+        provider = unwrap(self.client)
+        result.metrics = LLMMetrics.from_calls(
+            calls,
+            provider=provider.name,
+            model=str(getattr(provider, "model", "")),
+            outcome=_outcome(result),
+            attempts=result.attempts,
+            total_ms=(time.perf_counter() - started) * 1000,
+            ttft_ms=(first_output[0] - started) * 1000 if first_output else None,
+            kind="speculative" if speculative else "turn",
+        )
+        if self.metrics is not None:
+            self.metrics.observe(result.metrics)
+        return result
 
-    def generate(self, messages: list[dict[str, str]]) -> LLMResult:
+    def _generate(
+        self,
+        messages: list[dict[str, str]],
+        on_narrative: Callable[[str], None] | None,
+        cancel: CancelToken | None,
+        first_output: list[float],
+    ) -> LLMResult:
+        # Cancellation is not a model failure: it skips repair and fallback
+        # and surfaces as LLMCancelled. Neither is a cassette that no longer
+        # matches the prompts; CassetteError fails the turn loudly.
+        attempts = 1
+        raw = ""
         try:
-            raw = self.client.complete(messages)
-            output = self.validator.parse(raw)
-            return LLMResult(output=output, raw=raw, used_fallback=False)
+            if on_narrative is None:
+                raw = self.client.complete(messages, cancel=cancel)
+                first_output.append(time.perf_counter())
+            else:
+                raw = self._stream(messages, on_narrative, cancel, first_output)
+            output, repaired = self._parse(raw)
+            return LLMResult(output=output, raw=raw, used_fallback=False, repaired_locally=repaired)
+        except (LLMCancelled, CassetteError):
+            raise
+        except LLMUnavailable as exc:
+            return LLMResult(
+                output=self._fallback_output(), raw=raw, used_fallback=True, error=str(exc)
+            )
         except Exception as exc:
-            raw = getattr(exc, "raw", "") or ""
+            # Provider errors carry the body they choked on; schema errors
+            # leave raw as the text that failed to parse.
+            raw = getattr(exc, "raw", "") or raw
             error = str(exc)
 
+        # A router can hand the original prompt to a stronger tier, which
+        # usually beats asking the tier that just failed to repair itself.
+        # The call goes through the wrappers so it is cached and recorded.
+        while True:
+            check_cancelled(cancel)
+            try:
+                with llm_priority(REPAIR):
+                    escalated = self.client.escalate(messages, cancel=cancel)
+                if escalated is None:
+                    break
+                attempts += 1
+                raw = escalated
+                output, repaired = self._parse(raw)
+                return LLMResult(
+                    output=output,
+                    raw=raw,
+                    used_fallback=False,
+                    attempts=attempts,
+                    repaired_locally=repaired,
+                    escalated=True,
+                )
+            except (LLMCancelled, CassetteError):
+                raise
+            except LLMUnavailable as exc:
+                error = str(exc)
+                break
+            except Exception as exc:
+                raw = getattr(exc, "raw", "") or raw
+                error = str(exc)
+
         for _ in range(self.max_retries):
+            check_cancelled(cancel)
+            attempts += 1
             repair_messages = self._repair_messages(error, raw)
             try:
-                raw = self.client.complete(repair_messages)
-                output = self.validator.parse(raw)
-                return LLMResult(output=output, raw=raw, used_fallback=False)
+                with llm_priority(REPAIR):
+                    raw = self.client.complete(repair_messages, cancel=cancel)
+                output, repaired = self._parse(raw)
+                return LLMResult(
+                    output=output,
+                    raw=raw,
+                    used_fallback=False,
+                    attempts=attempts,
+                    repaired_locally=repaired,
+                )
+            except (LLMCancelled, CassetteError):
+                raise
+            except LLMUnavailable as exc:
+                error = str(exc)
+                break
             except Exception as exc:
                 error = str(exc)
 
         fallback = self._fallback_output()
-        return LLMResult(output=fallback, raw=raw, used_fallback=True, error=error)
+        return LLMResult(
+            output=fallback, raw=raw, used_fallback=True, error=error, attempts=attempts
+        )
+
+    def _parse(self, raw: str) -> tuple[LLMOutput, bool]:
+        # Most invalid output from small models is mechanically broken JSON;
+        # fixing it here saves a whole generation for the LLM repair prompt.
+        try:
+            return self.validator.parse(raw), False
+        except SchemaError as exc:
+            try:
+                return self.validator.repair(raw), True
+            except SchemaError:
+                raise exc from None
+
+    def _stream(
+        self,
+        messages: list[dict[str, str]],
+        on_narrative: Callable[[str], None],
+        cancel: CancelToken | None = None,
+        first_output: list[float] | None = None,
+    ) -> str:
+        scanner = StringFieldScanner("narrative_markdown")
+        chunks: list[str] = []
+        for chunk in self.client.stream(messages, cancel=cancel):
+            if not chunks and first_output is not None:
+                first_output.append(time.perf_counter())
+            chunks.append(chunk)
+            narrative = scanner.feed(chunk)
+            if narrative is not None:
+                on_narrative(narrative)
+        return "".join(chunks)
 
     def _repair_messages(self, error: str, raw: str) -> list[dict[str, str]]:
         return [
@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+from cbse.engine.llm.base import LLMClient
+from cbse.engine.llm.scheduler import BACKGROUND, llm_priority
+from cbse.engine.models import MemorySnapshot, StateUpdateOp, TurnRecord
+from cbse.engine.schema_validator import extract_json
+from cbse.engine.utils import estimate_tokens, is_number, truncate_to_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?.])\s*")
+
+
+def _first_sentences(text: str, max_chars: int) -> str:
+    text = " ".join(line.strip() for line in text.strip().splitlines() if line.strip())
+    text = text.replace("**", "").replace("#", "").strip()
+    if len(text) <= max_chars:
+        return text
+    kept = ""
+    for sentence in _SENTENCE_END.split(text):
+        if not sentence:
+            continue
+        if kept and len(kept) + len(sentence) > max_chars:
+            break
+        kept += sentence
+    if not kept or len(kept) > max_chars:
+        kept = text[: max_chars - 1].rstrip() + "…"
+    return kept
+
+
+def _short_value(value: Any, max_chars: int = 24) -> str:
+    text = value if isinstance(value, str) else str(value)
+    if len(text) > max_chars:
+        text = text[: max_chars - 1] + "…"
+    return text
+
+
+def format_update(update: StateUpdateOp) -> str:
+    path = update.path.lstrip("/").replace("/", ".")
+    op = update.op
+    if op == "inc":
+        return f"{path}+{_short_value(update.value)}"
+    if op == "dec":
+        return f"{path}-{_short_value(update.value)}"
+    if op == "push":
+        return f"{path}+=[{_short_value(update.value)}]"
+    if op == "remove":
+        return f"{path}-=[{_short_value(update.value)}]"
+    if op == "toggle":
+        return f"!{path}"
+    return f"{path}={_short_value(update.value)}"
+
+
+def build_turn_digest(
+    player_input: str,
+    narrative: str,
+    applied_updates: list[StateUpdateOp],
+    new_facts: list[str] | None = None,
+    story_chars: int = 120,
+) -> str:
+    parts = [f"Player: {player_input}"]
+    story = _first_sentences(narrative, story_chars)
+    if story:
+        parts.append(f"Story: {story}")
+    if applied_updates:
+        parts.append("Δ " + ", ".join(format_update(u) for u in applied_updates))
+    facts = [fact.strip() for fact in (new_facts or []) if fact.strip()]
+    if facts:
+        parts.append("Facts: " + "; ".join(facts[:3]))
+    return " | ".join(parts)
+
+
+def turn_digest(turn: TurnRecord) -> str:
+    # Saves written before digests existed carry an empty digest.
+    if turn.digest:
+        return turn.digest
+    return build_turn_digest(turn.player_input, turn.narrative_markdown, turn.applied_updates)
+
+
+_SESSION_SEPARATOR = " ‖ "
+
+
+# Turn digests roll up into chapter summaries; chapters that no longer fit the
+# token budget fold into a single session summary.
+@dataclass
+class RollingMemory:
+    chapter_size: int = 5
+    token_budget: int = 400
+    session_summary: str = ""
+    chapters: list[str] = field(default_factory=list)
+    summarized_turns: int = 0
+    scheduled_turns: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def session_budget(self) -> int:
+        return self.token_budget // 3
+
+    @property
+    def chapter_budget(self) -> int:
+        return max((self.token_budget - self.session_budget) // 3, 16)
+
+    def render(self) -> str:
+        with self._lock:
+            parts = []
+            if self.session_summary:
+                parts.append(f"Earlier: {self.session_summary}")
+            parts.extend(self.chapters)
+        return "\n".join(parts)
+
+    def take_pending(self, history: list[TurnRecord]) -> list[list[TurnRecord]]:
+        pending: list[list[TurnRecord]] = []
+        with self._lock:
+            while len(history) - self.scheduled_turns >= self.chapter_size:
+                pending.append(
+                    history[self.scheduled_turns : self.scheduled_turns + self.chapter_size]
+                )
+                self.scheduled_turns += self.chapter_size
+        return pending
+
+    def add_chapter(self, summary: str) -> None:
+        with self._lock:
+            self.chapters.append(truncate_to_tokens(summary, self.chapter_budget))
+            self.summarized_turns += self.chapter_size
+
+    def pop_overflow(self) -> str | None:
+        with self._lock:
+            total = estimate_tokens(self.session_summary) + sum(
+                estimate_tokens(c) for c in self.chapters
+            )
+            if total <= self.token_budget or len(self.chapters) <= 1:
+                return None
+            return self.chapters.pop(0)
+
+    def set_session_summary(self, summary: str) -> None:
+        with self._lock:
+            self.session_summary = truncate_to_tokens(summary, self.session_budget)
+
+    def snapshot(self) -> MemorySnapshot:
+        with self._lock:
+            return MemorySnapshot(
+                session_summary=self.session_summary,
+                chapters=list(self.chapters),
+                summarized_turns=self.summarized_turns,
+            )
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        snapshot: MemorySnapshot,
+        chapter_size: int = 5,
+        token_budget: int = 400,
+    ) -> RollingMemory:
+        return cls(
+            chapter_size=chapter_size,
+            token_budget=token_budget,
+            session_summary=snapshot.session_summary,
+            chapters=list(snapshot.chapters),
+            summarized_turns=snapshot.summarized_turns,
+            scheduled_turns=snapshot.summarized_turns,
+        )
+
+
+def _net_changes(turns: list[TurnRecord]) -> list[str]:
+    numeric: dict[str, float] = {}
+    other: dict[str, str] = {}
+    for turn in turns:
+        for update in turn.applied_updates:
+            path = update.path.lstrip("/").replace("/", ".")
+            if update.op in ("inc", "dec") and is_number(update.value):
+                sign = 1 if update.op == "inc" else -1
+                numeric[path] = numeric.get(path, 0) + sign * float(update.value)
+            else:
+                other[path] = format_update(update)
+    changes = [f"{path}{delta:+g}" for path, delta in numeric.items() if delta]
+    return changes + list(other.values())
+
+
+def summarize_chapter_extractive(turns: list[TurnRecord], budget: int) -> str:
+    prefix = f"T{turns[0].turn_index}-{turns[-1].turn_index}: "
+    changes = _net_changes(turns)
+    suffix = f" (Δ {', '.join(changes)})" if changes else ""
+    suffix = truncate_to_tokens(suffix, budget // 3)
+    share = max((budget - estimate_tokens(prefix + suffix)) // len(turns), 8)
+    beats = [
+        truncate_to_tokens(f"{t.player_input}→{_first_sentences(t.narrative_markdown, 80)}", share)
+        for t in turns
+    ]
+    return prefix + " / ".join(beats) + suffix
+
+
+def merge_session_extractive(session: str, chapter: str, budget: int) -> str:
+    pieces = [p for p in session.split(_SESSION_SEPARATOR) if p] + [chapter]
+    # Older pieces are dropped once each would get too small to be useful.
+    while len(pieces) > 1 and budget // len(pieces) < 24:
+        pieces.pop(0)
+    share = budget // len(pieces)
+    return _SESSION_SEPARATOR.join(truncate_to_tokens(p, share) for p in pieces)
+
+
+class MemorySummarizer:
+    # Without a client the roll-up is extractive and runs inline. With a client
+    # the summaries come from an LLM call on a single background worker, so the
+    # turn never waits for them.
+    def __init__(self, client: LLMClient | None = None) -> None:
+        self.client = client
+        self._executor: ThreadPoolExecutor | None = None
+        self._futures: list[Future] = []
+
+    def update(self, memory: RollingMemory, history: list[TurnRecord]) -> None:
+        pending = memory.take_pending(history)
+        if not pending:
+            return
+        if self.client is None:
+            self._roll_up(memory, pending)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cbse-memory")
+        self._futures = [f for f in self._futures if not f.done()]
+        self._futures.append(self._executor.submit(self._roll_up, memory, pending))
+
+    def wait(self, timeout: float | None = None) -> None:
+        for future in list(self._futures):
+            future.result(timeout=timeout)
+        self._futures = []
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _roll_up(self, memory: RollingMemory, pending: list[list[TurnRecord]]) -> None:
+        for turns in pending:
+            memory.add_chapter(self._summarize_chapter(turns, memory.chapter_budget))
+            while True:
+                oldest = memory.pop_overflow()
+                if oldest is None:
+                    break
+                memory.set_session_summary(
+                    self._merge_session(memory.session_summary, oldest, memory.session_budget)
+                )
+
+    def _summarize_chapter(self, turns: list[TurnRecord], budget: int) -> str:
+        extractive = summarize_chapter_extractive(turns, budget)
+        if self.client is None:
+            return extractive
+        first, last = turns[0].turn_index, turns[-1].turn_index
+        notes = "\n".join(f"- {turn_digest(t)}" for t in turns)
+        summary = self._ask(f"Summarize turns {first}-{last} of the story.", notes, budget)
+        return f"T{first}-{last}: {summary}" if summary else extractive
+
+    def _merge_session(self, session: str, chapter: str, budget: int) -> str:
+        extractive = merge_session_extractive(session, chapter, budget)
+        if self.client is None:
+            return extractive
+        notes = f"Story so far: {session or '(none)'}\nNext chapter: {chapter}"
+        return (
+            self._ask("Merge the next chapter into the story so far.", notes, budget) or extractive
+        )
+
+    def _ask(self, task: str, notes: str, budget: int) -> str:
+        assert self.client is not None
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "You compress story notes for a game's long-term memory. "
+                    'Output ONLY a JSON object {"summary": string}. '
+                    f"Keep names, places, clues and consequences; at most {budget} tokens."
+                ),
+            },
+            {"role": "user", "content": f"{task}\n{notes}"},
+        ]
+        try:
+            with llm_priority(BACKGROUND):
+                content = self.client.complete(messages)
+            data = json.loads(extract_json(content))
+        except Exception:
+            return ""
+        summary = data.get("summary") if isinstance(data, dict) else None
+        return summary.strip() if isinstance(summary, str) else ""
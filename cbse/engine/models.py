@@ -54,12 +54,23 @@ class StatusBarDefinition(BaseModel):
     items: list[StatusBarItem]
 
 
+class LLMRoute(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    provider: Literal["mock", "synthetic", "ollama", "openai", "gemini"]
+    model: str | None = None
+    base_url: str | None = None
+
+
 class LLMConfig(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
     recommended_model: str | None = None
     temperature: float = 0.7
     max_output_tokens: int = 900
+    # Ordered cheapest first; empty means the single CBSE_LLM_PROVIDER client.
+    routes: list[LLMRoute] = Field(default_factory=list)
+    slo_ms: float | None = None
 
 
 class PromptRules(BaseModel):
@@ -163,6 +174,26 @@ class TurnRecord(BaseModel):
     rejected_updates: list[StateUpdateOp]
     events: list[Event]
     end: EndState
+    digest: str = ""
+    new_facts: list[str] = Field(default_factory=list)
+
+
+class Fact(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    id: str
+    text: str
+    turn_index: int
+    last_seen_turn: int
+    mentions: int = 1
+
+
+class MemorySnapshot(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    session_summary: str = ""
+    chapters: list[str] = Field(default_factory=list)
+    summarized_turns: int = 0
 
 
 class SaveGame(BaseModel):
@@ -176,4 +207,6 @@ class SaveGame(BaseModel):
     state: dict[str, Any]
     history: list[TurnRecord]
     memory_summary: str = ""
+    memory: MemorySnapshot | None = None
+    facts: list[Fact] = Field(default_factory=list)
     triggered_triggers: list[str] = Field(default_factory=list)
@@ -3,7 +3,11 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any
 
+from cbse.engine.fact_store import FactStore
+from cbse.engine.memory import turn_digest
 from cbse.engine.models import Choice, GameDefinition, TurnRecord, VariableDefinition
+from cbse.engine.state_encoder import StateEncoder
+from cbse.engine.state_store import DeltaInfo
 
 
 @dataclass
@@ -15,6 +19,8 @@ class PromptContext:
     recent_turns: list[TurnRecord]
     player_input: str
     last_choices: list[Choice]
+    facts: FactStore | None = None
+    deltas: dict[str, DeltaInfo] | None = None
 
 
 class PromptBuilder:
@@ -23,10 +29,21 @@ class PromptBuilder:
         variables: dict[str, VariableDefinition],
         compact: bool = False,
         world_max_chars: int | None = None,
+        recent_turns: int = 4,
+        full_text_turns: int = 1,
+        fact_limit: int = 8,
+        fact_token_budget: int = 200,
     ) -> None:
         self.variables = variables
         self.compact = compact
         self.world_max_chars = world_max_chars
+        # How many past turns enter the prompt, and how many of the newest keep
+        # their full narrative; older ones are sent as cached digests.
+        self.recent_turns = recent_turns
+        self.full_text_turns = full_text_turns
+        self.fact_limit = fact_limit
+        self.fact_token_budget = fact_token_budget
+        self.encoder = StateEncoder(variables)
 
     def build_messages(self, ctx: PromptContext) -> list[dict[str, str]]:
         system = self._system_message()
@@ -68,6 +85,7 @@ class PromptBuilder:
             f"Content rating: {ctx.game.content_rating}\n"
             f"World:\n{world}\n"
             f"{rule_text}\n"
+            f"State keys: {self.encoder.legend(self.compact)}\n"
             "Output JSON schema (top-level):\n"
             "{\n"
             "  narrative_markdown: string,\n"
@@ -89,56 +107,24 @@ class PromptBuilder:
         )
 
     def _user_message(self, ctx: PromptContext) -> str:
-        state_lines = []
-        for var_id, var_def in self.variables.items():
-            weight = var_def.card.prompt_weight
-            if weight == "hidden":
-                continue
-            if self.compact and weight == "low":
-                continue
-            if weight not in ("high", "medium", "low"):
-                continue
-            value = ctx.state.get(var_id)
-            state_lines.append(f"- {var_def.label} ({var_id}): {value}")
-        state_text = "\n".join(state_lines)
-
-        # 构建可用的 state_update 路径参考
-        # 简单类型变量
-        simple_vars = []
-        # object 类型的嵌套路径
-        nested_paths = []
-        
-        for var_id, var_def in self.variables.items():
-            if var_def.rules.readonly:
-                continue
-            if var_def.type in ("integer", "number"):
-                simple_vars.append(f"/{var_id} (int)")
-            elif var_def.type == "boolean":
-                simple_vars.append(f"/{var_id} (bool)")
-            elif var_def.type == "enum":
-                simple_vars.append(f"/{var_id} (enum)")
-            elif var_def.type == "object" and var_def.id in ctx.state:
-                nested = ctx.state[var_def.id]
-                if isinstance(nested, dict):
-                    for key in nested.keys():
-                        nested_paths.append(f"/{var_id}/{key}")
-        
-        simple_vars_str = ", ".join(simple_vars[:8])
-        nested_paths_str = ", ".join(nested_paths[:6])
-        
-        state_update_hint = (
-            f"Simple paths: {simple_vars_str}\n"
-            f"Nested paths: {nested_paths_str}\n"
-            f"IMPORTANT: Only use paths listed above. Do NOT invent new paths like /progress, /cognitive, /comfort."
-        )
+        state_text = self.encoder.encode(ctx.state, ctx.deltas, compact=self.compact)
+        state_update_hint = self.encoder.path_hint(ctx.state)
 
         history_text = ""
         if ctx.memory_summary:
             history_text += f"Memory summary:\n{ctx.memory_summary}\n\n"
-        if ctx.recent_turns:
+        facts_text = self._facts_text(ctx)
+        if facts_text:
+            history_text += f"Known facts:\n{facts_text}\n\n"
+        recent_turns = ctx.recent_turns[-self.recent_turns :] if self.recent_turns > 0 else []
+        if recent_turns:
+            full_from = len(recent_turns) - max(self.full_text_turns, 0)
             recent = []
-            for turn in ctx.recent_turns:
-                recent.append(f"Player: {turn.player_input}\nStory: {turn.narrative_markdown}")
+            for idx, turn in enumerate(recent_turns):
+                if idx >= full_from:
+                    recent.append(f"Player: {turn.player_input}\nStory: {turn.narrative_markdown}")
+                else:
+                    recent.append(f"Turn {turn.turn_index}: {turn_digest(turn)}")
             history_text += "Recent turns:\n" + "\n---\n".join(recent)
 
         choices_text = ""
@@ -147,7 +133,7 @@ class PromptBuilder:
             choices_text = "Current choices:\n" + "\n".join(lines)
 
         return (
-            f"State:\n{state_text}\n\n"
+            f"State ([Δ] = changed last turn):\n{state_text}\n\n"
             f"Valid state_update paths (use / as separator):\n{state_update_hint}\n\n"
             f"{history_text}\n\n"
             f"{choices_text}\n\n"
@@ -155,6 +141,15 @@ class PromptBuilder:
             "Respond with JSON only."
         )
 
+    def _facts_text(self, ctx: PromptContext) -> str:
+        if ctx.facts is None or not len(ctx.facts):
+            return ""
+        query = [ctx.player_input]
+        if ctx.recent_turns:
+            query.append(turn_digest(ctx.recent_turns[-1]))
+        facts = ctx.facts.relevant(" ".join(query), self.fact_limit, self.fact_token_budget)
+        return "\n".join(f"- {fact.text}" for fact in facts)
+
     def _compact_world(self, text: str) -> str:
         if not text:
             return ""
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import ast
+import operator
+from collections.abc import Callable
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Any
 
 from cbse.engine.models import EndState, Event, StateUpdateOp, Trigger, VariableDefinition
@@ -232,56 +236,102 @@ class RulesEngine:
 
 
 # Safe expression evaluation for trigger DSL
-import ast
+_COMPARE = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
 
 
 def _safe_eval(expr: str, state: dict[str, Any]) -> Any:
+    return _compile(expr)(state)
+
+
+@lru_cache(maxsize=1024)
+def _compile(expr: str) -> Callable[[dict[str, Any]], Any]:
+    # Conditions are checked after every turn; parse each one once and keep
+    # it as nested closures. Errors still surface when a node is evaluated,
+    # so short-circuiting behaves as before.
     expr = expr.replace(" true", " True").replace(" false", " False")
     tree = ast.parse(expr, mode="eval")
-    return _eval_node(tree.body, state)
+    return _compile_node(tree.body)
 
 
-def _eval_node(node: ast.AST, state: dict[str, Any]) -> Any:
-    if isinstance(node, ast.BoolOp):
+def _compile_node(node: ast.AST) -> Callable[[dict[str, Any]], Any]:
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, (ast.And, ast.Or)):
+        parts = [_compile_node(v) for v in node.values]
         if isinstance(node.op, ast.And):
-            return all(_eval_node(v, state) for v in node.values)
-        if isinstance(node.op, ast.Or):
-            return any(_eval_node(v, state) for v in node.values)
+
+            def conjunction(state: dict[str, Any]) -> bool:
+                for part in parts:
+                    if not part(state):
+                        return False
+                return True
+
+            return conjunction
+
+        def disjunction(state: dict[str, Any]) -> bool:
+            for part in parts:
+                if part(state):
+                    return True
+            return False
+
+        return disjunction
     if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
-        return not _eval_node(node.operand, state)
+        operand = _compile_node(node.operand)
+        return lambda state: not operand(state)
     if isinstance(node, ast.Compare):
-        left = _eval_node(node.left, state)
-        for op, comparator in zip(node.ops, node.comparators):
-            right = _eval_node(comparator, state)
-            if isinstance(op, ast.Eq) and not (left == right):
-                return False
-            if isinstance(op, ast.NotEq) and not (left != right):
-                return False
-            if isinstance(op, ast.Lt) and not (left < right):
-                return False
-            if isinstance(op, ast.LtE) and not (left <= right):
-                return False
-            if isinstance(op, ast.Gt) and not (left > right):
-                return False
-            if isinstance(op, ast.GtE) and not (left >= right):
-                return False
-            left = right
-        return True
-    if isinstance(node, ast.Name):
-        if node.id in ("True", "False"):
-            return node.id == "True"
-        if node.id == "true":
+        first = _compile_node(node.left)
+        pairs = [
+            (_COMPARE.get(type(op)), _compile_node(comparator))
+            for op, comparator in zip(node.ops, node.comparators)
+        ]
+        if len(pairs) == 1 and pairs[0][0] is not None:
+            compare_op, second = pairs[0]
+            return lambda state: bool(compare_op(first(state), second(state)))
+
+        def compare(state: dict[str, Any]) -> bool:
+            left = first(state)
+            for compare_op, comparator in pairs:
+                right = comparator(state)
+                if compare_op is not None and not compare_op(left, right):
+                    return False
+                left = right
             return True
-        if node.id == "false":
-            return False
-        if node.id in state:
-            return state[node.id]
-        raise ValueError(node.id)
+
+        return compare
+    if isinstance(node, ast.Name):
+        if node.id in ("True", "true"):
+            return lambda state: True
+        if node.id in ("False", "false"):
+            return lambda state: False
+        name = node.id
+
+        def lookup(state: dict[str, Any]) -> Any:
+            if name in state:
+                return state[name]
+            raise ValueError(name)
+
+        return lookup
     if isinstance(node, ast.Attribute):
-        base = _eval_node(node.value, state)
-        if isinstance(base, dict) and node.attr in base:
-            return base[node.attr]
-        raise ValueError(node.attr)
+        base_of = _compile_node(node.value)
+        attr = node.attr
+
+        def attribute(state: dict[str, Any]) -> Any:
+            base = base_of(state)
+            if isinstance(base, dict) and attr in base:
+                return base[attr]
+            raise ValueError(attr)
+
+        return attribute
     if isinstance(node, ast.Constant):
-        return node.value
-    raise ValueError("Unsupported expression")
+        value = node.value
+        return lambda state: value
+
+    def unsupported(state: dict[str, Any]) -> Any:
+        raise ValueError("Unsupported expression")
+
+    return unsupported
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, TextIO
+
+from cbse.engine.budget_controller import percentile
+from cbse.engine.client_factory import create_client
+from cbse.engine.content_loader import ContentLoader
+from cbse.engine.llm import (
+    CASSETTE_MODES,
+    CassetteError,
+    HTTPClientPool,
+    LLMScheduler,
+    PoolConfig,
+    limits_from_env,
+)
+from cbse.engine.replay import load_replay_inputs
+from cbse.engine.session import GameSession, TurnResult
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+
+@dataclass
+class RunStats:
+    label: str
+    turns: int = 0
+    seconds: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+    applied: int = 0
+    rejected: int = 0
+    fallbacks: int = 0
+    endings: Counter[str] = field(default_factory=Counter)
+
+    def add(self, turn: TurnResult, step_ms: float) -> None:
+        record = turn.turn
+        self.turns += 1
+        self.seconds += step_ms / 1000
+        self.latencies.append(step_ms)
+        self.applied += len(record.applied_updates)
+        self.rejected += len(record.rejected_updates)
+        self.fallbacks += turn.llm.used_fallback
+        if record.end.is_game_over:
+            self.endings[record.end.ending_id or "game_over"] += 1
+
+    def merge(self, other: RunStats) -> None:
+        self.turns += other.turns
+        self.seconds += other.seconds
+        self.latencies.extend(other.latencies)
+        self.applied += other.applied
+        self.rejected += other.rejected
+        self.fallbacks += other.fallbacks
+        self.endings.update(other.endings)
+
+    def to_dict(self) -> dict[str, Any]:
+        updates = self.applied + self.rejected
+        return {
+            "replay": self.label,
+            "turns": self.turns,
+            "turns_per_s": round(self.turns / self.seconds, 1) if self.seconds else 0.0,
+            "p50_ms": round(percentile(self.latencies, 50), 1),
+            "p95_ms": round(percentile(self.latencies, 95), 1),
+            # Share of proposed state updates the rules engine refused.
+            "rejection_rate": round(self.rejected / updates, 4) if updates else 0.0,
+            "fallback_rate": round(self.fallbacks / self.turns, 4) if self.turns else 0.0,
+            "endings": dict(self.endings),
+        }
+
+
+def turn_record(label: str, turn: TurnResult, step_ms: float) -> dict[str, Any]:
+    record = turn.turn
+    result = turn.llm
+    return {
+        "replay": label,
+        "turn_index": record.turn_index,
+        "player_input": record.player_input,
+        "step_ms": round(step_ms, 2),
+        "latency_ms": round(turn.latency_ms, 2),
+        "generation_ms": round(turn.generation_ms, 2),
+        "used_fallback": result.used_fallback,
+        "attempts": result.attempts,
+        "repaired_locally": result.repaired_locally,
+        "speculative": turn.speculative,
+        "narrative_markdown": record.narrative_markdown,
+        "choices": [choice.label for choice in record.choices],
+        "applied_updates": [u.model_dump() for u in record.applied_updates],
+        "rejected_updates": [u.model_dump() for u in record.rejected_updates],
+        "events": [e.model_dump() for e in record.events],
+        "end": record.end.model_dump(),
+        "llm": result.metrics.to_dict() if result.metrics else None,
+    }
+
+
+def play(session: GameSession, stats: RunStats, inputs: list[str], sink: TextIO | None) -> None:
+    # One replay file from the game's initial state. Like the TUI replay it
+    # stops at a game over; unlike it, a fallback turn does not stop the run,
+    # it is counted and the next input is played. Turns are added to stats as
+    # they finish, so they are kept if a later turn raises.
+    session.start()
+    for text in inputs:
+        started = time.perf_counter()
+        turn = session.step(text)
+        step_ms = (time.perf_counter() - started) * 1000
+        stats.add(turn, step_ms)
+        if sink is not None:
+            record = turn_record(stats.label, turn, step_ms)
+            sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if turn.end.is_game_over:
+            break
+
+
+def resolve_replay(path_text: str) -> Path:
+    path = Path(path_text)
+    if not path.exists() and (BASE_DIR / path_text).exists():
+        return BASE_DIR / path_text
+    return path
+
+
+def format_summary(runs: list[RunStats], total: RunStats) -> str:
+    rows = runs + [total] if len(runs) > 1 else runs
+    width = max(len("replay"), *(len(run.label) for run in rows)) + 2
+    header = (
+        f"{'replay':<{width}}{'turns':>7}{'turns/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'rejected':>10}{'fallback':>10}  endings"
+    )
+    lines = [header]
+    for run in rows:
+        data = run.to_dict()
+        endings = " ".join(f"{k}:{v}" for k, v in sorted(data["endings"].items())) or "-"
+        lines.append(
+            f"{run.label:<{width}}{data['turns']:>7}{data['turns_per_s']:>10.1f}"
+            f"{data['p50_ms']:>9.1f}{data['p95_ms']:>9.1f}{data['rejection_rate']:>10.1%}"
+            f"{data['fallback_rate']:>10.1%}  {endings}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="cbse run", description="Play replay files without the TUI."
+    )
+    parser.add_argument("replays", nargs="+", help="Replay input files (json, jsonl or text)")
+    parser.add_argument("--game", default="mist_harbor", help="Game id under games/")
+    parser.add_argument(
+        "--provider",
+        help="mock, synthetic, ollama, openai or gemini; overrides CBSE_LLM_PROVIDER and routes",
+    )
+    parser.add_argument("--model", help="Model name; overrides CBSE_MODEL")
+    parser.add_argument("--out", default="-", help="Per-turn JSONL results; - for stdout")
+    parser.add_argument("--summary", help="Also write the summary as JSON to this file")
+    parser.add_argument("--log-dir", help="Write the engine's turns.jsonl here as well")
+    parser.add_argument("--cassette", help="Record LLM calls to, or play them back from, this file")
+    parser.add_argument("--cassette-mode", choices=CASSETTE_MODES, default="strict")
+    parser.add_argument(
+        "--max-fallback-rate",
+        type=float,
+        help="Exit with status 1 if the overall fallback rate is higher (0-1)",
+    )
+    args = parser.parse_args(argv)
+
+    replays = []
+    for path_text in args.replays:
+        path = resolve_replay(path_text)
+        try:
+            replays.append((path_text, load_replay_inputs(path)))
+        except (OSError, ValueError) as exc:
+            parser.error(f"cannot load replay {path_text}: {exc}")
+
+    content = ContentLoader(BASE_DIR / "games").load_game(args.game)
+    pool = HTTPClientPool(PoolConfig.from_env())
+    cassette = Path(args.cassette) if args.cassette else None
+    client = create_client(
+        content,
+        pool,
+        LLMScheduler(limits_from_env()),
+        cassette=cassette,
+        cassette_mode=args.cassette_mode,
+        cache_dir=BASE_DIR / ".cache" / "llm",
+        provider=args.provider,
+        model=args.model,
+    )
+    session = GameSession(
+        content,
+        client,
+        log_dir=Path(args.log_dir) if args.log_dir else None,
+    )
+    # With results on stdout the summary goes to stderr, so stdout stays JSONL.
+    to_stdout = args.out == "-"
+    report = sys.stderr if to_stdout else sys.stdout
+    total = RunStats("total")
+    runs: list[RunStats] = []
+    error: str | None = None
+    try:
+        with (
+            nullcontext(sys.stdout) if to_stdout else open(args.out, "w", encoding="utf-8")
+        ) as sink:
+            for label, inputs in replays:
+                stats = RunStats(label)
+                runs.append(stats)
+                try:
+                    play(session, stats, inputs, sink)
+                except CassetteError as exc:
+                    # The prompts no longer match the recording: a regression.
+                    error = f"{label}: {exc}"
+                sink.flush()
+                total.merge(stats)
+                if error:
+                    break
+    finally:
+        session.close()
+        pool.close()
+
+    print(format_summary(runs, total), file=report)
+    if args.summary:
+        summary = {"runs": [run.to_dict() for run in runs], "total": total.to_dict()}
+        if error:
+            summary["error"] = error
+        Path(args.summary).write_text(json.dumps(summary, ensure_ascii=False, indent=2) + "\n")
+    limit = args.max_fallback_rate
+    fallback_rate = total.to_dict()["fallback_rate"]
+    if error is None and limit is not None and fallback_rate > limit:
+        error = f"fallback rate {fallback_rate:.1%} is above --max-fallback-rate {limit:.1%}"
+    if error:
+        print(f"cbse run: {error}", file=sys.stderr)
+        return 1
+    return 0
@@ -4,10 +4,9 @@ import json
 from datetime import datetime
 from pathlib import Path
 
-from cbse.engine.models import SaveGame, TurnRecord
+from cbse.engine.models import SaveGame
 from cbse.engine.state_store import StateStore
 
-
 SAVE_VERSION = "1.0"
 
 
@@ -26,6 +25,8 @@ class SaveSystem:
             state=store.state,
             history=store.history,
             memory_summary=store.memory_summary,
+            memory=store.memory.snapshot(),
+            facts=store.facts.snapshot(),
             triggered_triggers=sorted(store.triggered_triggers),
         )
         path = self.save_dir / f"{name}.json"
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import copy
+import json
+from typing import Any
+
+from cbse.engine.models import VariableDefinition
+from cbse.engine.schema_validator import SchemaValidator
+from cbse.engine.utils import is_number
+
+_OPS_BY_KIND = {
+    "number": ["set", "inc", "dec"],
+    "boolean": ["set", "toggle"],
+    "enum": ["set"],
+    "string": ["set"],
+    "list": ["set", "push", "remove"],
+    "object": ["set"],
+}
+_POLICY_OPS = {"any": None, "inc_dec_only": {"inc", "dec"}, "set_only": {"set"}}
+
+
+class OutputSchemaGenerator:
+    # Narrows the generic output schema to this game's variables, so constrained
+    # decoding can only produce state_updates that RulesEngine would accept:
+    # path is one of the writable paths, op respects update_policy and value is
+    # typed per path. Object variables contribute their current sub-keys, so the
+    # schema is rebuilt only when those key sets change.
+    def __init__(self, variables: dict[str, VariableDefinition]) -> None:
+        self.variables = variables
+        self._key: tuple | None = None
+        self._schema: dict[str, Any] = {}
+
+    def schema(self, state: dict[str, Any]) -> dict[str, Any]:
+        key = tuple(
+            (var_id, tuple(state[var_id].keys()) if isinstance(state.get(var_id), dict) else ())
+            for var_id, var_def in self.variables.items()
+            if var_def.type == "object"
+        )
+        if key != self._key:
+            self._key = key
+            self._schema = self._build(state)
+        return self._schema
+
+    def writable_paths(self, state: dict[str, Any]) -> list[str]:
+        return [path for path, _, _ in self._targets(state)]
+
+    def _build(self, state: dict[str, Any]) -> dict[str, Any]:
+        schema = copy.deepcopy(SchemaValidator.json_schema())
+        updates = schema["properties"]["state_updates"]
+        # Paths sharing ops and value type share one variant, which keeps the
+        # grammar Ollama compiles from the schema small.
+        groups: dict[str, tuple[list[str], dict[str, Any], list[str]]] = {}
+        for path, kind, value_schema in self._targets(state):
+            for ops, value in _variants(kind, value_schema, self._policy(path)):
+                group_key = json.dumps([ops, value], sort_keys=True)
+                groups.setdefault(group_key, (ops, value, []))[2].append(path)
+        items = [_update_item(paths, ops, value) for ops, value, paths in groups.values()]
+        if items:
+            updates["items"] = {"anyOf": items}
+        else:
+            updates["maxItems"] = 0
+        return schema
+
+    def _policy(self, path: str) -> set[str] | None:
+        return _POLICY_OPS[self.variables[path.split("/")[1]].rules.update_policy]
+
+    def _targets(self, state: dict[str, Any]) -> list[tuple[str, str, dict[str, Any]]]:
+        targets = []
+        for var_id, var_def in self.variables.items():
+            if var_def.rules.readonly:
+                continue
+            if var_def.type in ("number", "integer"):
+                value: dict[str, Any] = {"type": var_def.type}
+                targets.append((f"/{var_id}", "number", value))
+            elif var_def.type == "boolean":
+                targets.append((f"/{var_id}", "boolean", {"type": "boolean"}))
+            elif var_def.type == "enum":
+                value = {"type": "string"}
+                if var_def.enum_values:
+                    value["enum"] = list(var_def.enum_values)
+                targets.append((f"/{var_id}", "enum", value))
+            elif var_def.type == "string":
+                targets.append((f"/{var_id}", "string", {"type": "string"}))
+            elif var_def.type == "list":
+                targets.append((f"/{var_id}", "list", _list_items(state.get(var_id))))
+            elif var_def.type == "object":
+                current = state.get(var_id)
+                if not isinstance(current, dict):
+                    continue
+                for sub, sub_value in current.items():
+                    kind, value = _value_schema(sub_value)
+                    targets.append((f"/{var_id}/{sub}", kind, value))
+        return targets
+
+
+def _value_schema(value: Any) -> tuple[str, dict[str, Any]]:
+    if isinstance(value, bool):
+        return "boolean", {"type": "boolean"}
+    if is_number(value):
+        return "number", {"type": "number"}
+    if isinstance(value, str):
+        return "string", {"type": "string"}
+    if isinstance(value, list):
+        return "list", _list_items(value)
+    return "object", {"type": "object"}
+
+
+def _list_items(value: Any) -> dict[str, Any]:
+    # Lists are typed by what they already hold; strings are the common case.
+    if isinstance(value, list) and value and not all(isinstance(item, str) for item in value):
+        return {}
+    return {"type": "string"}
+
+
+def _variants(
+    kind: str, value: dict[str, Any], policy: set[str] | None
+) -> list[tuple[list[str], dict[str, Any]]]:
+    ops = [op for op in _OPS_BY_KIND[kind] if policy is None or op in policy]
+    if not ops:
+        return []
+    if kind == "list":
+        variants = []
+        if "set" in ops:
+            variants.append(
+                (["set"], {"type": "array", "items": value} if value else {"type": "array"})
+            )
+        item_ops = [op for op in ops if op != "set"]
+        if item_ops:
+            variants.append((item_ops, value))
+        return variants
+    if kind == "boolean" and "toggle" in ops:
+        # toggle ignores value; set needs a boolean.
+        return [([op], value if op == "set" else {}) for op in ops]
+    return [(ops, value)]
+
+
+def _update_item(paths: list[str], ops: list[str], value: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "type": "object",
+        "additionalProperties": False,
+        "required": ["op", "path", "value", "reason"],
+        "properties": {
+            "op": {"type": "string", "enum": ops},
+            "path": {"type": "string", "enum": paths},
+            "value": value,
+            "reason": {"type": "string"},
+        },
+    }
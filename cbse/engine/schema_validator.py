@@ -1,10 +1,18 @@
 from __future__ import annotations
 
 import json
+import re
+from dataclasses import dataclass, field
 from typing import Any
 
 from pydantic import ValidationError
 
+from cbse.engine.json_repair import (
+    JSONRepairError,
+    normalize_output,
+    parse_bool,
+    repair_json_text,
+)
 from cbse.engine.models import Choice, EndState, Event, LLMOutput, StateUpdateOp
 
 
@@ -12,15 +20,56 @@ class SchemaError(Exception):
     pass
 
 
-def extract_json(text: str) -> str:
-    text = text.strip()
-    if text.startswith("{") and text.endswith("}"):
-        return text
+# One match per string literal (escapes included) or brace.
+_JSON_TOKENS = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]', re.DOTALL)
+_DECODER = json.JSONDecoder()
+_UNSET = object()
+
+
+def find_json_object(text: str) -> tuple[int, int] | None:
+    # Bounds of the first balanced {...}, skipping braces inside strings, so
+    # prose after the object ("... {see above}") does not extend the slice.
     start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        return text[start : end + 1]
-    raise SchemaError("No JSON object found")
+    if start == -1:
+        return None
+    depth = 0
+    for match in _JSON_TOKENS.finditer(text, start):
+        token = match.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 0:
+                return start, match.end()
+    return None
+
+
+def extract_json(text: str) -> str:
+    bounds = find_json_object(text)
+    if bounds is None:
+        raise SchemaError("No JSON object found")
+    return text[bounds[0] : bounds[1]]
+
+
+@dataclass
+class DecodedOutput:
+    # One decode of one raw output, shared by parse, repair and coerce.
+    raw: str
+    json_text: str | None
+    output: LLMOutput | None = None
+    error: str = ""
+    _data: Any = field(default=_UNSET, repr=False)
+
+    def data(self) -> Any:
+        if self.json_text is None:
+            raise SchemaError(self.error or "No JSON object found")
+        if self._data is _UNSET:
+            self._data = json.loads(self.json_text)
+        return self._data
+
+
+def _is_json_error(exc: ValidationError) -> bool:
+    return any(err["type"] == "json_invalid" for err in exc.errors())
 
 
 class SchemaValidator:
@@ -110,17 +159,61 @@ class SchemaValidator:
             },
         }
 
+    def decode(self, text: str) -> DecodedOutput:
+        decoded = None
+        stripped = text.strip()
+        if stripped.startswith("{") and stripped.endswith("}"):
+            # Common case: a bare object goes straight to pydantic's JSON parser
+            # without building Python dicts first.
+            try:
+                output = LLMOutput.model_validate_json(stripped)
+                decoded = DecodedOutput(raw=text, json_text=stripped, output=output)
+            except ValidationError as exc:
+                if not _is_json_error(exc):
+                    decoded = DecodedOutput(raw=text, json_text=stripped, error=str(exc))
+        if decoded is None:
+            decoded = self._decode_embedded(text)
+        return decoded
+
+    def _decode_embedded(self, text: str) -> DecodedOutput:
+        # Fences or prose around the object: raw_decode stops at the end of the
+        # object, so trailing text never has to be sliced off by hand.
+        start = text.find("{")
+        if start == -1:
+            return DecodedOutput(raw=text, json_text=None, error="No JSON object found")
+        try:
+            data, end = _DECODER.raw_decode(text, start)
+        except json.JSONDecodeError as exc:
+            bounds = find_json_object(text)
+            json_text = text[bounds[0] : bounds[1]] if bounds else None
+            return DecodedOutput(raw=text, json_text=json_text, error=str(exc))
+        decoded = DecodedOutput(raw=text, json_text=text[start:end], _data=data)
+        try:
+            decoded.output = LLMOutput.model_validate(data)
+        except ValidationError as exc:
+            decoded.error = str(exc)
+        return decoded
+
     def parse(self, text: str) -> LLMOutput:
+        decoded = self.decode(text)
+        if decoded.output is None:
+            raise SchemaError(decoded.error)
+        return decoded.output
+
+    def repair(self, text: str) -> LLMOutput:
+        # Local, mechanical repair; unlike coerce it never invents content.
+        decoded = self.decode(text)
         try:
-            json_text = extract_json(text)
-            data = json.loads(json_text)
-            return LLMOutput.model_validate(data)
-        except (json.JSONDecodeError, ValidationError, SchemaError) as exc:
+            try:
+                data = decoded.data()
+            except (json.JSONDecodeError, SchemaError):
+                data = json.loads(repair_json_text(text))
+            return LLMOutput.model_validate(normalize_output(data))
+        except (json.JSONDecodeError, ValidationError, JSONRepairError) as exc:
             raise SchemaError(str(exc)) from exc
 
     def coerce(self, text: str) -> LLMOutput:
-        json_text = extract_json(text)
-        data = json.loads(json_text)
+        data = self.decode(text).data()
         if not isinstance(data, dict):
             raise SchemaError("Coerce expects an object")
 
@@ -197,8 +290,9 @@ class SchemaValidator:
 
         end_raw = data.get("end")
         if isinstance(end_raw, dict):
+            is_game_over = parse_bool(end_raw.get("is_game_over", False))
             end = EndState(
-                is_game_over=bool(end_raw.get("is_game_over", False)),
+                is_game_over=is_game_over if isinstance(is_game_over, bool) else False,
                 ending_id=str(end_raw.get("ending_id", "")),
                 reason=str(end_raw.get("reason", "")),
             )
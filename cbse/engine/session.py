@@ -0,0 +1,504 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from cbse.engine.budget_controller import (
+    BudgetDecision,
+    PromptBudgetController,
+    TurnSample,
+    level_for,
+)
+from cbse.engine.content_loader import GameContent, index_variables
+from cbse.engine.fact_store import FactStore
+from cbse.engine.llm import (
+    CachingClient,
+    CassetteClient,
+    LLMClient,
+    LLMScheduler,
+    MetricsRegistry,
+    OllamaProvider,
+    RecordingClient,
+    RouterClient,
+    ScheduledClient,
+    SyntheticProvider,
+    providers,
+    unwrap,
+)
+from cbse.engine.llm.cancel import CancelToken
+from cbse.engine.llm_service import LLMResult, LLMService
+from cbse.engine.memory import MemorySummarizer, RollingMemory, build_turn_digest
+from cbse.engine.models import Choice, EndState, MemorySnapshot, TurnRecord
+from cbse.engine.prompt_builder import PromptBuilder, PromptContext
+from cbse.engine.rules_engine import RulesEngine
+from cbse.engine.save_system import SaveSystem
+from cbse.engine.schema_generator import OutputSchemaGenerator
+from cbse.engine.schema_validator import SchemaValidator
+from cbse.engine.speculation import SpeculativeGenerator
+from cbse.engine.state_store import StateStore
+from cbse.engine.utils import clone_state, estimate_tokens
+
+
+@dataclass
+class TurnResult:
+    turn: TurnRecord
+    llm: LLMResult
+    messages: list[dict[str, str]]
+    latency_ms: float
+    budget: BudgetDecision | None = None
+    speculative: bool = False
+
+    @property
+    def end(self) -> EndState:
+        return self.turn.end
+
+    @property
+    def generation_ms(self) -> float:
+        # Time the model took; differs from latency_ms on a speculation hit,
+        # where most of the generation happened before the player picked.
+        metrics = self.llm.metrics
+        return metrics.total_ms if metrics else self.latency_ms
+
+
+class GameSession:
+    # One playthrough of one game: state, history, memory, prompt building,
+    # the LLM call and the rules. It needs nothing but the content and an LLM
+    # client, so it runs the same under the Textual app, a script or a server.
+    # step() does a whole turn; build_messages / generate / apply are the same
+    # turn in pieces for callers that generate off the thread owning the state.
+    def __init__(
+        self,
+        content: GameContent,
+        client: LLMClient,
+        metrics: MetricsRegistry | None = None,
+        log_dir: Path | None = None,
+        save_dir: Path = Path("saves"),
+        speculate: bool | None = None,
+    ) -> None:
+        self.content = content
+        self.variables_index = index_variables(content.definition.variables)
+        self.validator = SchemaValidator()
+        self.metrics = metrics or MetricsRegistry()
+        self.llm_service = LLMService(client=client, validator=self.validator, metrics=self.metrics)
+        recent_env = os.getenv("CBSE_PROMPT_RECENT_TURNS")
+        full_env = os.getenv("CBSE_PROMPT_FULL_TURNS")
+        self.prompt_builder = PromptBuilder(
+            self.variables_index,
+            recent_turns=int(recent_env) if recent_env else 4,
+            full_text_turns=int(full_env) if full_env else 1,
+        )
+        if any(isinstance(provider, OllamaProvider) for provider in providers(client)):
+            # Small local models get the compact prompt.
+            self.prompt_builder.compact = True
+            self.prompt_builder.world_max_chars = 1600
+        self.schema_generator = OutputSchemaGenerator(self.variables_index)
+        self.rules_engine = RulesEngine(
+            self.variables_index,
+            content.triggers,
+            content.definition.win_conditions,
+            content.definition.lose_conditions,
+        )
+        self.budget_controller = self._create_budget_controller()
+        # A cassette needs the same call sequence on every run; speculation and
+        # background memory summaries would interleave with it by timing.
+        cassette = _uses_cassette(client)
+        self.speculator = self._create_speculator(False if cassette else speculate)
+        use_memory_llm = os.getenv("CBSE_MEMORY_LLM") == "1" and not cassette
+        self.memory_summarizer = MemorySummarizer(client if use_memory_llm else None)
+        self.log_dir = log_dir
+        metrics_file = os.getenv("CBSE_METRICS_FILE")
+        self.metrics_file = Path(metrics_file) if metrics_file else None
+        self.save_dir = save_dir
+        self.warm_up_ms: dict[str, float | None] = {}
+        self.last_prompt: list[dict[str, str]] | None = None
+        self.last_failed = False
+        self.store = self._new_store()
+        for provider in providers(client):
+            if isinstance(provider, SyntheticProvider):
+                provider.attach(lambda: self.store.state)
+
+    @property
+    def client(self) -> LLMClient:
+        return self.llm_service.client
+
+    def start(self) -> None:
+        # A fresh playthrough from the game's initial state.
+        if self.speculator:
+            self.speculator.discard()
+        self.store = self._new_store()
+        self.last_prompt = None
+        self.last_failed = False
+        self._refresh_output_schema()
+        self._start_warm_up()
+
+    def step(
+        self,
+        text: str,
+        cancel: CancelToken | None = None,
+        on_narrative: Callable[[str], None] | None = None,
+        use_last_prompt: bool = False,
+    ) -> TurnResult:
+        player_input = self.resolve_input(text)
+        messages = self.build_messages(player_input, use_last_prompt)
+        result, latency_ms, speculative = self.generate(messages, cancel, on_narrative)
+        turn = self.apply(player_input, messages, result, latency_ms, speculative)
+        self.log(turn)
+        if not turn.end.is_game_over and not self.last_failed:
+            self.speculate(turn.turn.choices)
+        return turn
+
+    async def astep(
+        self,
+        text: str,
+        cancel: CancelToken | None = None,
+        on_narrative: Callable[[str], None] | None = None,
+        use_last_prompt: bool = False,
+    ) -> TurnResult:
+        # The LLM call runs on a worker thread; state is only touched on the
+        # event loop. Cancelling the awaiting task cancels the request.
+        cancel = cancel or CancelToken()
+        player_input = self.resolve_input(text)
+        messages = self.build_messages(player_input, use_last_prompt)
+        try:
+            result, latency_ms, speculative = await asyncio.to_thread(
+                self.generate, messages, cancel, on_narrative
+            )
+        except asyncio.CancelledError:
+            cancel.cancel()
+            raise
+        turn = self.apply(player_input, messages, result, latency_ms, speculative)
+        await asyncio.to_thread(self.log, turn)
+        if not turn.end.is_game_over and not self.last_failed:
+            self.speculate(turn.turn.choices)
+        return turn
+
+    def resolve_choice(self, text: str) -> Choice | None:
+        if text.isdigit():
+            idx = int(text) - 1
+            if 0 <= idx < len(self.store.last_choices):
+                return self.store.last_choices[idx]
+        return None
+
+    def resolve_input(self, text: str) -> str:
+        # A number picks one of the choices the player was shown.
+        choice = self.resolve_choice(text)
+        return choice.label if choice else text
+
+    def build_messages(
+        self, player_input: str, use_last_prompt: bool = False
+    ) -> list[dict[str, str]]:
+        if use_last_prompt and self.last_prompt:
+            return self.last_prompt
+        ctx = PromptContext(
+            game=self.content.definition,
+            world_markdown=self.content.world_markdown,
+            memory_summary=self.store.memory_summary,
+            state=self.store.state,
+            recent_turns=self.store.history[-self.prompt_builder.recent_turns :],
+            player_input=player_input,
+            last_choices=self.store.last_choices,
+            facts=self.store.facts,
+            deltas=self.store.last_deltas,
+        )
+        return self.prompt_builder.build_messages(ctx)
+
+    def generate(
+        self,
+        messages: list[dict[str, str]],
+        cancel: CancelToken | None = None,
+        on_narrative: Callable[[str], None] | None = None,
+    ) -> tuple[LLMResult, float, bool]:
+        # Thread-safe with respect to the session: reads nothing but messages.
+        # The latency is how long the player waited, so a speculation hit
+        # counts only the wait for the guess to finish, and a guess that failed
+        # counts as well as the fresh request after it.
+        started = time.perf_counter()
+        result = self._speculative_result(messages, cancel)
+        speculative = result is not None
+        if result is None:
+            result = self.llm_service.generate(messages, on_narrative=on_narrative, cancel=cancel)
+        return result, (time.perf_counter() - started) * 1000, speculative
+
+    def apply(
+        self,
+        player_input: str,
+        messages: list[dict[str, str]],
+        result: LLMResult,
+        latency_ms: float,
+        speculative: bool = False,
+    ) -> TurnResult:
+        store = self.store
+        self.last_prompt = messages
+        budget_decision = self._record_budget(messages, result, latency_ms)
+        output = result.output
+
+        store.update_last_state()
+        rules = self.rules_engine.apply(store.state, output.state_updates, store.triggered_triggers)
+        store.state = rules.state
+        store.triggered_triggers = rules.triggered_triggers
+        store.compute_deltas()
+        self.last_failed = result.used_fallback
+
+        events = output.events + rules.events
+        end = rules.end if rules.end.is_game_over else output.end
+
+        turn = TurnRecord(
+            turn_index=len(store.history) + 1,
+            player_input=player_input,
+            narrative_markdown=output.narrative_markdown,
+            choices=output.choices,
+            applied_updates=rules.applied_updates,
+            rejected_updates=rules.rejected_updates,
+            events=events,
+            end=end,
+            digest=build_turn_digest(
+                player_input,
+                output.narrative_markdown,
+                rules.applied_updates,
+                output.new_facts,
+            ),
+            new_facts=output.new_facts,
+        )
+        store.history.append(turn)
+        store.facts.add_many(output.new_facts, turn.turn_index)
+        store.last_choices = output.choices
+        self.memory_summarizer.update(store.memory, store.history)
+        self._refresh_output_schema()
+        return TurnResult(
+            turn=turn,
+            llm=result,
+            messages=messages,
+            latency_ms=latency_ms,
+            budget=budget_decision,
+            speculative=speculative,
+        )
+
+    def speculate(self, choices: list[Choice]) -> None:
+        if self.speculator is None:
+            return
+        # Prompts are built exactly as step() would for a picked number, so a
+        # pick with unchanged state finds its answer by prompt hash.
+        candidates = [(choice.label, self.build_messages(choice.label)) for choice in choices]
+        self.speculator.schedule(candidates)
+
+    def log(self, turn: TurnResult) -> None:
+        if self.log_dir is not None:
+            result = turn.llm
+            record = turn.turn
+            payload = {
+                "turn_index": record.turn_index,
+                "player_input": record.player_input,
+                "prompt": turn.messages,
+                "raw_output": result.raw,
+                "used_fallback": result.used_fallback,
+                "attempts": result.attempts,
+                "repaired_locally": result.repaired_locally,
+                "escalated": result.escalated,
+                "latency_ms": round(turn.latency_ms, 1),
+                "generation_ms": round(turn.generation_ms, 1),
+                # Tokens, time to first output and, for Ollama, model load vs
+                # prompt eval vs generation.
+                "llm": result.metrics.to_dict() if result.metrics else None,
+                "warm_up_ms": self.warm_up_ms or None,
+                "speculative": turn.speculative,
+                "cache": self.cache_stats(),
+                "routing": self.routing_stats(),
+                "scheduler": self.scheduler_stats(),
+                "budget": turn.budget.to_dict() if turn.budget else None,
+                "applied_updates": [u.model_dump() for u in record.applied_updates],
+                "rejected_updates": [u.model_dump() for u in record.rejected_updates],
+                "events": [e.model_dump() for e in record.events],
+                "end": record.end.model_dump(),
+            }
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            with (self.log_dir / "turns.jsonl").open("a", encoding="utf-8") as f:
+                f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        if self.metrics_file:
+            self.metrics.write(self.metrics_file)
+
+    def save(self, name: str) -> Path:
+        definition = self.content.definition
+        return SaveSystem(self.save_dir).save(
+            name, self.store, definition.game_id, definition.version
+        )
+
+    def load(self, name: str) -> None:
+        save = SaveSystem(self.save_dir).load(name)
+        if save.game_id != self.content.definition.game_id:
+            raise ValueError("Save game_id mismatch")
+        if self.speculator:
+            self.speculator.discard()
+        # Saves without a memory snapshot roll their history up again on the next turn.
+        store = StateStore(
+            state=save.state,
+            memory=self._new_memory(save.memory),
+            facts=FactStore.from_facts(save.facts),
+        )
+        store.history = save.history
+        store.triggered_triggers = set(save.triggered_triggers)
+        store.update_last_state()
+        self.store = store
+        self.last_prompt = None
+        self.last_failed = False
+        self._refresh_output_schema()
+
+    def close(self) -> None:
+        if self.speculator:
+            self.speculator.close()
+        self.memory_summarizer.close()
+        self.llm_service.client.close()
+
+    def cache_stats(self) -> dict[str, int] | None:
+        client = self.llm_service.client
+        return client.stats() if isinstance(client, CachingClient) else None
+
+    def routing_stats(self) -> dict[str, Any] | None:
+        router = unwrap(self.llm_service.client)
+        if not isinstance(router, RouterClient):
+            return None
+        return {"route": router.last_route, **router.stats()}
+
+    def scheduler_stats(self) -> dict[str, Any] | None:
+        scheduler = _scheduler(self.llm_service.client)
+        return scheduler.stats() if scheduler else None
+
+    def _new_store(self) -> StateStore:
+        # A copy: turns mutate the state in place and start() must get back
+        # to the untouched initial state.
+        initial = clone_state(self.content.definition.initial_state)
+        store = StateStore(state=initial, memory=self._new_memory())
+        store.update_last_state()
+        return store
+
+    def _new_memory(self, save_memory: MemorySnapshot | None = None) -> RollingMemory:
+        chapter_env = os.getenv("CBSE_MEMORY_CHAPTER_TURNS")
+        budget_env = os.getenv("CBSE_MEMORY_TOKENS")
+        chapter_size = int(chapter_env) if chapter_env else 5
+        token_budget = int(budget_env) if budget_env else 400
+        if save_memory is not None:
+            return RollingMemory.from_snapshot(save_memory, chapter_size, token_budget)
+        return RollingMemory(chapter_size=chapter_size, token_budget=token_budget)
+
+    def _refresh_output_schema(self) -> None:
+        # Constrained decoding follows the game state: object variables can
+        # gain keys, which become new writable paths.
+        for provider in providers(self.llm_service.client):
+            if getattr(provider, "json_schema", None) is not None:
+                provider.json_schema = self.schema_generator.schema(self.store.state)
+
+    def _start_warm_up(self) -> None:
+        # A cold Ollama spends seconds loading the model; start that now so it
+        # overlaps with the rest of setup instead of the first turn paying it.
+        # Warm-up goes straight to the provider, not through the scheduler.
+        if os.getenv("CBSE_OLLAMA_WARMUP") == "0" or self.warm_up_ms:
+            return
+        targets = [p for p in providers(self.llm_service.client) if isinstance(p, OllamaProvider)]
+        if targets:
+            threading.Thread(
+                target=self._warm_up, args=(targets,), name="cbse-warmup", daemon=True
+            ).start()
+
+    def _warm_up(self, targets: list[OllamaProvider]) -> None:
+        for provider in targets:
+            try:
+                self.warm_up_ms[provider.model] = provider.warm_up()
+            except Exception:
+                # The first turn will surface a real connection problem.
+                self.warm_up_ms[provider.model] = None
+
+    def _create_speculator(self, speculate: bool | None) -> SpeculativeGenerator | None:
+        if speculate is None:
+            speculate = os.getenv("CBSE_SPECULATE") == "1"
+        if not speculate:
+            return None
+        choices_env = os.getenv("CBSE_SPECULATE_CHOICES")
+        tokens_env = os.getenv("CBSE_SPECULATE_TOKENS")
+        return SpeculativeGenerator(
+            self.llm_service,
+            max_choices=int(choices_env) if choices_env else 3,
+            token_budget=int(tokens_env) if tokens_env else 24000,
+            output_tokens=self.content.definition.llm.max_output_tokens,
+        )
+
+    def _create_budget_controller(self) -> PromptBudgetController | None:
+        target_env = os.getenv("CBSE_TARGET_P95_MS")
+        if not target_env:
+            return None
+        num_ctx_env = os.getenv("CBSE_OLLAMA_NUM_CTX")
+        controller = PromptBudgetController(
+            float(target_env),
+            start_level=level_for(self.prompt_builder),
+            num_ctx=int(num_ctx_env) if num_ctx_env else None,
+        )
+        controller.apply(self.prompt_builder, self.llm_service.client)
+        return controller
+
+    def _speculative_result(
+        self, messages: list[dict[str, str]], cancel: CancelToken | None
+    ) -> LLMResult | None:
+        if self.speculator is None:
+            return None
+        speculation = self.speculator.take(messages)
+        if speculation is None:
+            return None
+        # A guess that is still generating is further along than a fresh request.
+        while not speculation.future.done():
+            if cancel is not None and cancel.cancelled:
+                speculation.cancel.cancel()
+                cancel.raise_if_cancelled()
+            wait([speculation.future], timeout=0.05)
+        if speculation.future.cancelled() or speculation.future.exception() is not None:
+            return None
+        return speculation.future.result()[0]
+
+    def _record_budget(
+        self,
+        messages: list[dict[str, str]],
+        result: LLMResult,
+        latency_ms: float,
+    ) -> BudgetDecision | None:
+        if self.budget_controller is None:
+            return None
+        prompt_text = "".join(m["content"] for m in messages)
+        decision = self.budget_controller.record(
+            TurnSample(
+                prompt_chars=len(prompt_text),
+                prompt_tokens=estimate_tokens(prompt_text),
+                latency_ms=latency_ms,
+                attempts=result.attempts,
+                used_fallback=result.used_fallback,
+            )
+        )
+        self.budget_controller.apply(self.prompt_builder, self.llm_service.client)
+        return decision
+
+
+def _uses_cassette(client: LLMClient) -> bool:
+    while isinstance(client, LLMClient):
+        if isinstance(client, (CassetteClient, RecordingClient)):
+            return True
+        client = getattr(client, "inner", None)
+    return False
+
+
+def _scheduler(client: LLMClient) -> LLMScheduler | None:
+    # The scheduler sits under the router, one ScheduledClient per route.
+    while True:
+        if isinstance(client, ScheduledClient):
+            return client.scheduler
+        for route in getattr(client, "routes", None) or []:
+            scheduler = _scheduler(route.client)
+            if scheduler is not None:
+                return scheduler
+        inner = getattr(client, "inner", None)
+        if not isinstance(inner, LLMClient):
+            return None
+        client = inner
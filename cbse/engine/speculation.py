@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from cbse.engine.llm.cancel import CancelToken
+from cbse.engine.llm.scheduler import BACKGROUND, llm_priority
+from cbse.engine.llm_service import LLMResult, LLMService
+from cbse.engine.utils import estimate_tokens
+
+
+def message_key(messages: list[dict[str, str]]) -> str:
+    # The prompt already encodes state, memory, facts and recent history, so two
+    # identical prompts mean the speculative answer is still valid.
+    data = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Speculation:
+    key: str
+    player_input: str
+    cancel: CancelToken
+    future: Future[tuple[LLMResult, float]]
+
+
+class SpeculativeGenerator:
+    # Pre-generates the next turn for the offered choices while the player reads.
+    # Work runs on its own small pool and is cancelled as soon as a real turn
+    # needs the model for something else.
+    def __init__(
+        self,
+        service: LLMService,
+        max_choices: int = 3,
+        token_budget: int = 24000,
+        output_tokens: int = 0,
+        workers: int = 1,
+    ) -> None:
+        self.service = service
+        self.max_choices = max_choices
+        self.token_budget = token_budget
+        self.output_tokens = output_tokens
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="cbse-speculate"
+        )
+        self._pending: dict[str, Speculation] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def schedule(self, candidates: list[tuple[str, list[dict[str, str]]]]) -> int:
+        self.discard()
+        spent = 0
+        scheduled: dict[str, Speculation] = {}
+        for player_input, messages in candidates[: self.max_choices]:
+            key = message_key(messages)
+            if key in scheduled:
+                continue
+            cost = sum(estimate_tokens(m["content"]) for m in messages) + self.output_tokens
+            if self.token_budget and spent + cost > self.token_budget:
+                break
+            spent += cost
+            cancel = CancelToken()
+            future = self._executor.submit(self._generate, messages, cancel)
+            scheduled[key] = Speculation(
+                key=key, player_input=player_input, cancel=cancel, future=future
+            )
+        with self._lock:
+            self._pending = scheduled
+        return len(scheduled)
+
+    def take(self, messages: list[dict[str, str]]) -> Speculation | None:
+        # Whatever happens, the remaining guesses are stale now: free the model.
+        key = message_key(messages)
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        hit = pending.pop(key, None)
+        for speculation in pending.values():
+            self._drop(speculation)
+        if hit is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return hit
+
+    def discard(self) -> None:
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        for speculation in pending.values():
+            self._drop(speculation)
+
+    def close(self) -> None:
+        self.discard()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _drop(self, speculation: Speculation) -> None:
+        speculation.cancel.cancel()
+        speculation.future.cancel()
+
+    def _generate(
+        self, messages: list[dict[str, str]], cancel: CancelToken
+    ) -> tuple[LLMResult, float]:
+        cancel.raise_if_cancelled()
+        started = time.perf_counter()
+        with llm_priority(BACKGROUND):
+            result = self.service.generate(messages, cancel=cancel, speculative=True)
+        return result, (time.perf_counter() - started) * 1000
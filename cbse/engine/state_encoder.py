@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from cbse.engine.models import VariableDefinition
+from cbse.engine.state_store import DeltaInfo
+
+
+class StateEncoder:
+    def __init__(
+        self,
+        variables: dict[str, VariableDefinition],
+        list_tail: int = 5,
+        max_text_chars: int = 80,
+    ) -> None:
+        self.variables = variables
+        self.list_tail = list_tail
+        self.max_text_chars = max_text_chars
+        self._object_ids = [
+            var_id
+            for var_id, var_def in variables.items()
+            if var_def.type == "object" and not var_def.rules.readonly
+        ]
+        self._simple_paths = self._build_simple_paths()
+        self._hint_key: tuple | None = None
+        self._hint = ""
+
+    def legend(self, compact: bool = False) -> str:
+        return ", ".join(
+            f"{var_id}={var_def.label}" for var_id, var_def in self._prompt_vars(compact)
+        )
+
+    def encode(
+        self,
+        state: dict[str, Any],
+        deltas: dict[str, DeltaInfo] | None = None,
+        compact: bool = False,
+    ) -> str:
+        lines = []
+        for var_id, _ in self._prompt_vars(compact):
+            line = f"- {var_id}: {self.encode_value(state.get(var_id))}"
+            delta = deltas.get(var_id) if deltas else None
+            if delta and delta.changed:
+                line += f" [Δ{delta.summary}]" if delta.numeric_delta is not None else " [Δ]"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def encode_value(self, value: Any) -> str:
+        return json.dumps(self._shrink(value), ensure_ascii=False, separators=(",", ":"))
+
+    def path_hint(self, state: dict[str, Any]) -> str:
+        key = tuple(
+            (var_id, tuple(state[var_id].keys()) if isinstance(state.get(var_id), dict) else ())
+            for var_id in self._object_ids
+        )
+        if key != self._hint_key:
+            self._hint_key = key
+            self._hint = self._build_path_hint(key)
+        return self._hint
+
+    def _prompt_vars(self, compact: bool) -> list[tuple[str, VariableDefinition]]:
+        selected = []
+        for var_id, var_def in self.variables.items():
+            weight = var_def.card.prompt_weight
+            if weight not in ("high", "medium", "low"):
+                continue
+            if compact and weight == "low":
+                continue
+            selected.append((var_id, var_def))
+        return selected
+
+    def _shrink(self, value: Any) -> Any:
+        if isinstance(value, list):
+            # Only the newest items matter to the narrator; the count keeps the
+            # prompt honest about how much was dropped.
+            if len(value) > self.list_tail:
+                tail = [self._shrink(item) for item in value[-self.list_tail :]]
+                return [f"…{len(value) - self.list_tail} earlier"] + tail
+            return [self._shrink(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self._shrink(item) for key, item in value.items()}
+        if isinstance(value, str) and len(value) > self.max_text_chars:
+            return value[: self.max_text_chars - 1] + "…"
+        return value
+
+    def _build_simple_paths(self) -> list[str]:
+        paths = []
+        for var_id, var_def in self.variables.items():
+            if var_def.rules.readonly:
+                continue
+            if var_def.type in ("integer", "number"):
+                paths.append(f"/{var_id} (int)")
+            elif var_def.type == "boolean":
+                paths.append(f"/{var_id} (bool)")
+            elif var_def.type == "enum":
+                paths.append(f"/{var_id} (enum)")
+        return paths
+
+    def _build_path_hint(self, key: tuple) -> str:
+        nested_paths = [f"/{var_id}/{sub}" for var_id, subkeys in key for sub in subkeys]
+        simple_vars_str = ", ".join(self._simple_paths[:8])
+        nested_paths_str = ", ".join(nested_paths[:6])
+        return (
+            f"Simple paths: {simple_vars_str}\n"
+            f"Nested paths: {nested_paths_str}\n"
+            "IMPORTANT: Only use paths listed above. "
+            "Do NOT invent new paths like /progress, /cognitive, /comfort."
+        )
@@ -3,6 +3,8 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import Any
 
+from cbse.engine.fact_store import FactStore
+from cbse.engine.memory import RollingMemory
 from cbse.engine.models import Choice, TurnRecord
 from cbse.engine.utils import clone_state, deep_get, is_number
 
@@ -18,12 +20,17 @@ class DeltaInfo:
 class StateStore:
     state: dict[str, Any]
     history: list[TurnRecord] = field(default_factory=list)
-    memory_summary: str = ""
+    memory: RollingMemory = field(default_factory=RollingMemory)
+    facts: FactStore = field(default_factory=FactStore)
     last_state: dict[str, Any] = field(default_factory=dict)
     last_deltas: dict[str, DeltaInfo] = field(default_factory=dict)
     last_choices: list[Choice] = field(default_factory=list)
     triggered_triggers: set[str] = field(default_factory=set)
 
+    @property
+    def memory_summary(self) -> str:
+        return self.memory.render()
+
     def snapshot(self) -> dict[str, Any]:
         return clone_state(self.state)
 
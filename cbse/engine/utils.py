@@ -77,3 +77,27 @@ def normalize_time(state: dict[str, Any], time_var: str = "time") -> None:
     time_obj["minute"] = int(minute)
     time_obj["hour"] = int(hour)
     time_obj["day"] = int(day)
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough provider-agnostic estimate: CJK characters tend to be one token each,
+    # everything else averages about four characters per token.
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if "⺀" <= ch <= "鿿" or "豈" <= ch <= "￯")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    if budget <= 0:
+        return ""
+    if estimate_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + "…"
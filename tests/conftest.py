@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+
+def llm_output(narrative: str = "雾港的夜很长。") -> str:
+    # A minimal valid LLMOutput, as the model would send it.
+    return json.dumps(
+        {
+            "narrative_markdown": narrative,
+            "choices": [
+                {"id": "a", "label": "A", "hint": "", "risk": "low", "tags": []},
+                {"id": "b", "label": "B", "hint": "", "risk": "low", "tags": []},
+                {"id": "c", "label": "C", "hint": "", "risk": "low", "tags": []},
+            ],
+            "state_updates": [],
+            "new_facts": [],
+            "events": [],
+            "end": {"is_game_over": False, "ending_id": "", "reason": ""},
+        }
+    )
+
+
+@dataclass
+class StubResponse:
+    body: Any = None
+    status: int = 200
+    chunks: list[str] | None = None
+    delay: float = 0.0
+    chunk_delay: float = 0.0
+    content_type: str = "application/json"
+
+
+@dataclass
+class StubRequest:
+    method: str
+    path: str
+    query: dict[str, list[str]]
+    body: Any
+    headers: dict[str, str]
+    client_port: int
+
+
+@dataclass
+class StubLLMServer:
+    # Local stand-in for Ollama/OpenAI/Gemini endpoints. Routes map a path
+    # prefix to a callable returning a StubResponse.
+    routes: dict[str, Callable[[StubRequest], StubResponse]] = field(default_factory=dict)
+    requests: list[StubRequest] = field(default_factory=list)
+    url: str = ""
+
+    def route(self, prefix: str, handler: Callable[[StubRequest], StubResponse]) -> None:
+        self.routes[prefix] = handler
+
+    @property
+    def client_ports(self) -> set[int]:
+        return {req.client_port for req in self.requests}
+
+    def dispatch(self, request: StubRequest) -> StubResponse:
+        self.requests.append(request)
+        for prefix in sorted(self.routes, key=len, reverse=True):
+            if request.path.startswith(prefix):
+                return self.routes[prefix](request)
+        return StubResponse(body={"error": "not found"}, status=404)
+
+
+def _make_handler(server: StubLLMServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args: Any) -> None:
+            return None
+
+        def do_GET(self) -> None:
+            self._handle("GET")
+
+        def do_POST(self) -> None:
+            self._handle("POST")
+
+        def _handle(self, method: str) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else None
+            except ValueError:
+                body = raw.decode("utf-8", "replace")
+            parts = urlsplit(self.path)
+            request = StubRequest(
+                method=method,
+                path=parts.path,
+                query=parse_qs(parts.query),
+                body=body,
+                headers={k.lower(): v for k, v in self.headers.items()},
+                client_port=self.client_address[1],
+            )
+            response = server.dispatch(request)
+            if response.delay:
+                time.sleep(response.delay)
+            try:
+                if response.chunks is not None:
+                    self._send_chunks(response)
+                else:
+                    self._send_body(response)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+        def _send_body(self, response: StubResponse) -> None:
+            body = response.body
+            data = (
+                body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+            )
+            self.send_response(response.status)
+            self.send_header("Content-Type", response.content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_chunks(self, response: StubResponse) -> None:
+            self.send_response(response.status)
+            self.send_header("Content-Type", response.content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in response.chunks or []:
+                data = chunk.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+                if response.chunk_delay:
+                    time.sleep(response.chunk_delay)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+@pytest.fixture
+def stub_server():
+    server = StubLLMServer()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(server))
+    httpd.daemon_threads = True
+    server.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(
+        target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    try:
+        yield server
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
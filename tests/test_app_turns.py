@@ -0,0 +1,168 @@
+import asyncio
+import copy
+import json
+import time
+
+from cbse.engine.app import CardBarApp
+from cbse.engine.llm import LLMClient
+
+
+async def _idle(app, pilot) -> None:
+    for _ in range(200):
+        if app.turn_job is None and not app.queued_inputs:
+            return
+        await pilot.pause(0.05)
+    raise AssertionError("turn pipeline did not go idle")
+
+
+def test_inputs_submitted_mid_turn_are_queued(tmp_path, monkeypatch):
+    monkeypatch.setenv("CBSE_LLM_PROVIDER", "mock")
+
+    async def scenario() -> None:
+        app = CardBarApp(game_id="mist_harbor")
+        app.log_dir = tmp_path
+        async with app.run_test() as pilot:
+            await _idle(app, pilot)
+            start = len(app.store.history)
+            expected = app.store.last_choices[0].label
+            for text in ("1", "observe the dock"):
+                app.query_one("#input").value = text
+                await pilot.press("enter")
+            await _idle(app, pilot)
+
+            inputs = [turn.player_input for turn in app.store.history[start:]]
+            assert inputs == [expected, "observe the dock"]
+            assert str(app.query_one("#progress").render()) == ""
+
+    asyncio.run(scenario())
+
+
+class BlockingClient(LLMClient):
+    # Holds every request until it is cancelled, like a hung Ollama.
+    def complete(self, messages, cancel=None):
+        assert cancel is not None
+        while not cancel.cancelled:
+            time.sleep(0.01)
+        cancel.raise_if_cancelled()
+
+
+def test_cancel_leaves_state_untouched(tmp_path, monkeypatch):
+    monkeypatch.setenv("CBSE_LLM_PROVIDER", "mock")
+
+    async def scenario() -> None:
+        app = CardBarApp(game_id="mist_harbor")
+        app.log_dir = tmp_path
+        async with app.run_test() as pilot:
+            await _idle(app, pilot)
+            mock = app.llm_service.client
+            app.llm_service.client = BlockingClient()
+            history = len(app.store.history)
+            state = copy.deepcopy(app.store.state)
+
+            app.query_one("#input").value = "1"
+            await pilot.press("enter")
+            await pilot.pause(0.1)
+            assert app.turn_job is not None
+            await pilot.press("escape")
+            await _idle(app, pilot)
+
+            assert len(app.store.history) == history
+            assert app.store.state == state
+
+            app.llm_service.client = mock
+            app.query_one("#input").value = "2"
+            await pilot.press("enter")
+            await _idle(app, pilot)
+            assert len(app.store.history) == history + 1
+
+    asyncio.run(scenario())
+
+
+def test_new_input_supersedes_stale_turn(tmp_path, monkeypatch):
+    monkeypatch.setenv("CBSE_LLM_PROVIDER", "mock")
+    monkeypatch.setenv("CBSE_INFLIGHT_INPUT", "supersede")
+
+    async def scenario() -> None:
+        app = CardBarApp(game_id="mist_harbor")
+        app.log_dir = tmp_path
+        async with app.run_test() as pilot:
+            await _idle(app, pilot)
+            mock = app.llm_service.client
+            app.llm_service.client = BlockingClient()
+            history = len(app.store.history)
+
+            app.query_one("#input").value = "mistyped"
+            await pilot.press("enter")
+            await pilot.pause(0.1)
+            stale = app.turn_job
+            app.llm_service.client = mock
+            app.query_one("#input").value = "observe the dock"
+            await pilot.press("enter")
+            await _idle(app, pilot)
+
+            assert stale.cancel.cancelled
+            assert [turn.player_input for turn in app.store.history[history:]] == [
+                "observe the dock"
+            ]
+
+    asyncio.run(scenario())
+
+
+def test_speculated_choice_skips_generation(tmp_path, monkeypatch):
+    monkeypatch.setenv("CBSE_LLM_PROVIDER", "mock")
+    monkeypatch.setenv("CBSE_SPECULATE", "1")
+
+    async def scenario() -> None:
+        app = CardBarApp(game_id="mist_harbor")
+        app.log_dir = tmp_path
+        async with app.run_test() as pilot:
+            await _idle(app, pilot)
+            pending = list(app.speculator._pending.values())
+            assert pending
+            for speculation in pending:
+                speculation.future.result(timeout=5)
+
+            app.query_one("#input").value = "1"
+            await pilot.press("enter")
+            await _idle(app, pilot)
+
+            assert app.speculator.hits == 1
+            logs = [
+                json.loads(line) for line in (tmp_path / "turns.jsonl").read_text().splitlines()
+            ]
+            assert logs[-1]["speculative"] is True
+            assert logs[-1]["player_input"] == pending[0].player_input
+
+    asyncio.run(scenario())
+
+
+def test_replay_is_refused_while_a_turn_is_in_flight(tmp_path, monkeypatch):
+    monkeypatch.setenv("CBSE_LLM_PROVIDER", "mock")
+    replay = tmp_path / "replay.txt"
+    replay.write_text("1\n2\n", encoding="utf-8")
+
+    async def scenario() -> None:
+        app = CardBarApp(game_id="mist_harbor")
+        app.log_dir = tmp_path
+        async with app.run_test() as pilot:
+            await _idle(app, pilot)
+            mock = app.llm_service.client
+            app.llm_service.client = BlockingClient()
+            history = len(app.store.history)
+
+            app.query_one("#input").value = "observe the dock"
+            await pilot.press("enter")
+            await pilot.pause(0.1)
+            app.query_one("#input").value = f"/replay {replay}"
+            await pilot.press("enter")
+            await pilot.pause(0.1)
+            assert not app.replay_active
+            assert app.replay_inputs == []
+            assert app.queued_inputs == []
+
+            app.llm_service.client = mock
+            await pilot.press("escape")
+            await _idle(app, pilot)
+            assert len(app.store.history) == history
+
+    asyncio.run(scenario())
@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+from conftest import StubResponse
+
+from cbse.engine.client_factory import create_client
+from cbse.engine.content_loader import ContentLoader
+from cbse.engine.llm import (
+    HTTPClientPool,
+    LLMClient,
+    LLMScheduler,
+    MicroBatcher,
+    OllamaProvider,
+    OpenAIProvider,
+    PoolConfig,
+    limits_from_env,
+)
+from cbse.engine.llm.base import batch_parallelism
+
+
+class EchoClient(LLMClient):
+    max_parallel = 3
+
+    def __init__(self, delay: float = 0.05) -> None:
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def complete(self, messages, cancel=None):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.delay)
+            text = messages[0]["content"]
+            if text == "boom":
+                raise RuntimeError("backend rejected the request")
+            return text.upper()
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def _batch(*texts: str) -> list[list[dict[str, str]]]:
+    return [[{"role": "user", "content": text}] for text in texts]
+
+
+def test_complete_many_keeps_order_and_isolates_errors():
+    client = EchoClient()
+    results = client.complete_many(_batch("a", "boom", "c", "d", "e", "f"))
+
+    assert results[0] == "A"
+    assert isinstance(results[1], RuntimeError)
+    assert results[2:] == ["C", "D", "E", "F"]
+    assert client.peak == 3
+
+
+def test_complete_many_runs_ollama_requests_in_parallel(stub_server):
+    stub_server.route(
+        "/api/chat",
+        lambda req: StubResponse(body={"message": {"content": "{}"}}, delay=0.2),
+    )
+    client = OllamaProvider(
+        model="qwen3", temperature=0, max_output_tokens=10, base_url=stub_server.url
+    )
+    started = time.monotonic()
+    assert client.complete_many(_batch("1", "2", "3", "4")) == ["{}"] * 4
+    client.close()
+    assert time.monotonic() - started < 0.6
+
+
+def test_micro_batcher_groups_concurrent_callers():
+    inner = EchoClient()
+    batcher = MicroBatcher(inner, window_ms=100, max_batch=4)
+    results: dict[str, str] = {}
+
+    def call(text: str) -> None:
+        try:
+            results[text] = batcher.complete(_batch(text)[0])
+        except RuntimeError as exc:
+            results[text] = f"error: {exc}"
+
+    threads = [threading.Thread(target=call, args=(t,)) for t in ("a", "b", "boom", "d", "e")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2.0)
+    batcher.close()
+
+    assert results == {
+        "a": "A",
+        "b": "B",
+        "boom": "error: backend rejected the request",
+        "d": "D",
+        "e": "E",
+    }
+    assert batcher.stats()["batches"] == 2
+    assert batcher.stats()["requests"] == 5
+
+
+def _batch_line(custom_id: str, status: int, content: str = "") -> str:
+    body = {"choices": [{"message": {"content": content}}]} if status == 200 else {}
+    return json.dumps({"custom_id": custom_id, "response": {"status_code": status, "body": body}})
+
+
+def test_openai_offline_batch_returns_results_in_order(stub_server):
+    polls = []
+
+    def files(req):
+        if req.method == "POST":
+            assert "request-1" in req.body
+            return StubResponse(body={"id": "file-in"})
+        if req.path == "/v1/files/file-out/content":
+            lines = [
+                _batch_line("request-1", 200, "second"),
+                _batch_line("request-0", 200, "first"),
+            ]
+        else:
+            lines = [_batch_line("request-2", 400)]
+        return StubResponse(body="\n".join(lines), content_type="application/jsonl")
+
+    def batches(req):
+        if req.method == "POST":
+            assert req.body["input_file_id"] == "file-in"
+            return StubResponse(body={"id": "batch-1", "status": "validating"})
+        polls.append(req.path)
+        if len(polls) < 2:
+            return StubResponse(body={"id": "batch-1", "status": "in_progress"})
+        return StubResponse(
+            body={
+                "id": "batch-1",
+                "status": "completed",
+                "output_file_id": "file-out",
+                "error_file_id": "file-err",
+            }
+        )
+
+    stub_server.route("/v1/files", files)
+    stub_server.route("/v1/batches", batches)
+    client = OpenAIProvider(
+        model="m",
+        temperature=0,
+        max_output_tokens=10,
+        api_key="k",
+        base_url=f"{stub_server.url}/v1",
+    )
+    results = client.complete_offline(_batch("x", "y", "z"), poll_interval=0.01)
+    client.close()
+
+    assert results[:2] == ["first", "second"]
+    assert isinstance(results[2], RuntimeError)
+    assert polls == ["/v1/batches/batch-1", "/v1/batches/batch-1"]
+
+
+def test_factory_chain_keeps_ollama_parallelism(monkeypatch):
+    def slow_complete(self, messages, cancel=None):
+        time.sleep(0.1)
+        return messages[0]["content"]
+
+    monkeypatch.setattr(OllamaProvider, "complete", slow_complete)
+    monkeypatch.setenv("CBSE_LLM_PROVIDER", "ollama")
+    monkeypatch.delenv("CBSE_LLM_ROUTES", raising=False)
+    monkeypatch.delenv("CBSE_LLM_CONCURRENCY", raising=False)
+    root = Path(__file__).resolve().parents[1]
+    content = ContentLoader(root / "games").load_game("cdi_game")
+    with HTTPClientPool(PoolConfig()) as pool:
+        client = create_client(content, pool, LLMScheduler(limits_from_env()))
+        assert batch_parallelism(client) == OllamaProvider.max_parallel
+        started = time.perf_counter()
+        results = client.complete_many(_batch(*"abcdefgh"))
+        elapsed = time.perf_counter() - started
+        assert results == list("abcdefgh")
+        # Eight 0.1 s requests, four at a time: about 0.2 s, not 0.8 s.
+        assert elapsed < 0.5
+
+        monkeypatch.setenv("CBSE_LLM_ROUTES", "ollama:small,ollama:large")
+        routed = create_client(content, pool, LLMScheduler(limits_from_env()))
+        assert batch_parallelism(routed) == OllamaProvider.max_parallel
+        routed.close()
@@ -0,0 +1,111 @@
+from pathlib import Path
+
+from cbse.engine.budget_controller import (
+    BUDGET_LEVELS,
+    PromptBudgetController,
+    TurnSample,
+    level_for,
+)
+from cbse.engine.content_loader import ContentLoader, index_variables
+from cbse.engine.llm import MockProvider
+from cbse.engine.prompt_builder import PromptBuilder
+from cbse.engine.session import GameSession
+
+
+def _sample(latency_ms: float, attempts: int = 1, used_fallback: bool = False) -> TurnSample:
+    return TurnSample(
+        prompt_chars=4000,
+        prompt_tokens=1500,
+        latency_ms=latency_ms,
+        attempts=attempts,
+        used_fallback=used_fallback,
+    )
+
+
+def test_shrinks_when_p95_exceeds_target():
+    controller = PromptBudgetController(target_p95_ms=2000, min_samples=5, cooldown=3)
+    decisions = [controller.record(_sample(1500)) for _ in range(4)]
+    assert all(d.action == "hold" for d in decisions)
+
+    decision = controller.record(_sample(5000))
+    assert decision.action == "shrink"
+    assert decision.level == 1
+    assert decision.reason == "p95 over target"
+
+
+def test_expands_when_well_under_target():
+    controller = PromptBudgetController(
+        target_p95_ms=10000, start_level=3, min_samples=3, cooldown=3
+    )
+    actions = [controller.record(_sample(1000)).action for _ in range(3)]
+    assert actions[-1] == "expand"
+    assert controller.level == 2
+
+
+def test_backs_off_on_repairs_and_fallback():
+    controller = PromptBudgetController(target_p95_ms=10000, cooldown=2)
+    controller.record(_sample(100))
+    decision = controller.record(_sample(100, attempts=2))
+    assert decision.action == "shrink"
+    assert decision.reason == "repairs"
+
+    decision = controller.record(_sample(100, used_fallback=True))
+    assert decision.action == "shrink"
+    assert decision.reason == "fallback"
+    assert controller.level == 2
+
+
+def test_apply_updates_builder_and_client():
+    base_dir = Path(__file__).resolve().parents[1]
+    content = ContentLoader(base_dir / "games").load_game("mist_harbor")
+    builder = PromptBuilder(
+        index_variables(content.definition.variables), compact=True, world_max_chars=1600
+    )
+
+    class Client:
+        num_ctx = 4096
+
+    client = Client()
+    controller = PromptBudgetController(target_p95_ms=1000, start_level=level_for(builder))
+    controller.level = len(BUDGET_LEVELS) - 1
+    controller.apply(builder, client)
+
+    assert builder.world_max_chars == BUDGET_LEVELS[-1].world_max_chars
+    assert builder.recent_turns == BUDGET_LEVELS[-1].recent_turns
+    assert client.num_ctx == BUDGET_LEVELS[-1].num_ctx
+    assert controller.record(_sample(100)).to_dict()["budget"]["num_ctx"] == client.num_ctx
+
+
+def test_apply_keeps_explicit_num_ctx_until_backing_off():
+    base_dir = Path(__file__).resolve().parents[1]
+    content = ContentLoader(base_dir / "games").load_game("mist_harbor")
+    builder = PromptBuilder(index_variables(content.definition.variables))
+
+    class Client:
+        num_ctx = 16384
+
+    client = Client()
+    controller = PromptBudgetController(target_p95_ms=1000, start_level=0, num_ctx=16384)
+    controller.apply(builder, client)
+    assert client.num_ctx == 16384
+
+    decision = controller.record(_sample(100, used_fallback=True))
+    controller.apply(builder, client)
+    assert decision.level == 1
+    assert client.num_ctx == BUDGET_LEVELS[1].num_ctx
+    assert decision.budget.num_ctx == client.num_ctx
+
+    controller.level = 0
+    controller.apply(builder, client)
+    assert client.num_ctx == 16384
+
+
+def test_session_passes_num_ctx_env_to_budget_controller(monkeypatch, tmp_path):
+    monkeypatch.setenv("CBSE_TARGET_P95_MS", "1000")
+    monkeypatch.setenv("CBSE_OLLAMA_NUM_CTX", "2048")
+    base_dir = Path(__file__).resolve().parents[1]
+    content = ContentLoader(base_dir / "games").load_game("mist_harbor")
+    ids = {var.id for var in content.definition.variables}
+    session = GameSession(content, MockProvider(ids, []), save_dir=tmp_path)
+    assert session.budget_controller.num_ctx == 2048
+    assert session.budget_controller.context_size() == 2048
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from cbse.engine.app import CardBarApp
+from cbse.engine.llm import CassetteClient, CassetteError, LLMClient, RecordingClient
+from cbse.engine.llm_service import LLMService
+from cbse.engine.schema_validator import SchemaValidator
+
+
+class EchoClient(LLMClient):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def complete(self, messages, cancel=None):
+        self.calls += 1
+        return f"{self.calls}:{messages[-1]['content']}"
+
+
+def _messages(text: str) -> list[dict[str, str]]:
+    return [{"role": "user", "content": text}]
+
+
+def _record(path, prompts: list[str]) -> list[str]:
+    recorder = RecordingClient(EchoClient(), path)
+    replies = [recorder.complete(_messages(p)) for p in prompts[:-1]]
+    replies.append("".join(recorder.stream(_messages(prompts[-1]))))
+    return replies
+
+
+def test_strict_playback_follows_recorded_sequence(tmp_path):
+    path = tmp_path / "run.cassette.jsonl"
+    replies = _record(path, ["a", "b", "a"])
+
+    player = CassetteClient(path, "strict")
+    assert [player.complete(_messages(p)) for p in ["a", "b"]] == replies[:2]
+    with pytest.raises(CassetteError):
+        player.complete(_messages("b"))
+    assert "".join(player.stream(_messages("a"))) == replies[2]
+    with pytest.raises(CassetteError):
+        player.complete(_messages("a"))
+
+
+def test_lenient_playback_matches_by_prompt_first(tmp_path):
+    path = tmp_path / "run.cassette.jsonl"
+    replies = _record(path, ["a", "b", "c"])
+
+    player = CassetteClient(path, "lenient")
+    assert player.complete(_messages("c")) == replies[2]
+    assert player.complete(_messages("a")) == replies[0]
+    # Unknown prompt: the next unused response in recorded order.
+    assert player.complete(_messages("zzz")) == replies[1]
+    assert player.remaining == 0
+
+
+def test_strict_mismatch_fails_the_turn_instead_of_falling_back(tmp_path):
+    path = tmp_path / "run.cassette.jsonl"
+    _record(path, ["a", "b"])
+    service = LLMService(CassetteClient(path, "strict"), SchemaValidator())
+    with pytest.raises(CassetteError):
+        service.generate(_messages("changed prompt"))
+
+
+async def _play(app: CardBarApp, pilot) -> None:
+    for _ in range(200):
+        if not app.replay_active and app.turn_job is None:
+            return
+        await pilot.pause(0.05)
+    raise AssertionError("replay did not finish")
+
+
+def test_replay_is_reproducible_from_a_cassette(tmp_path, monkeypatch):
+    monkeypatch.setenv("CBSE_LLM_PROVIDER", "mock")
+    cassette = tmp_path / "demo.cassette.jsonl"
+
+    async def run(mode: str) -> tuple[list[str], CardBarApp]:
+        app = CardBarApp(
+            replay_file="replays/mist_harbor_demo.jsonl",
+            game_id="mist_harbor",
+            cassette=str(cassette),
+            cassette_mode=mode,
+        )
+        app.log_dir = tmp_path
+        async with app.run_test() as pilot:
+            await _play(app, pilot)
+            narratives = [turn.narrative_markdown for turn in app.store.history]
+        return narratives, app
+
+    recorded, _ = asyncio.run(run("record"))
+    played, app = asyncio.run(run("strict"))
+
+    assert len(recorded) == 5
+    assert played == recorded
+    assert isinstance(app.llm_service.client, CassetteClient)
+    assert app.llm_service.client.remaining == 0
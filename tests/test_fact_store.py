@@ -0,0 +1,51 @@
+from cbse.engine.fact_store import FactStore
+from cbse.engine.save_system import SaveSystem
+from cbse.engine.state_store import StateStore
+from cbse.engine.utils import estimate_tokens
+
+
+def test_add_dedups_normalised_text():
+    store = FactStore()
+    first = store.add("旧电厂的保险丝被人换过。", turn_index=2)
+    again = store.add("  旧电厂的保险丝被人换过 ", turn_index=5)
+    store.add("The Mayor owns the dock.", turn_index=3)
+    store.add("the mayor owns  the dock", turn_index=4)
+
+    assert first is again
+    assert len(store) == 2
+    assert first.turn_index == 2
+    assert first.last_seen_turn == 5
+    assert first.mentions == 2
+
+
+def test_lookup_by_keyword():
+    store = FactStore()
+    store.add("莲在码头见过市长。", turn_index=1)
+    store.add("灯塔的灯在午夜熄灭。", turn_index=2)
+    store.add("Dockmaster Wen hides a ledger.", turn_index=3)
+
+    assert [f.text for f in store.lookup("码头")] == ["莲在码头见过市长。"]
+    assert [f.text for f in store.lookup("ledger")] == ["Dockmaster Wen hides a ledger."]
+    assert store.lookup("钟楼") == []
+
+
+def test_relevant_respects_limit_and_budget():
+    store = FactStore()
+    for idx in range(40):
+        store.add(f"档案第{idx}号记录了一次停电。", turn_index=idx)
+    store.add("灯塔守人收到一封匿名信。", turn_index=1)
+
+    facts = store.relevant("去灯塔问守人", limit=5, token_budget=60)
+    assert 0 < len(facts) <= 5
+    assert "灯塔守人收到一封匿名信。" in [f.text for f in facts]
+    assert sum(estimate_tokens(f.text) + 2 for f in facts) <= 60
+
+
+def test_facts_persist_in_save(tmp_path):
+    store = StateStore(state={})
+    store.facts.add("报社的底片被烧毁。", turn_index=7)
+    system = SaveSystem(tmp_path)
+    system.save("slot", store, "mist_harbor", "1.0")
+
+    restored = FactStore.from_facts(system.load("slot").facts)
+    assert [f.turn_index for f in restored.lookup("底片")] == [7]
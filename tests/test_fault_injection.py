@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from cbse.engine.llm import (
+    CancelToken,
+    FaultConfig,
+    FaultInjectingClient,
+    InjectedFault,
+    LLMCancelled,
+    MockProvider,
+)
+from cbse.engine.llm_service import LLMService
+from cbse.engine.schema_validator import SchemaValidator
+
+MESSAGES = [{"role": "user", "content": "go"}]
+
+
+def _client(spec: str) -> FaultInjectingClient:
+    mock = MockProvider({"clues", "location", "time"}, ["码头", "酒吧"])
+    return FaultInjectingClient(mock, FaultConfig.from_spec(spec))
+
+
+def test_spec_parsing():
+    config = FaultConfig.from_spec("latency_ms=800, malformed_rate=0.25,chunk_chars=8,seed=3")
+    assert (config.latency_ms, config.malformed_rate, config.chunk_chars, config.seed) == (
+        800.0,
+        0.25,
+        8,
+        3,
+    )
+    with pytest.raises(ValueError):
+        FaultConfig.from_spec("malformed=0.2")
+
+
+def test_same_seed_replays_the_same_faults():
+    spec = "malformed_rate=0.3,truncate_rate=0.2,invalid_path_rate=0.2,seed=11"
+    runs = []
+    for _ in range(2):
+        client = _client(spec)
+        runs.append([client.complete(MESSAGES) for _ in range(20)])
+    assert runs[0] == runs[1]
+    assert client.stats()["requests"] == 20
+    assert 0 < sum(v for k, v in client.stats().items() if k != "requests") < 20
+
+    other = _client(spec.replace("seed=11", "seed=12"))
+    assert [other.complete(MESSAGES) for _ in range(20)] != runs[0]
+
+
+def test_broken_output_drives_repair_and_fallback():
+    # Every request is cut short: local repair or the repair prompt must
+    # recover a usable turn, or the fallback takes over.
+    service = LLMService(_client("truncate_rate=1,seed=5"), SchemaValidator())
+    outcomes = {service.generate(MESSAGES).metrics.outcome for _ in range(10)}
+    assert outcomes and "ok" not in outcomes
+
+    service = LLMService(_client("invalid_path_rate=1"), SchemaValidator())
+    result = service.generate(MESSAGES)
+    assert result.used_fallback is False
+    assert result.output.state_updates[-1].path.startswith("ghost.")
+
+
+def test_http_errors_look_like_provider_errors():
+    client = _client("error_rate=1")
+    with pytest.raises(InjectedFault) as excinfo:
+        client.complete(MESSAGES)
+    assert excinfo.value.status_code in (429, 500, 503)
+
+    result = LLMService(client, SchemaValidator()).generate(MESSAGES)
+    assert result.used_fallback is True
+    assert "injected" in result.error
+
+
+def test_latency_and_timeouts_stay_cancellable():
+    for spec in ("latency_ms=5000", "timeout_rate=1,timeout_s=5"):
+        client = _client(spec)
+        cancel = CancelToken()
+        threading.Timer(0.1, cancel.cancel).start()
+        started = time.monotonic()
+        with pytest.raises(LLMCancelled):
+            client.complete(MESSAGES, cancel=cancel)
+        assert time.monotonic() - started < 1.0
+
+
+def test_stream_stall_delays_but_keeps_content():
+    client = _client("stall_rate=1,stall_ms=200,chunk_chars=16")
+    expected = MockProvider({"clues", "location", "time"}, ["码头", "酒吧"]).complete(MESSAGES)
+    started = time.monotonic()
+    chunks = list(client.stream(MESSAGES))
+    assert time.monotonic() - started >= 0.2
+    assert len(chunks) > 1 and "".join(chunks) == expected
+
+
+class SlowStream(MockProvider):
+    def stream(self, messages, cancel=None):
+        content = self.complete(messages, cancel)
+        for start in range(0, len(content), 40):
+            yield content[start : start + 40]
+            time.sleep(0.05)
+
+
+def test_stream_passes_chunks_through_unless_the_text_is_damaged():
+    expected = MockProvider({"clues", "location", "time"}, ["码头", "酒吧"]).complete(MESSAGES)
+    for spec, damaged in (("chunk_chars=16", False), ("malformed_rate=1,chunk_chars=16", True)):
+        slow = SlowStream({"clues", "location", "time"}, ["码头", "酒吧"])
+        client = FaultInjectingClient(slow, FaultConfig.from_spec(spec))
+        started = time.monotonic()
+        stream = client.stream(MESSAGES)
+        first = next(stream)
+        first_ms = (time.monotonic() - started) * 1000
+        text = first + "".join(stream)
+        total_ms = (time.monotonic() - started) * 1000
+        if damaged:
+            # Corruption needs the whole response before the first chunk.
+            assert first_ms >= total_ms * 0.9 and text != expected
+        else:
+            assert first_ms < 40 and text == expected
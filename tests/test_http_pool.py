@@ -0,0 +1,90 @@
+import pytest
+from conftest import StubResponse, llm_output
+
+from cbse.engine.llm import (
+    GeminiProvider,
+    HTTPClientPool,
+    OllamaProvider,
+    OpenAIProvider,
+    PoolConfig,
+)
+
+OUTPUT = llm_output("雾。")
+
+
+def _routes(server) -> None:
+    server.route("/api/chat", lambda req: StubResponse({"message": {"content": OUTPUT}}))
+    server.route(
+        "/v1/chat/completions",
+        lambda req: StubResponse({"choices": [{"message": {"content": OUTPUT}}]}),
+    )
+    server.route(
+        "/v1beta/models/",
+        lambda req: StubResponse({"candidates": [{"content": {"parts": [{"text": OUTPUT}]}}]}),
+    )
+
+
+def test_providers_reuse_one_connection(stub_server):
+    _routes(stub_server)
+    messages = [{"role": "user", "content": "hi"}]
+    with HTTPClientPool(PoolConfig(max_connections=2)) as pool:
+        providers = [
+            OllamaProvider(
+                model="m", temperature=0, max_output_tokens=10, base_url=stub_server.url, pool=pool
+            ),
+            OpenAIProvider(
+                model="m",
+                temperature=0,
+                max_output_tokens=10,
+                api_key="k",
+                base_url=f"{stub_server.url}/v1",
+                pool=pool,
+            ),
+            GeminiProvider(
+                model="m",
+                temperature=0,
+                max_output_tokens=10,
+                api_key="k",
+                base_url=f"{stub_server.url}/v1beta",
+                pool=pool,
+            ),
+        ]
+        for _ in range(3):
+            for provider in providers:
+                assert provider.complete(messages) == OUTPUT
+
+    assert len(stub_server.requests) == 9
+    # Sequential calls to one origin share a single kept-alive connection.
+    assert len(stub_server.client_ports) == 1
+
+
+def test_shared_pool_outlives_provider_close(stub_server):
+    _routes(stub_server)
+    messages = [{"role": "user", "content": "hi"}]
+    pool = HTTPClientPool()
+    first = OllamaProvider(
+        model="m", temperature=0, max_output_tokens=10, base_url=stub_server.url, pool=pool
+    )
+    second = OllamaProvider(
+        model="m", temperature=0, max_output_tokens=10, base_url=stub_server.url, pool=pool
+    )
+
+    with first:
+        first.complete(messages)
+    second.complete(messages)
+    assert len(stub_server.client_ports) == 1
+
+    pool.close()
+    with pytest.raises(RuntimeError):
+        second.complete(messages)
+
+
+def test_owned_pool_is_closed_with_provider(stub_server):
+    _routes(stub_server)
+    provider = OllamaProvider(
+        model="m", temperature=0, max_output_tokens=10, base_url=stub_server.url
+    )
+    provider.complete([{"role": "user", "content": "hi"}])
+    provider.close()
+    with pytest.raises(RuntimeError):
+        provider.complete([{"role": "user", "content": "hi"}])
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from cbse.engine.json_repair import repair_json_text
+from cbse.engine.llm import LLMClient
+from cbse.engine.llm_service import LLMService
+from cbse.engine.schema_validator import SchemaError, SchemaValidator
+
+CHOICES = (
+    '[{"id": "a", "label": "查看", "hint": "", "risk": "low", "tags": []},'
+    ' {"id": "b", "label": "追问", "hint": "", "risk": "low", "tags": []},'
+    ' {"id": "c", "label": "离开", "hint": "", "risk": "low", "tags": []}]'
+)
+VALID = (
+    '{"narrative_markdown": "雾。", "choices": '
+    + CHOICES
+    + ', "state_updates": [], "new_facts": [],'
+    ' "events": [], "end": {"is_game_over": false, "ending_id": "", "reason": ""}}'
+)
+
+
+@pytest.mark.parametrize(
+    "broken",
+    [
+        "```json\n" + VALID + "\n```",
+        "Sure! Here is the turn:\n" + VALID + "\nHope this helps.",
+        VALID.replace("[]}", "[],}").replace('"tags": []', '"tags": [],'),
+        VALID.replace('"雾。"', "'雾。'"),
+        VALID.replace("false", "False"),
+        VALID.replace("：", ":").replace('"narrative_markdown": ', '"narrative_markdown"：'),
+        VALID.replace(', "new_facts"', ' "new_facts"'),
+    ],
+)
+def test_mechanical_breakage_is_repaired(broken):
+    assert json.loads(repair_json_text(broken)) == json.loads(VALID)
+
+
+def test_raw_newlines_and_inner_quotes_in_cjk_strings():
+    text = '{"narrative_markdown": "他说"快走"。\n雾更浓了。", "new_facts": ["码头\t有人"]}'
+    data = json.loads(repair_json_text(text))
+    assert data["narrative_markdown"] == '他说"快走"。\n雾更浓了。'
+    assert data["new_facts"] == ["码头\t有人"]
+
+
+def test_truncated_output_is_closed():
+    truncated = VALID[: VALID.index('"state_updates"') + 3]
+    data = json.loads(repair_json_text(truncated))
+    assert data["narrative_markdown"] == "雾。"
+    assert len(data["choices"]) == 3
+
+    mid_string = '{"narrative_markdown": "雾港的夜'
+    assert json.loads(repair_json_text(mid_string)) == {"narrative_markdown": "雾港的夜"}
+
+
+def test_repair_maps_field_names_but_invents_nothing():
+    validator = SchemaValidator()
+    aliased = json.loads(VALID)
+    aliased["Narrative"] = aliased.pop("narrative_markdown")
+    aliased["options"] = [c["label"] for c in aliased.pop("choices")]
+    aliased["ending"] = aliased.pop("end")["is_game_over"]
+    del aliased["new_facts"]
+    aliased["mood"] = "tense"
+    output = validator.repair(json.dumps(aliased, ensure_ascii=False))
+    assert output.narrative_markdown == "雾。"
+    assert [c.label for c in output.choices] == ["查看", "追问", "离开"]
+
+    with pytest.raises(SchemaError):
+        validator.repair('{"choices": ["a", "b", "c"]}')
+
+
+@pytest.mark.parametrize(("raw", "expected"), [("false", False), ("no", False), ("TRUE", True)])
+def test_repair_reads_string_booleans(raw, expected):
+    data = json.loads(VALID)
+    data["end"] = {"is_game_over": raw}
+    output = SchemaValidator().repair(json.dumps(data, ensure_ascii=False))
+    assert output.end.is_game_over is expected
+
+
+class ScriptedClient(LLMClient):
+    def __init__(self, replies: list[str]) -> None:
+        self.replies = replies
+        self.prompts: list[list[dict[str, str]]] = []
+
+    def complete(self, messages, cancel=None):
+        self.prompts.append(messages)
+        return self.replies[len(self.prompts) - 1]
+
+
+def test_local_repair_skips_llm_round_trip():
+    client = ScriptedClient(["```json\n" + VALID.replace("false", "False")[:-2]])
+    result = LLMService(client=client, validator=SchemaValidator()).generate(
+        [{"role": "user", "content": "go"}]
+    )
+    assert not result.used_fallback
+    assert result.repaired_locally
+    assert result.attempts == 1
+    assert len(client.prompts) == 1
+
+
+def test_llm_repair_still_sees_the_raw_output():
+    client = ScriptedClient(['{"narrative_markdown": "雾。"}', VALID])
+    result = LLMService(client=client, validator=SchemaValidator()).generate(
+        [{"role": "user", "content": "go"}]
+    )
+    assert result.attempts == 2
+    assert '{"narrative_markdown": "雾。"}' in client.prompts[1][-1]["content"]
@@ -0,0 +1,92 @@
+import pytest
+
+from cbse.engine.llm import CacheConfig, CachingClient, LLMClient, ResponseCache
+
+
+class CountingClient(LLMClient):
+    name = "counting"
+
+    def __init__(self, temperature: float = 0.0) -> None:
+        self.model = "m"
+        self.temperature = temperature
+        self.calls = 0
+
+    def complete(self, messages, cancel=None):
+        self.calls += 1
+        return f"reply {self.calls} to {messages[-1]['content']}"
+
+
+def _messages(text: str) -> list[dict[str, str]]:
+    return [{"role": "user", "content": text}]
+
+
+def test_identical_prompts_hit_cache_across_instances(tmp_path):
+    config = CacheConfig(directory=tmp_path)
+    inner = CountingClient()
+    client = CachingClient(inner, ResponseCache(config))
+
+    first = client.complete(_messages("开始"))
+    assert client.complete(_messages("开始")) == first
+    assert "".join(client.stream(_messages("开始"))) == first
+    assert inner.calls == 1
+    assert client.stats() == {"hits": 2, "misses": 1, "bypassed": 0}
+
+    # A fresh process only has the disk store to go on.
+    restarted = CachingClient(CountingClient(), ResponseCache(config))
+    assert restarted.complete(_messages("开始")) == first
+    assert restarted.inner.calls == 0
+
+
+def test_key_covers_provider_settings(tmp_path):
+    cache = ResponseCache(CacheConfig(directory=tmp_path))
+    inner = CountingClient()
+    client = CachingClient(inner, cache)
+    client.complete(_messages("hi"))
+    inner.model = "other"
+    client.complete(_messages("hi"))
+    assert inner.calls == 2
+
+    # Constrained decoding follows the live state, so a new schema is a new key.
+    inner.json_schema = {"type": "object", "required": ["narrative_markdown"]}
+    client.complete(_messages("hi"))
+    inner.json_schema = {"type": "object", "required": ["narrative_markdown", "choices"]}
+    client.complete(_messages("hi"))
+    inner.format_mode = "json"
+    client.complete(_messages("hi"))
+    assert inner.calls == 5
+    client.complete(_messages("hi"))
+    assert inner.calls == 5
+
+
+def test_sampled_output_bypasses_cache_unless_forced(tmp_path):
+    inner = CountingClient(temperature=0.7)
+    client = CachingClient(inner, ResponseCache(CacheConfig(directory=tmp_path)))
+    assert client.complete(_messages("hi")) != client.complete(_messages("hi"))
+    assert client.stats()["bypassed"] == 2
+
+    forced = CachingClient(inner, ResponseCache(CacheConfig(directory=tmp_path, force=True)))
+    assert forced.complete(_messages("hi")) == forced.complete(_messages("hi"))
+
+
+def test_lru_and_disk_eviction(tmp_path):
+    cache = ResponseCache(CacheConfig(directory=tmp_path, max_entries=2, max_disk_bytes=600))
+    for idx in range(6):
+        cache.put(f"{idx:02d}" + "k" * 30, "x" * 100)
+    assert len(cache) == 2
+    files = list(tmp_path.glob("*/*.json"))
+    assert 0 < len(files) < 6
+    assert sum(p.stat().st_size for p in files) <= 600
+    # The newest entries survive.
+    assert cache.get("05" + "k" * 30) == "x" * 100
+
+
+def test_incomplete_stream_is_not_cached(tmp_path):
+    class Broken(CountingClient):
+        def stream(self, messages, cancel=None):
+            yield '{"narr'
+            raise RuntimeError("connection reset")
+
+    client = CachingClient(Broken(), ResponseCache(CacheConfig(directory=tmp_path)))
+    with pytest.raises(RuntimeError):
+        list(client.stream(_messages("hi")))
+    assert list(tmp_path.glob("*/*.json")) == []
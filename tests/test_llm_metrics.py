@@ -0,0 +1,126 @@
+import json
+
+import httpx
+from conftest import StubResponse, llm_output
+
+from cbse.engine.llm import LLMClient, MetricsRegistry, OllamaProvider, OpenAIProvider
+from cbse.engine.llm.metrics import record_call, serve_metrics
+from cbse.engine.llm_service import LLMService
+from cbse.engine.schema_validator import SchemaValidator
+
+OUTPUT = llm_output()
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class ScriptedClient(LLMClient):
+    name = "scripted"
+    model = "s-1"
+
+    def __init__(self, outputs: list[str]) -> None:
+        self.outputs = outputs
+
+    def complete(self, messages, cancel=None):
+        record_call(self.name, self.model, prompt_tokens=100, completion_tokens=20)
+        return self.outputs.pop(0)
+
+
+def test_ollama_counts_and_durations_reach_the_result(stub_server):
+    final = {
+        "message": {"content": OUTPUT},
+        "done": True,
+        "load_duration": 1_500_000_000,
+        "prompt_eval_duration": 300_000_000,
+        "eval_duration": 900_000_000,
+        "prompt_eval_count": 512,
+        "eval_count": 96,
+    }
+    stub_server.route("/api/chat", lambda req: StubResponse(body=final))
+    client = OllamaProvider(
+        model="qwen3", temperature=0, max_output_tokens=10, base_url=stub_server.url
+    )
+    registry = MetricsRegistry()
+    result = LLMService(client, SchemaValidator(), metrics=registry).generate(MESSAGES)
+    client.close()
+
+    metrics = result.metrics
+    assert (metrics.provider, metrics.model, metrics.outcome) == ("ollama", "qwen3", "ok")
+    assert (metrics.prompt_tokens, metrics.completion_tokens) == (512, 96)
+    assert (metrics.load_ms, metrics.prompt_eval_ms, metrics.eval_ms) == (1500.0, 300.0, 900.0)
+    assert metrics.ttft_ms is not None and metrics.ttft_ms <= metrics.total_ms
+    assert registry.value(
+        "cbse_llm_model_load_seconds_total", provider="ollama", model="qwen3", kind="turn"
+    )
+    assert result.metrics.to_dict()["calls"] == 1
+
+
+def test_openai_stream_requests_usage(stub_server):
+    chunks = [
+        {"choices": [{"delta": {"content": OUTPUT}}]},
+        {"choices": [], "usage": {"prompt_tokens": 300, "completion_tokens": 80}},
+    ]
+    stub_server.route(
+        "/v1/chat/completions",
+        lambda req: StubResponse(
+            chunks=[f"data: {json.dumps(chunk)}\n\n" for chunk in chunks] + ["data: [DONE]\n\n"],
+            content_type="text/event-stream",
+        ),
+    )
+    client = OpenAIProvider(
+        model="m",
+        temperature=0,
+        max_output_tokens=10,
+        api_key="k",
+        base_url=f"{stub_server.url}/v1",
+    )
+    result = LLMService(client, SchemaValidator()).generate(MESSAGES, on_narrative=lambda _: None)
+    client.close()
+
+    assert stub_server.requests[0].body["stream_options"] == {"include_usage": True}
+    assert (result.metrics.prompt_tokens, result.metrics.completion_tokens) == (300, 80)
+
+
+def test_repairs_are_counted_per_provider():
+    registry = MetricsRegistry()
+    service = LLMService(
+        ScriptedClient(["not json", "still not json", OUTPUT]), SchemaValidator(), metrics=registry
+    )
+    result = service.generate(MESSAGES)
+
+    assert result.metrics.outcome == "retried"
+    assert (result.metrics.attempts, result.metrics.calls) == (3, 3)
+    assert result.metrics.prompt_tokens == 300
+    labels = {"provider": "scripted", "model": "s-1", "kind": "turn"}
+    assert registry.value("cbse_llm_requests_total", **labels, outcome="retried") == 1
+    assert registry.value("cbse_llm_attempts_total", **labels) == 3
+    assert registry.value("cbse_llm_completion_tokens_total", **labels) == 60
+    assert registry.value("cbse_llm_request_duration_seconds", **labels) == 1
+
+
+def test_registry_renders_prometheus_text(tmp_path):
+    registry = MetricsRegistry()
+    LLMService(ScriptedClient([OUTPUT]), SchemaValidator(), metrics=registry).generate(MESSAGES)
+    text = registry.render()
+
+    assert "# TYPE cbse_llm_request_duration_seconds histogram" in text
+    assert (
+        'cbse_llm_requests_total{provider="scripted",model="s-1",kind="turn",outcome="ok"} 1'
+        in text
+    )
+    assert (
+        'cbse_llm_request_duration_seconds_bucket{provider="scripted",model="s-1",kind="turn",'
+        'le="+Inf"} 1' in text
+    )
+    assert 'cbse_llm_prompt_tokens_total{provider="scripted",model="s-1",kind="turn"} 100' in text
+
+    path = tmp_path / "metrics" / "cbse.prom"
+    registry.write(path)
+    assert path.read_text(encoding="utf-8") == text
+
+    server = serve_metrics(registry, port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        assert httpx.get(f"{url}/metrics").text == text
+        assert httpx.get(f"{url}/other").status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,77 @@
+import json
+
+from cbse.engine.llm.base import LLMClient
+from cbse.engine.memory import MemorySummarizer, RollingMemory, build_turn_digest
+from cbse.engine.models import EndState, StateUpdateOp, TurnRecord
+from cbse.engine.save_system import SaveSystem
+from cbse.engine.state_store import StateStore
+from cbse.engine.utils import estimate_tokens
+
+
+def _turn(idx: int) -> TurnRecord:
+    narrative = f"第{idx}夜，雾从码头漫上来。你在钟楼街找到第{idx}条线索。" + "远处的汽笛声。" * 30
+    updates = [StateUpdateOp(op="inc", path="clues", value=1, reason="")]
+    return TurnRecord(
+        turn_index=idx,
+        player_input=f"行动{idx}",
+        narrative_markdown=narrative,
+        choices=[],
+        applied_updates=updates,
+        rejected_updates=[],
+        events=[],
+        end=EndState(is_game_over=False, ending_id="", reason=""),
+        digest=build_turn_digest(f"行动{idx}", narrative, updates),
+    )
+
+
+class SummaryClient(LLMClient):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def complete(self, messages: list[dict[str, str]]) -> str:
+        self.calls += 1
+        return json.dumps({"summary": f"summary {self.calls}"})
+
+
+def test_rolling_memory_stays_within_budget():
+    memory = RollingMemory(chapter_size=5, token_budget=300)
+    summarizer = MemorySummarizer()
+    history: list[TurnRecord] = []
+    for idx in range(1, 61):
+        history.append(_turn(idx))
+        summarizer.update(memory, history)
+        assert estimate_tokens(memory.render()) <= memory.token_budget + 10
+
+    assert memory.summarized_turns == 60
+    assert memory.session_summary
+    assert memory.chapters[-1].startswith("T56-60:")
+
+
+def test_llm_summarizer_runs_in_background():
+    memory = RollingMemory(chapter_size=2, token_budget=200)
+    client = SummaryClient()
+    summarizer = MemorySummarizer(client)
+    history = [_turn(1), _turn(2), _turn(3)]
+
+    summarizer.update(memory, history)
+    summarizer.wait(timeout=5)
+    summarizer.close()
+
+    assert client.calls == 1
+    assert memory.chapters == ["T1-2: summary 1"]
+    assert memory.scheduled_turns == 2
+
+
+def test_memory_persists_in_save(tmp_path):
+    store = StateStore(state={"clues": 0}, memory=RollingMemory(chapter_size=2))
+    store.history = [_turn(1), _turn(2)]
+    MemorySummarizer().update(store.memory, store.history)
+
+    system = SaveSystem(tmp_path)
+    system.save("slot", store, "mist_harbor", "1.0")
+    save = system.load("slot")
+
+    assert save.memory is not None
+    restored = RollingMemory.from_snapshot(save.memory, chapter_size=2)
+    assert restored.render() == store.memory_summary
+    assert restored.take_pending(save.history) == []
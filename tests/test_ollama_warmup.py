@@ -0,0 +1,62 @@
+import json
+
+from conftest import StubResponse
+
+from cbse.engine.llm import OllamaProvider
+from cbse.engine.llm.metrics import collect_calls
+
+
+def _provider(stub_server, **kwargs) -> OllamaProvider:
+    return OllamaProvider(
+        model="qwen3", temperature=0, max_output_tokens=10, base_url=stub_server.url, **kwargs
+    )
+
+
+def test_requests_carry_keep_alive(stub_server):
+    stub_server.route("/api/chat", lambda req: StubResponse(body={"message": {"content": "{}"}}))
+    client = _provider(stub_server, keep_alive="1h")
+    client.complete([{"role": "user", "content": "hi"}])
+    client.close()
+    assert stub_server.requests[0].body["keep_alive"] == "1h"
+
+
+def test_warm_up_loads_model_once(stub_server):
+    loaded: list[dict] = []
+    stub_server.route("/api/ps", lambda req: StubResponse(body={"models": loaded}))
+
+    def load(req):
+        loaded.append({"name": "qwen3:latest"})
+        return StubResponse(
+            body={"done": True, "done_reason": "load", "load_duration": 2_500_000_000}
+        )
+
+    stub_server.route("/api/chat", load)
+    client = _provider(stub_server, keep_alive="30m")
+    assert client.warm_up() == 2500.0
+    assert client.is_loaded() is True
+    assert client.warm_up() == 0.0
+    client.close()
+
+    loads = [req for req in stub_server.requests if req.path == "/api/chat"]
+    assert len(loads) == 1
+    assert loads[0].body == {"model": "qwen3", "messages": [], "keep_alive": "30m"}
+
+
+def test_timings_separate_load_from_generation(stub_server):
+    final = {
+        "done": True,
+        "load_duration": 3_000_000_000,
+        "prompt_eval_duration": 200_000_000,
+        "eval_duration": 1_000_000_000,
+        "prompt_eval_count": 120,
+        "eval_count": 40,
+    }
+    lines = [json.dumps({"message": {"content": "{}"}}) + "\n", json.dumps(final) + "\n"]
+    stub_server.route("/api/chat", lambda req: StubResponse(chunks=lines))
+    client = _provider(stub_server)
+    with collect_calls() as calls:
+        assert "".join(client.stream([{"role": "user", "content": "hi"}])) == "{}"
+    client.close()
+    [call] = calls
+    assert (call.load_ms, call.prompt_eval_ms, call.eval_ms) == (3000.0, 200.0, 1000.0)
+    assert (call.prompt_tokens, call.completion_tokens) == (120, 40)
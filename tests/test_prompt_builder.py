@@ -0,0 +1,154 @@
+from pathlib import Path
+
+from cbse.engine.content_loader import ContentLoader, index_variables
+from cbse.engine.fact_store import FactStore
+from cbse.engine.memory import build_turn_digest
+from cbse.engine.models import EndState, StateUpdateOp, TurnRecord
+from cbse.engine.prompt_builder import PromptBuilder, PromptContext
+from cbse.engine.state_store import DeltaInfo
+
+
+def _content():
+    base_dir = Path(__file__).resolve().parents[1]
+    return ContentLoader(base_dir / "games").load_game("mist_harbor")
+
+
+def _turn(idx: int, digest: str = "") -> TurnRecord:
+    return TurnRecord(
+        turn_index=idx,
+        player_input=f"input {idx}",
+        narrative_markdown=f"Long narrative for turn {idx}. " + "Fog rolls in. " * 20,
+        choices=[],
+        applied_updates=[StateUpdateOp(op="inc", path="clues", value=1, reason="")],
+        rejected_updates=[],
+        events=[],
+        end=EndState(is_game_over=False, ending_id="", reason=""),
+        digest=digest,
+    )
+
+
+def _user_prompt(builder: PromptBuilder, turns: list[TurnRecord]) -> str:
+    content = _content()
+    ctx = PromptContext(
+        game=content.definition,
+        world_markdown=content.world_markdown,
+        memory_summary="",
+        state=content.definition.initial_state,
+        recent_turns=turns,
+        player_input="look around",
+        last_choices=[],
+    )
+    return builder.build_messages(ctx)[2]["content"]
+
+
+def test_turn_digest_is_compact():
+    digest = build_turn_digest(
+        "去码头",
+        "雾很浓。你看到一艘船靠岸。" + "远处有人在喊。" * 40,
+        [
+            StateUpdateOp(op="inc", path="clues", value=1, reason=""),
+            StateUpdateOp(op="set", path="/location", value="码头", reason=""),
+        ],
+        ["船是空的"],
+    )
+    assert digest.startswith("Player: 去码头")
+    assert "clues+1" in digest
+    assert "location=码头" in digest
+    assert "Facts: 船是空的" in digest
+    assert len(digest) < 220
+
+
+def test_only_latest_turn_keeps_full_narrative():
+    content = _content()
+    builder = PromptBuilder(index_variables(content.definition.variables))
+    turns = [_turn(1, digest="cached digest one"), _turn(2), _turn(3)]
+    prompt = _user_prompt(builder, turns)
+
+    assert "Turn 1: cached digest one" in prompt
+    assert "Turn 2: Player: input 2" in prompt
+    assert turns[1].narrative_markdown not in prompt
+    assert turns[2].narrative_markdown in prompt
+
+
+def test_full_text_policy_is_configurable():
+    content = _content()
+    variables = index_variables(content.definition.variables)
+    turns = [_turn(i) for i in range(1, 7)]
+
+    full = _user_prompt(PromptBuilder(variables, full_text_turns=4), turns)
+    digested = _user_prompt(PromptBuilder(variables, full_text_turns=1), turns)
+
+    assert "input 1" not in full
+    assert all(turn.narrative_markdown in full for turn in turns[-4:])
+    assert len(digested) < len(full)
+
+
+def test_relevant_facts_enter_prompt():
+    content = _content()
+    builder = PromptBuilder(index_variables(content.definition.variables), fact_limit=2)
+    store = FactStore()
+    store.add("Lighthouse keeper received an anonymous letter.", turn_index=1)
+    store.add("The power plant fuse was swapped.", turn_index=2)
+    store.add("The editor burned the negatives.", turn_index=3)
+    ctx = PromptContext(
+        game=content.definition,
+        world_markdown=content.world_markdown,
+        memory_summary="",
+        state=content.definition.initial_state,
+        recent_turns=[],
+        player_input="ask the lighthouse keeper about the letter",
+        last_choices=[],
+        facts=store,
+    )
+    prompt = builder.build_messages(ctx)[2]["content"]
+
+    assert "Known facts:" in prompt
+    assert "- Lighthouse keeper received an anonymous letter." in prompt
+    assert prompt.count("\n- ") - prompt.split("Known facts:")[0].count("\n- ") == 2
+
+
+def test_state_prompt_size_is_bounded_as_lists_grow():
+    content = _content()
+    builder = PromptBuilder(index_variables(content.definition.variables))
+    state = dict(content.definition.initial_state)
+
+    state["truth_map"] = [f"fact {i}" for i in range(5)]
+    small = builder.encoder.encode(state)
+    state["truth_map"] = [f"fact {i}" for i in range(500)]
+    large = builder.encoder.encode(state)
+
+    assert "…495 earlier" in large
+    assert '"fact 499"' in large
+    assert abs(len(large) - len(small)) < 40
+
+
+def test_changed_variables_are_marked():
+    content = _content()
+    builder = PromptBuilder(index_variables(content.definition.variables))
+    state = content.definition.initial_state
+    deltas = {
+        "clues": DeltaInfo(changed=True, summary="+1", numeric_delta=1.0),
+        "location": DeltaInfo(changed=True, summary="码头 → 灯塔"),
+        "energy": DeltaInfo(changed=False),
+    }
+    encoded = builder.encoder.encode(state, deltas)
+
+    assert "- clues: 0 [Δ+1]" in encoded
+    assert '- location: "鸦巢酒吧" [Δ]' in encoded
+    assert "- energy: 70\n" in encoded
+
+
+def test_path_hint_refreshes_only_when_object_keys_change():
+    content = _content()
+    builder = PromptBuilder(index_variables(content.definition.variables))
+    state = {key: value for key, value in content.definition.initial_state.items()}
+    state["relationships"] = dict(state["relationships"])
+
+    first = builder.encoder.path_hint(state)
+    state["relationships"]["lian"] = 90
+    assert builder.encoder.path_hint(state) is first
+
+    state["relationships"] = {"ghost": 1}
+    refreshed = builder.encoder.path_hint(state)
+    assert refreshed is not first
+    assert "/relationships/ghost" in refreshed
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+from conftest import llm_output
+
+from cbse.engine.llm import (
+    CacheConfig,
+    CachingClient,
+    CassetteClient,
+    CircuitBreaker,
+    LLMClient,
+    LLMScheduler,
+    LLMUnavailable,
+    RecordingClient,
+    ResponseCache,
+    Route,
+    RouterClient,
+    ScheduledClient,
+)
+from cbse.engine.llm.cancel import check_cancelled
+from cbse.engine.llm_service import LLMService
+from cbse.engine.schema_validator import SchemaValidator
+
+OUTPUT = llm_output()
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class FakeClient(LLMClient):
+    def __init__(
+        self, output: str = OUTPUT, delay: float = 0.0, error: Exception | None = None
+    ) -> None:
+        self.output = output
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = threading.Event()
+
+    def complete(self, messages, cancel=None):
+        self.calls += 1
+        deadline = time.monotonic() + self.delay
+        while time.monotonic() < deadline:
+            if cancel is not None and cancel.cancelled:
+                self.cancelled.set()
+            check_cancelled(cancel)
+            time.sleep(0.005)
+        if self.error is not None:
+            raise self.error
+        return self.output
+
+
+def _route(client: LLMClient, label: str, **breaker) -> Route:
+    return Route(client=client, label=label, breaker=CircuitBreaker(**breaker))
+
+
+def test_router_fails_over_to_next_route():
+    broken = FakeClient(error=RuntimeError("connection refused"))
+    backup = FakeClient()
+    router = RouterClient([_route(broken, "small"), _route(backup, "large")])
+
+    assert router.complete(MESSAGES) == OUTPUT
+    assert "".join(router.stream(MESSAGES)) == OUTPUT
+    assert router.last_route == "large"
+    assert router.stats()["failovers"] == 2
+    assert router.stats()["served"] == {"large": 2}
+    router.close()
+
+
+def test_circuit_breaker_skips_route_until_probe():
+    now = [0.0]
+    broken = FakeClient(error=RuntimeError("down"))
+    backup = FakeClient()
+    router = RouterClient(
+        [
+            _route(broken, "small", failures=2, reset_after=10.0, clock=lambda: now[0]),
+            _route(backup, "large"),
+        ]
+    )
+    for _ in range(4):
+        router.complete(MESSAGES)
+    assert broken.calls == 2
+    assert router.stats()["open"] == ["small"]
+
+    now[0] = 11.0
+    broken.error = None
+    router.complete(MESSAGES)
+    assert broken.calls == 3
+    assert router.routes[0].breaker.state == "closed"
+    router.close()
+
+
+def test_slow_route_is_hedged_and_cancelled():
+    slow = FakeClient(delay=2.0)
+    fast = FakeClient(delay=0.01)
+    route = _route(slow, "small")
+    for _ in range(5):
+        route.record_latency(False, 0.05)
+    router = RouterClient([route, _route(fast, "large")])
+
+    started = time.monotonic()
+    assert router.complete(MESSAGES) == OUTPUT
+    assert time.monotonic() - started < 1.0
+    assert router.stats()["hedges"] == 1
+    assert router.last_route == "large"
+    assert slow.cancelled.wait(1.0)
+    router.close()
+
+
+def test_slo_bounds_latency_and_skips_repair():
+    slow = FakeClient(delay=2.0)
+    router = RouterClient([_route(slow, "small")], slo_ms=200)
+    with pytest.raises(LLMUnavailable):
+        router.complete(MESSAGES)
+
+    service = LLMService(client=router, validator=SchemaValidator())
+    started = time.monotonic()
+    result = service.generate(MESSAGES)
+    assert time.monotonic() - started < 1.0
+    assert result.used_fallback is True
+    assert result.attempts == 1
+    router.close()
+
+
+def test_invalid_output_escalates_to_next_tier():
+    small = FakeClient(output="I cannot produce JSON today.")
+    large = FakeClient()
+    router = RouterClient([_route(small, "small"), _route(large, "large")])
+    service = LLMService(client=router, validator=SchemaValidator())
+
+    result = service.generate(MESSAGES)
+    assert result.used_fallback is False
+    assert result.escalated is True
+    assert result.attempts == 2
+    assert router.stats()["escalations"] == 1
+    assert large.calls == 1
+    router.close()
+
+
+def test_escalation_is_recorded_replayed_and_cached(tmp_path):
+    path = tmp_path / "run.cassette.jsonl"
+    small = FakeClient(output="I cannot produce JSON today.")
+    router = RouterClient([_route(small, "small"), _route(FakeClient(), "large")])
+    recorded = LLMService(RecordingClient(router, path), SchemaValidator()).generate(MESSAGES)
+    router.close()
+    assert recorded.escalated and not recorded.used_fallback
+
+    player = CassetteClient(path, "strict")
+    assert [entry.escalated for entry in player.entries] == [False, True]
+    played = LLMService(player, SchemaValidator()).generate(MESSAGES)
+    assert played.escalated and played.raw == recorded.raw
+    assert player.remaining == 0
+
+    small = FakeClient(output="I cannot produce JSON today.")
+    large = FakeClient()
+    router = RouterClient([_route(small, "small"), _route(large, "large")])
+    cached = CachingClient(router, ResponseCache(CacheConfig(directory=tmp_path / "cache")))
+    service = LLMService(cached, SchemaValidator())
+    for _ in range(2):
+        assert service.generate(MESSAGES).output.narrative_markdown == "雾港的夜很长。"
+    assert (small.calls, large.calls) == (1, 1)
+    router.close()
+
+
+def test_scheduled_routes_at_temperature_bypass_the_cache(tmp_path):
+    sampled = FakeClient()
+    sampled.temperature = 0.8
+    scheduler = LLMScheduler({})
+    router = RouterClient(
+        [
+            _route(ScheduledClient(FakeClient(), scheduler), "small"),
+            _route(ScheduledClient(sampled, scheduler), "large"),
+        ]
+    )
+    cached = CachingClient(router, ResponseCache(CacheConfig(directory=tmp_path / "cache")))
+    assert router.temperature == 0.8
+    assert not cached.cacheable
+    for _ in range(2):
+        cached.complete(MESSAGES)
+    assert cached.bypassed == 2
+    router.close()
@@ -1,5 +1,17 @@
+import ast
+import operator
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from cbse.engine.content_loader import ContentLoader
+from cbse.engine.llm import SyntheticProvider
 from cbse.engine.models import StateUpdateOp, Trigger, VariableDefinition
-from cbse.engine.rules_engine import RulesEngine
+from cbse.engine.rules_engine import RulesEngine, _safe_eval
+from cbse.engine.session import GameSession
+from cbse.engine.utils import clone_state
 
 
 def test_time_carry_and_clamp():
@@ -57,3 +69,82 @@ def test_trigger_once():
 
     result = engine.apply(state, updates=[], triggered=result.triggered_triggers)
     assert result.state["flags"]["hit"] is True
+
+
+def _reference_eval(node: ast.AST, state: dict[str, Any]) -> Any:
+    # The tree-walking evaluator the compiled conditions replaced.
+    if isinstance(node, ast.BoolOp):
+        if isinstance(node.op, ast.And):
+            return all(_reference_eval(v, state) for v in node.values)
+        return any(_reference_eval(v, state) for v in node.values)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return not _reference_eval(node.operand, state)
+    if isinstance(node, ast.Compare):
+        left = _reference_eval(node.left, state)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _reference_eval(comparator, state)
+            compare = {
+                ast.Eq: operator.eq,
+                ast.NotEq: operator.ne,
+                ast.Lt: operator.lt,
+                ast.LtE: operator.le,
+                ast.Gt: operator.gt,
+                ast.GtE: operator.ge,
+            }.get(type(op))
+            if compare is not None and not compare(left, right):
+                return False
+            left = right
+        return True
+    if isinstance(node, ast.Name):
+        if node.id in ("True", "true"):
+            return True
+        if node.id in ("False", "false"):
+            return False
+        if node.id in state:
+            return state[node.id]
+        raise ValueError(node.id)
+    if isinstance(node, ast.Attribute):
+        base = _reference_eval(node.value, state)
+        if isinstance(base, dict) and node.attr in base:
+            return base[node.attr]
+        raise ValueError(node.attr)
+    if isinstance(node, ast.Constant):
+        return node.value
+    raise ValueError("Unsupported expression")
+
+
+def _outcome(evaluate: Callable[..., Any], *args: Any) -> Any:
+    try:
+        return evaluate(*args)
+    except (ValueError, TypeError) as exc:
+        return type(exc)
+
+
+@pytest.mark.parametrize("game_id", ["cdi_game", "cdi_game_v2", "mist_harbor", "polish_solider"])
+def test_compiled_conditions_match_the_tree_walker(game_id):
+    base_dir = Path(__file__).resolve().parents[1]
+    content = ContentLoader(base_dir / "games").load_game(game_id)
+    definition = content.definition
+    expressions = [trigger.when for trigger in content.triggers]
+    expressions += definition.win_conditions + definition.lose_conditions
+    expressions += [
+        "missing == 1",
+        "1 < 2 < 3 and not 3 <= 2",
+        "1 in 2 or false",
+        "true and 1 + 1",
+        "0 or 0 or 5 > 4",
+    ]
+    # States along a played game reach both sides of most comparisons.
+    session = GameSession(content, SyntheticProvider(definition, content.triggers, seed=4))
+    session.start()
+    states = [clone_state(session.store.state)]
+    for _ in range(40):
+        if session.step("1").end.is_game_over:
+            session.start()
+        states.append(clone_state(session.store.state))
+
+    for expr in expressions:
+        tree = ast.parse(expr.replace(" true", " True").replace(" false", " False"), mode="eval")
+        for state in states:
+            expected = _outcome(_reference_eval, tree.body, state)
+            assert _outcome(_safe_eval, expr, state) == expected, (expr, state)
@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from cbse.engine.runner import main
+
+ROOT = Path(__file__).resolve().parents[1]
+DEMO = str(ROOT / "replays" / "mist_harbor_demo.jsonl")
+
+
+def test_run_streams_turns_and_writes_summary(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("CBSE_LLM_PROVIDER", "mock")
+    monkeypatch.setenv("CBSE_LLM_CACHE", "0")
+    out = tmp_path / "turns.jsonl"
+    summary = tmp_path / "summary.json"
+    assert main([DEMO, DEMO, "--out", str(out), "--summary", str(summary)]) == 0
+
+    lines = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == 10
+    assert [line["turn_index"] for line in lines[:5]] == [1, 2, 3, 4, 5]
+    assert lines[5]["turn_index"] == 1
+    assert {"step_ms", "used_fallback", "applied_updates", "end"} <= set(lines[0])
+
+    data = json.loads(summary.read_text(encoding="utf-8"))
+    assert [run["turns"] for run in data["runs"]] == [5, 5]
+    total = data["total"]
+    assert total["turns"] == 10 and total["turns_per_s"] > 0
+    assert total["p95_ms"] >= total["p50_ms"] > 0
+    assert total["fallback_rate"] == 0.0
+    assert "total" in capsys.readouterr().out
+
+
+def test_run_synthetic_reaches_endings(tmp_path, monkeypatch, capsys):
+    # --provider wins over the environment and does not change it.
+    monkeypatch.setenv("CBSE_LLM_PROVIDER", "mock")
+    monkeypatch.setenv("CBSE_SYNTHETIC_ENDING", "win")
+    monkeypatch.setenv("CBSE_SYNTHETIC_BIAS", "1.0")
+    monkeypatch.setenv("CBSE_LLM_CACHE", "0")
+    replay = tmp_path / "inputs.txt"
+    replay.write_text("\n".join(["1"] * 200), encoding="utf-8")
+    summary = tmp_path / "summary.json"
+    args = [str(replay), "--provider", "synthetic", "--summary", str(summary)]
+    assert main(args) == 0
+
+    captured = capsys.readouterr()
+    lines = [json.loads(line) for line in captured.out.splitlines()]
+    assert lines[-1]["end"]["is_game_over"]
+    assert "turns/s" in captured.err
+    total = json.loads(summary.read_text(encoding="utf-8"))["total"]
+    assert total["endings"] and total["turns"] == len(lines) < 200
+    assert os.environ["CBSE_LLM_PROVIDER"] == "mock"
+
+
+def test_run_fails_on_cassette_mismatch_and_fallbacks(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("CBSE_LLM_PROVIDER", "mock")
+    monkeypatch.setenv("CBSE_LLM_CACHE", "0")
+    cassette = str(tmp_path / "demo.cassette.jsonl")
+    out = str(tmp_path / "turns.jsonl")
+    record = [DEMO, "--out", out, "--cassette", cassette, "--cassette-mode", "record"]
+    assert main(record) == 0
+    assert main([DEMO, "--out", out, "--cassette", cassette]) == 0
+
+    other = tmp_path / "other.txt"
+    other.write_text("去码头\n", encoding="utf-8")
+    summary = tmp_path / "summary.json"
+    args = [str(other), "--out", out, "--cassette", cassette, "--summary", str(summary)]
+    assert main(args) == 1
+    assert "Cassette mismatch" in capsys.readouterr().err
+    assert "Cassette mismatch" in json.loads(summary.read_text(encoding="utf-8"))["error"]
+
+    monkeypatch.setenv("CBSE_LLM_FAULTS", "error_rate=1")
+    assert main([DEMO, "--out", out]) == 0
+    assert main([DEMO, "--out", out, "--max-fallback-rate", "0.5"]) == 1
+    assert "fallback rate 100.0%" in capsys.readouterr().err
+
+
+def test_run_does_not_import_textual(tmp_path):
+    code = (
+        "import sys; from cbse.engine.runner import main; "
+        f"main([{DEMO!r}, '--provider', 'mock', '--out', {str(tmp_path / 'o.jsonl')!r}]); "
+        "print('textual' in sys.modules)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    assert output.stdout.strip().splitlines()[-1] == "False"
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+from cbse.engine.llm import (
+    BACKGROUND,
+    INTERACTIVE,
+    REPAIR,
+    CancelToken,
+    LLMCancelled,
+    LLMClient,
+    LLMScheduler,
+    ProviderLimits,
+    ScheduledClient,
+    llm_priority,
+)
+from cbse.engine.llm.cancel import check_cancelled
+from cbse.engine.llm.scheduler import current_priority
+
+KEY = ("ollama", "http://localhost:11434")
+
+
+class BlockingClient(LLMClient):
+    name = "ollama"
+    base_url = "http://localhost:11434"
+
+    def __init__(self) -> None:
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.order: list[str] = []
+
+    def complete(self, messages, cancel=None):
+        self.started.set()
+        self.order.append(messages[0]["content"])
+        while not self.release.wait(0.01):
+            check_cancelled(cancel)
+        return "ok"
+
+
+def _call(client: LLMClient, text: str, priority: int, results: dict) -> threading.Thread:
+    def run() -> None:
+        with llm_priority(priority):
+            try:
+                results[text] = client.complete([{"role": "user", "content": text}])
+            except LLMCancelled:
+                results[text] = "cancelled"
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def _wait_for(predicate, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_waiting_requests_run_by_priority():
+    scheduler = LLMScheduler({"ollama": ProviderLimits(concurrency=1)})
+    inner = BlockingClient()
+    client = ScheduledClient(inner, scheduler)
+    results: dict[str, str] = {}
+
+    threads = [_call(client, "first", REPAIR, results)]
+    assert inner.started.wait(1.0)
+    threads.append(_call(client, "background", BACKGROUND, results))
+    _wait_for(lambda: scheduler.stats()["waiting"] == 1)
+    threads.append(_call(client, "turn", INTERACTIVE, results))
+    _wait_for(lambda: scheduler.stats()["waiting"] == 2)
+    inner.release.set()
+    for thread in threads:
+        thread.join(2.0)
+
+    assert inner.order == ["first", "turn", "background"]
+    stats = scheduler.stats()
+    assert stats["completed"] == {"repair": 1, "interactive": 1, "background": 1}
+    assert stats["queue_ms"]["background"]["count"] == 1
+    assert stats["running"] == 0 and stats["waiting"] == 0
+
+
+def test_interactive_request_preempts_background_work():
+    scheduler = LLMScheduler({"ollama": ProviderLimits(concurrency=1)})
+    inner = BlockingClient()
+    client = ScheduledClient(inner, scheduler)
+    results: dict[str, str] = {}
+
+    background = _call(client, "speculation", BACKGROUND, results)
+    assert inner.started.wait(1.0)
+    started = time.monotonic()
+    with llm_priority(INTERACTIVE):
+        ticket = scheduler.acquire(KEY, INTERACTIVE, cost=10)
+    assert time.monotonic() - started < 1.0
+    scheduler.release(KEY, ticket)
+    background.join(2.0)
+
+    assert results["speculation"] == "cancelled"
+    assert scheduler.stats()["preempted"] == 1
+
+
+def test_token_rate_limit_delays_requests():
+    # 6000 tokens per minute refills 100 tokens per second.
+    scheduler = LLMScheduler({"openai": ProviderLimits(tokens_per_minute=6000)})
+    key = ("openai", None)
+    scheduler.release(key, scheduler.acquire(key, INTERACTIVE, cost=6000))
+    started = time.monotonic()
+    scheduler.release(key, scheduler.acquire(key, INTERACTIVE, cost=20))
+    assert time.monotonic() - started >= 0.15
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = LLMScheduler({"ollama": ProviderLimits(concurrency=1)})
+    held = scheduler.acquire(KEY, INTERACTIVE, cost=1)
+    cancel = CancelToken()
+    threading.Timer(0.1, cancel.cancel).start()
+    with pytest.raises(LLMCancelled):
+        scheduler.acquire(KEY, INTERACTIVE, cost=1, cancel=cancel)
+    assert scheduler.stats()["waiting"] == 0
+    scheduler.release(KEY, held)
+    scheduler.release(KEY, scheduler.acquire(KEY, BACKGROUND, cost=1))
+
+
+def test_priority_context_only_lowers_urgency():
+    with llm_priority(BACKGROUND), llm_priority(REPAIR):
+        assert current_priority() == BACKGROUND
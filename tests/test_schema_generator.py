@@ -0,0 +1,143 @@
+from conftest import StubResponse
+
+from cbse.engine.llm import OllamaProvider
+from cbse.engine.models import VariableDefinition, VariableRules
+from cbse.engine.schema_generator import OutputSchemaGenerator
+
+
+def _variables() -> dict[str, VariableDefinition]:
+    return {
+        "energy": VariableDefinition(id="energy", label="Energy", type="integer", default=5),
+        "gold": VariableDefinition(
+            id="gold",
+            label="Gold",
+            type="integer",
+            default=0,
+            rules=VariableRules(update_policy="inc_dec_only"),
+        ),
+        "mood": VariableDefinition(
+            id="mood", label="Mood", type="enum", enum_values=["calm", "angry"], default="calm"
+        ),
+        "inventory": VariableDefinition(id="inventory", label="Inventory", type="list", default=[]),
+        "seed": VariableDefinition(
+            id="seed", label="Seed", type="integer", default=1, rules=VariableRules(readonly=True)
+        ),
+        "flags": VariableDefinition(
+            id="flags", label="Flags", type="object", default={"met": False}
+        ),
+    }
+
+
+def _items(schema: dict) -> list[dict]:
+    return schema["properties"]["state_updates"]["items"]["anyOf"]
+
+
+def _ops_for(schema: dict, path: str) -> set[str]:
+    ops: set[str] = set()
+    for item in _items(schema):
+        if path in item["properties"]["path"]["enum"]:
+            ops.update(item["properties"]["op"]["enum"])
+    return ops
+
+
+def test_schema_lists_only_writable_paths():
+    state = {
+        "energy": 5,
+        "gold": 0,
+        "mood": "calm",
+        "inventory": [],
+        "seed": 1,
+        "flags": {"met": False},
+    }
+    generator = OutputSchemaGenerator(_variables())
+    schema = generator.schema(state)
+
+    paths = {path for item in _items(schema) for path in item["properties"]["path"]["enum"]}
+    assert paths == {"/energy", "/gold", "/mood", "/inventory", "/flags/met"}
+    assert set(generator.writable_paths(state)) == paths
+    assert schema["required"] == [
+        "narrative_markdown",
+        "choices",
+        "state_updates",
+        "new_facts",
+        "events",
+        "end",
+    ]
+
+
+def test_schema_respects_update_policy_and_types():
+    state = {
+        "energy": 5,
+        "gold": 0,
+        "mood": "calm",
+        "inventory": [],
+        "seed": 1,
+        "flags": {"met": False},
+    }
+    schema = OutputSchemaGenerator(_variables()).schema(state)
+
+    assert _ops_for(schema, "/energy") == {"set", "inc", "dec"}
+    assert _ops_for(schema, "/gold") == {"inc", "dec"}
+    assert _ops_for(schema, "/inventory") == {"set", "push", "remove"}
+    assert _ops_for(schema, "/flags/met") == {"set", "toggle"}
+    mood = next(item for item in _items(schema) if "/mood" in item["properties"]["path"]["enum"])
+    assert mood["properties"]["value"] == {"type": "string", "enum": ["calm", "angry"]}
+    # Paths with the same ops and value type share one variant.
+    energy = next(
+        item for item in _items(schema) if "/energy" in item["properties"]["path"]["enum"]
+    )
+    assert "/gold" not in energy["properties"]["path"]["enum"]
+
+
+def test_schema_is_rebuilt_when_object_keys_change():
+    generator = OutputSchemaGenerator(_variables())
+    state = {
+        "energy": 5,
+        "gold": 0,
+        "mood": "calm",
+        "inventory": [],
+        "seed": 1,
+        "flags": {"met": False},
+    }
+    first = generator.schema(state)
+    state["energy"] = 9
+    assert generator.schema(state) is first
+
+    state["flags"]["door_open"] = True
+    second = generator.schema(state)
+    assert second is not first
+    assert "/flags/door_open" in generator.writable_paths(state)
+
+
+def test_schema_without_writable_paths_forbids_updates():
+    variables = {
+        "seed": VariableDefinition(
+            id="seed", label="Seed", type="integer", rules=VariableRules(readonly=True)
+        )
+    }
+    schema = OutputSchemaGenerator(variables).schema({"seed": 1})
+    assert schema["properties"]["state_updates"]["maxItems"] == 0
+
+
+def test_ollama_sends_generated_schema(stub_server):
+    stub_server.route("/api/chat", lambda req: StubResponse(body={"message": {"content": "{}"}}))
+    state = {
+        "energy": 5,
+        "gold": 0,
+        "mood": "calm",
+        "inventory": [],
+        "seed": 1,
+        "flags": {"met": False},
+    }
+    schema = OutputSchemaGenerator(_variables()).schema(state)
+    client = OllamaProvider(
+        model="m",
+        temperature=0,
+        max_output_tokens=10,
+        base_url=stub_server.url,
+        json_schema=schema,
+        format_mode="json_schema",
+    )
+    client.complete([{"role": "user", "content": "hi"}])
+    client.close()
+    assert stub_server.requests[0].body["format"] == schema
@@ -1,4 +1,4 @@
-from cbse.engine.schema_validator import SchemaValidator
+from cbse.engine.schema_validator import SchemaValidator, extract_json
 
 
 def test_coerce_minimal_invalid_ollama_json():
@@ -9,3 +9,38 @@ def test_coerce_minimal_invalid_ollama_json():
     assert 3 <= len(output.choices) <= 6
     assert output.state_updates == []
     assert output.end.is_game_over is False
+
+
+VALID = (
+    '{"narrative_markdown": "门外有人说 {暗号}。", "choices": ['
+    '{"id": "a", "label": "开门", "hint": "", "risk": "low", "tags": []},'
+    '{"id": "b", "label": "等待", "hint": "", "risk": "low", "tags": []},'
+    '{"id": "c", "label": "回应", "hint": "", "risk": "low", "tags": []}],'
+    ' "state_updates": [], "new_facts": [], "events": [],'
+    ' "end": {"is_game_over": false, "ending_id": "", "reason": ""}}'
+)
+
+
+def test_parse_ignores_trailing_prose_with_braces():
+    validator = SchemaValidator()
+    output = validator.parse(f"```json\n{VALID}\n```\nNote: paths look like {{time.minute}}.")
+    assert output.narrative_markdown == "门外有人说 {暗号}。"
+    assert extract_json(f"Sure: {VALID} -- {{done}}") == VALID
+
+
+def test_decode_keeps_no_state_between_calls():
+    # One validator serves the turn, speculation and router threads.
+    validator = SchemaValidator()
+    raw = '{"narrative": "夜。", "choices": ["a", "b", "c"], "end": false}'
+    decoded = validator.decode(raw)
+    assert decoded.output is None
+    output = validator.coerce(raw)
+    assert validator.decode(raw) is not decoded
+    assert output.narrative_markdown == "夜。"
+    assert validator.parse(VALID) is not validator.parse(VALID)
+
+
+def test_coerce_reads_string_false_as_false():
+    validator = SchemaValidator()
+    output = validator.coerce('{"choices": ["a"], "end": {"is_game_over": "false"}}')
+    assert output.end.is_game_over is False
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from cbse.engine.content_loader import ContentLoader
+from cbse.engine.llm import LLMClient, MockProvider, RecordingClient, SyntheticProvider
+from cbse.engine.session import GameSession
+
+
+def _content(game_id: str = "mist_harbor"):
+    base_dir = Path(__file__).resolve().parents[1]
+    return ContentLoader(base_dir / "games").load_game(game_id)
+
+
+def _session(tmp_path, client: LLMClient | None = None, game_id: str = "mist_harbor"):
+    content = _content(game_id)
+    ids = {var.id for var in content.definition.variables}
+    session = GameSession(
+        content,
+        client or MockProvider(ids, ["码头", "酒吧"]),
+        log_dir=tmp_path / "logs",
+        save_dir=tmp_path / "saves",
+    )
+    session.start()
+    return session
+
+
+def test_step_plays_turns_and_logs(tmp_path):
+    session = _session(tmp_path)
+    first = session.step("开始")
+    picked = session.store.last_choices[1].label
+    second = session.step("2")
+
+    assert [turn.player_input for turn in session.store.history] == ["开始", picked]
+    assert second.turn.turn_index == 2 and second.latency_ms >= 0
+    assert first.turn.applied_updates
+    assert session.store.state["time"] != session.content.definition.initial_state["time"]
+    logs = (tmp_path / "logs" / "turns.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["player_input"] for line in logs] == ["开始", picked]
+
+    session.start()
+    assert session.store.history == []
+    session.close()
+
+
+def test_save_and_load_round_trip(tmp_path):
+    session = _session(tmp_path)
+    for text in ("开始", "1", "2"):
+        session.step(text)
+    session.save("slot")
+    state = json.loads(json.dumps(session.store.state))
+    history = len(session.store.history)
+
+    session.step("3")
+    session.load("slot")
+    assert session.store.state == state
+    assert len(session.store.history) == history
+
+    other = _session(tmp_path, game_id="cdi_game")
+    with pytest.raises(ValueError):
+        other.load("slot")
+    with pytest.raises(FileNotFoundError):
+        session.load("missing")
+
+
+class BlockingClient(LLMClient):
+    def complete(self, messages, cancel=None):
+        while not cancel.cancelled:
+            time.sleep(0.01)
+        cancel.raise_if_cancelled()
+
+
+def test_async_step_and_cancellation(tmp_path):
+    session = _session(tmp_path)
+
+    async def scenario() -> None:
+        turn = await session.astep("开始")
+        assert turn.turn.turn_index == 1
+
+        state = json.loads(json.dumps(session.store.state))
+        mock = session.llm_service.client
+        session.llm_service.client = BlockingClient()
+        task = asyncio.create_task(session.astep("1"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert len(session.store.history) == 1
+        assert session.store.state == state
+
+        session.llm_service.client = mock
+        assert (await session.astep("1")).turn.turn_index == 2
+
+    asyncio.run(scenario())
+
+
+def test_synthetic_provider_follows_the_live_state(tmp_path):
+    content = _content("cdi_game")
+    provider = SyntheticProvider(content.definition, content.triggers, seed=2)
+    session = GameSession(content, provider, save_dir=tmp_path)
+    session.start()
+    for _ in range(60):
+        if session.step("1").end.is_game_over:
+            session.start()
+    rejected = sum(len(turn.rejected_updates) for turn in session.store.history)
+    assert rejected == 0
+    assert provider.stats() == {}
+
+
+def test_session_does_not_import_textual():
+    code = "import sys, cbse.engine.session; print('textual' in sys.modules)"
+    root = Path(__file__).resolve().parents[1]
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True
+    )
+    assert output.stdout.strip() == "False"
+
+
+def test_cassette_turns_off_background_llm_calls(tmp_path, monkeypatch):
+    monkeypatch.setenv("CBSE_MEMORY_LLM", "1")
+    monkeypatch.setenv("CBSE_SPECULATE", "1")
+    content = _content()
+    ids = {var.id for var in content.definition.variables}
+    live = GameSession(content, MockProvider(ids, []), save_dir=tmp_path)
+    assert live.speculator is not None and live.memory_summarizer.client is not None
+    live.close()
+
+    client = RecordingClient(MockProvider(ids, []), tmp_path / "run.cassette.jsonl")
+    recorded = GameSession(content, client, save_dir=tmp_path)
+    assert recorded.speculator is None
+    assert recorded.memory_summarizer.client is None
+    recorded.close()
+
+
+class SlowMock(MockProvider):
+    def complete(self, messages, cancel=None):
+        time.sleep(0.2)
+        return super().complete(messages, cancel)
+
+
+def test_speculation_hit_reports_the_wait_not_the_generation(tmp_path):
+    content = _content()
+    ids = {var.id for var in content.definition.variables}
+    session = GameSession(content, SlowMock(ids, []), save_dir=tmp_path, speculate=True)
+    session.start()
+    first = session.step("开始")
+    assert not first.speculative and first.latency_ms >= 200
+    for speculation in list(session.speculator._pending.values()):
+        speculation.future.result(timeout=5)
+
+    second = session.step("1")
+    assert second.speculative
+    assert second.generation_ms >= 200
+    assert second.latency_ms < 100
+    session.close()
@@ -0,0 +1,84 @@
+import threading
+
+from conftest import llm_output
+
+from cbse.engine.llm import LLMClient, MetricsRegistry
+from cbse.engine.llm_service import LLMService
+from cbse.engine.schema_validator import SchemaValidator
+from cbse.engine.speculation import SpeculativeGenerator, message_key
+
+
+class EchoClient(LLMClient):
+    def __init__(self, gate: threading.Event | None = None) -> None:
+        self.calls: list[str] = []
+        self.gate = gate
+
+    def complete(self, messages, cancel=None):
+        text = messages[-1]["content"]
+        self.calls.append(text)
+        while self.gate is not None and not self.gate.wait(0.01):
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+        return llm_output(f"after {text}")
+
+
+def _messages(player_input: str) -> list[dict[str, str]]:
+    return [{"role": "system", "content": "rules"}, {"role": "user", "content": player_input}]
+
+
+def test_matching_prompt_uses_precomputed_result():
+    client = EchoClient()
+    speculator = SpeculativeGenerator(LLMService(client=client, validator=SchemaValidator()))
+    scheduled = speculator.schedule([(label, _messages(label)) for label in ("go", "hide", "talk")])
+    assert scheduled == 3
+
+    speculation = speculator.take(_messages("hide"))
+    result, latency_ms = speculation.future.result(timeout=5)
+    speculator.close()
+
+    assert result.output.narrative_markdown == "after hide"
+    assert latency_ms >= 0
+    assert speculator.hits == 1
+    assert speculation.key == message_key(_messages("hide"))
+
+
+def test_miss_cancels_outstanding_speculation():
+    gate = threading.Event()
+    client = EchoClient(gate)
+    speculator = SpeculativeGenerator(LLMService(client=client, validator=SchemaValidator()))
+    speculator.schedule([(label, _messages(label)) for label in ("go", "hide")])
+
+    assert speculator.take(_messages("something else")) is None
+    assert speculator.misses == 1
+    speculator.close()
+    # The running guess saw its token and gave up; the queued one never ran.
+    assert client.calls in ([], ["go"])
+
+
+def test_token_budget_limits_speculation():
+    client = EchoClient()
+    speculator = SpeculativeGenerator(
+        LLMService(client=client, validator=SchemaValidator()),
+        max_choices=4,
+        token_budget=250,
+        output_tokens=100,
+    )
+    assert speculator.schedule([(label, _messages(label)) for label in ("a", "b", "c", "d")]) == 2
+    speculator.close()
+
+
+def test_speculative_generations_are_labelled_in_metrics():
+    registry = MetricsRegistry()
+    service = LLMService(client=EchoClient(), validator=SchemaValidator(), metrics=registry)
+    speculator = SpeculativeGenerator(service)
+    speculator.schedule([("go", _messages("go"))])
+    result, _ = speculator.take(_messages("go")).future.result(timeout=5)
+    speculator.close()
+    service.generate(_messages("hide"))
+
+    labels = {"provider": "llm", "model": ""}
+    assert result.metrics.kind == "speculative"
+    assert (
+        registry.value("cbse_llm_requests_total", **labels, kind="speculative", outcome="ok") == 1
+    )
+    assert registry.value("cbse_llm_requests_total", **labels, kind="turn", outcome="ok") == 1
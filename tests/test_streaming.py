@@ -0,0 +1,154 @@
+import json
+import time
+
+import pytest
+from conftest import StubResponse, llm_output
+
+from cbse.engine.json_stream import StringFieldScanner
+from cbse.engine.llm import (
+    CancelToken,
+    GeminiProvider,
+    LLMCancelled,
+    OllamaProvider,
+    OpenAIProvider,
+)
+from cbse.engine.llm_service import LLMService
+from cbse.engine.schema_validator import SchemaValidator
+
+OUTPUT = llm_output('雾港的夜很长。\n你听见 "钟声" 😀 在远处。')
+NARRATIVE = json.loads(OUTPUT)["narrative_markdown"]
+
+
+def _pieces(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_scanner_handles_any_chunking():
+    for size in (1, 2, 3, 7, 64):
+        scanner = StringFieldScanner()
+        seen = []
+        for piece in _pieces(OUTPUT, size):
+            update = scanner.feed(piece)
+            if update is not None:
+                seen.append(update)
+        assert scanner.done
+        assert seen[-1] == NARRATIVE
+        assert all(NARRATIVE.startswith(partial) for partial in seen)
+
+
+def test_scanner_decodes_escaped_unicode():
+    scanner = StringFieldScanner()
+    text = '{"narrative_markdown": "\\u96fe\\ud83d\\ude00\\n", "choices": []}'
+    for piece in _pieces(text, 3):
+        scanner.feed(piece)
+    assert scanner.value == "雾😀\n"
+
+
+def _ollama_lines() -> list[str]:
+    lines = [
+        json.dumps({"message": {"content": piece}, "done": False}) + "\n"
+        for piece in _pieces(OUTPUT, 9)
+    ]
+    return lines + [json.dumps({"message": {"content": ""}, "done": True}) + "\n"]
+
+
+def _sse(events: list[dict]) -> list[str]:
+    return [f"data: {json.dumps(event)}\n\n" for event in events]
+
+
+def test_providers_stream_chunks(stub_server):
+    stub_server.route("/api/chat", lambda req: StubResponse(chunks=_ollama_lines()))
+    stub_server.route(
+        "/v1/chat/completions",
+        lambda req: StubResponse(
+            chunks=_sse([{"choices": [{"delta": {"content": p}}]} for p in _pieces(OUTPUT, 9)])
+            + ["data: [DONE]\n\n"],
+            content_type="text/event-stream",
+        ),
+    )
+    stub_server.route(
+        "/v1beta/models/",
+        lambda req: StubResponse(
+            chunks=_sse(
+                [
+                    {"candidates": [{"content": {"parts": [{"text": p}]}}]}
+                    for p in _pieces(OUTPUT, 9)
+                ]
+            ),
+            content_type="text/event-stream",
+        ),
+    )
+    messages = [{"role": "user", "content": "hi"}]
+    providers = [
+        OllamaProvider(model="m", temperature=0, max_output_tokens=10, base_url=stub_server.url),
+        OpenAIProvider(
+            model="m",
+            temperature=0,
+            max_output_tokens=10,
+            api_key="k",
+            base_url=f"{stub_server.url}/v1",
+        ),
+        GeminiProvider(
+            model="m",
+            temperature=0,
+            max_output_tokens=10,
+            api_key="k",
+            base_url=f"{stub_server.url}/v1beta",
+        ),
+    ]
+    for provider in providers:
+        chunks = list(provider.stream(messages))
+        assert len(chunks) > 1
+        assert "".join(chunks) == OUTPUT
+        provider.close()
+
+    assert stub_server.requests[0].body["stream"] is True
+    assert stub_server.requests[1].body["stream"] is True
+    assert stub_server.requests[2].path.endswith(":streamGenerateContent")
+    assert stub_server.requests[2].query["alt"] == ["sse"]
+
+
+def test_generate_reports_partial_narrative(stub_server):
+    stub_server.route("/api/chat", lambda req: StubResponse(chunks=_ollama_lines()))
+    client = OllamaProvider(
+        model="m", temperature=0, max_output_tokens=10, base_url=stub_server.url
+    )
+    service = LLMService(client=client, validator=SchemaValidator())
+    partials: list[str] = []
+
+    result = service.generate([{"role": "user", "content": "hi"}], on_narrative=partials.append)
+    client.close()
+
+    assert not result.used_fallback
+    assert result.raw == OUTPUT
+    assert len(partials) > 2
+    assert partials[-1] == NARRATIVE
+
+
+def test_cancel_stops_stream_mid_generation(stub_server):
+    stub_server.route(
+        "/api/chat", lambda req: StubResponse(chunks=_ollama_lines(), chunk_delay=0.05)
+    )
+    client = OllamaProvider(
+        model="m", temperature=0, max_output_tokens=10, base_url=stub_server.url
+    )
+    service = LLMService(client=client, validator=SchemaValidator())
+    cancel = CancelToken()
+    partials: list[str] = []
+
+    def on_narrative(text: str) -> None:
+        partials.append(text)
+        cancel.cancel()
+
+    started = time.perf_counter()
+    with pytest.raises(LLMCancelled):
+        service.generate(
+            [{"role": "user", "content": "hi"}], on_narrative=on_narrative, cancel=cancel
+        )
+    elapsed = time.perf_counter() - started
+    client.close()
+
+    # No repair round trip, and the rest of the stream was never waited for.
+    assert len(stub_server.requests) == 1
+    assert len(partials) == 1
+    assert elapsed < len(_ollama_lines()) * 0.05 / 2
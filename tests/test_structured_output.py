@@ -0,0 +1,210 @@
+import json
+
+import httpx
+import pytest
+from conftest import StubResponse, llm_output
+
+from cbse.engine.llm import GeminiProvider, OpenAIProvider
+from cbse.engine.llm.structured import gemini_response_schema, openai_strict_schema
+from cbse.engine.schema_validator import SchemaValidator
+
+OUTPUT = llm_output()
+MESSAGES = [
+    {"role": "system", "content": "You are the narrator."},
+    {"role": "user", "content": "Look around."},
+    {"role": "assistant", "content": "{}"},
+    {"role": "user", "content": "Go on."},
+]
+
+
+def _walk(schema):
+    if isinstance(schema, dict):
+        yield schema
+        for value in schema.values():
+            yield from _walk(value)
+    elif isinstance(schema, list):
+        for value in schema:
+            yield from _walk(value)
+
+
+def _openai_reply(req):
+    return StubResponse(body={"choices": [{"message": {"content": OUTPUT}}]})
+
+
+def _gemini_reply(req):
+    return StubResponse(body={"candidates": [{"content": {"parts": [{"text": OUTPUT}]}}]})
+
+
+def test_openai_strict_schema_is_closed_and_typed():
+    schema = openai_strict_schema(SchemaValidator.json_schema())
+    for node in _walk(schema):
+        if node.get("type") == "object":
+            assert node["additionalProperties"] is False
+            assert node["required"] == list(node["properties"])
+        assert "maxItems" not in node
+    value = schema["properties"]["state_updates"]["items"]["properties"]["value"]
+    assert {"type": "array", "items": {"type": "string"}} in value["anyOf"]
+    assert {"type": "null"} in value["anyOf"]
+
+
+def test_gemini_schema_uses_openapi_subset():
+    schema = gemini_response_schema(SchemaValidator.json_schema())
+    for node in _walk(schema):
+        assert "additionalProperties" not in node
+        if isinstance(node.get("type"), str):
+            assert node["type"].isupper()
+    assert schema["propertyOrdering"][0] == "narrative_markdown"
+    value = schema["properties"]["state_updates"]["items"]["properties"]["value"]
+    assert value["nullable"] is True
+    assert {"type": "STRING"} in value["anyOf"]
+
+
+def test_openai_requests_strict_json_schema(stub_server):
+    stub_server.route("/v1/chat/completions", _openai_reply)
+    client = OpenAIProvider(
+        model="m",
+        temperature=0,
+        max_output_tokens=10,
+        api_key="k",
+        base_url=f"{stub_server.url}/v1",
+        json_schema=SchemaValidator.json_schema(),
+    )
+    assert client.complete(MESSAGES) == OUTPUT
+    client.close()
+
+    response_format = stub_server.requests[0].body["response_format"]
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"]["strict"] is True
+    assert response_format["json_schema"]["schema"]["required"][0] == "narrative_markdown"
+
+
+def test_openai_falls_back_to_json_object(stub_server):
+    def handler(req):
+        if req.body["response_format"]["type"] == "json_schema":
+            return StubResponse(
+                body={"error": {"message": "Invalid parameter: response_format"}}, status=400
+            )
+        if req.body.get("stream"):
+            return StubResponse(
+                chunks=[
+                    f"data: {json.dumps({'choices': [{'delta': {'content': OUTPUT}}]})}\n\n",
+                    "data: [DONE]\n\n",
+                ],
+                content_type="text/event-stream",
+            )
+        return _openai_reply(req)
+
+    stub_server.route("/v1/chat/completions", handler)
+    client = OpenAIProvider(
+        model="m",
+        temperature=0,
+        max_output_tokens=10,
+        api_key="k",
+        base_url=f"{stub_server.url}/v1",
+        json_schema=SchemaValidator.json_schema(),
+    )
+    assert "".join(client.stream(MESSAGES)) == OUTPUT
+    assert client.output_mode == "json"
+    assert client.complete(MESSAGES) == OUTPUT
+    client.close()
+
+    formats = [req.body["response_format"]["type"] for req in stub_server.requests]
+    assert formats == ["json_schema", "json_object", "json_object"]
+
+
+def test_openai_keeps_mode_on_unrelated_errors(stub_server):
+    stub_server.route(
+        "/v1/chat/completions",
+        lambda req: StubResponse(
+            body={"error": {"message": "maximum context length exceeded"}}, status=400
+        ),
+    )
+    client = OpenAIProvider(
+        model="m",
+        temperature=0,
+        max_output_tokens=10,
+        api_key="k",
+        base_url=f"{stub_server.url}/v1",
+        json_schema=SchemaValidator.json_schema(),
+    )
+    with pytest.raises(httpx.HTTPStatusError):
+        client.complete(MESSAGES)
+    client.close()
+    assert client.output_mode == "schema"
+    assert len(stub_server.requests) == 1
+
+
+def test_gemini_sends_system_instruction_and_response_schema(stub_server):
+    stub_server.route("/v1beta/models/", _gemini_reply)
+    client = GeminiProvider(
+        model="m",
+        temperature=0,
+        max_output_tokens=10,
+        api_key="k",
+        base_url=f"{stub_server.url}/v1beta",
+        json_schema=SchemaValidator.json_schema(),
+    )
+    assert client.complete(MESSAGES) == OUTPUT
+    client.close()
+
+    body = stub_server.requests[0].body
+    assert body["systemInstruction"] == {"parts": [{"text": "You are the narrator."}]}
+    assert [content["role"] for content in body["contents"]] == ["user", "model", "user"]
+    assert body["generationConfig"]["responseMimeType"] == "application/json"
+    assert body["generationConfig"]["responseSchema"]["type"] == "OBJECT"
+
+
+def test_gemini_keeps_developer_message_as_system_instruction(stub_server):
+    stub_server.route("/v1beta/models/", _gemini_reply)
+    client = GeminiProvider(
+        model="m",
+        temperature=0,
+        max_output_tokens=10,
+        api_key="k",
+        base_url=f"{stub_server.url}/v1beta",
+    )
+    messages = [
+        MESSAGES[0],
+        {"role": "developer", "content": "World, rules and schema."},
+        *MESSAGES[1:],
+    ]
+    assert client.complete(messages) == OUTPUT
+    client.close()
+
+    body = stub_server.requests[0].body
+    assert body["systemInstruction"] == {
+        "parts": [{"text": "You are the narrator."}, {"text": "World, rules and schema."}]
+    }
+    assert [content["role"] for content in body["contents"]] == ["user", "model", "user"]
+
+
+def test_gemini_steps_down_to_plain_text(stub_server):
+    def handler(req):
+        config = req.body["generationConfig"]
+        if "responseSchema" in config:
+            return StubResponse(
+                body={"error": {"message": "responseSchema is not supported"}}, status=400
+            )
+        if "systemInstruction" in req.body:
+            return StubResponse(
+                body={"error": {"message": "Developer instruction is not enabled"}}, status=400
+            )
+        return _gemini_reply(req)
+
+    stub_server.route("/v1beta/models/", handler)
+    client = GeminiProvider(
+        model="m",
+        temperature=0,
+        max_output_tokens=10,
+        api_key="k",
+        base_url=f"{stub_server.url}/v1beta",
+        json_schema=SchemaValidator.json_schema(),
+    )
+    assert client.complete(MESSAGES) == OUTPUT
+    client.close()
+
+    assert client.output_mode == "text"
+    assert len(stub_server.requests) == 3
+    last = stub_server.requests[-1].body
+    assert "responseMimeType" not in last["generationConfig"]
+    assert last["contents"][0]["parts"][0]["text"].startswith("system: You are the narrator.")
@@ -0,0 +1,101 @@
+from pathlib import Path
+
+import pytest
+
+from cbse.engine.content_loader import ContentLoader
+from cbse.engine.llm import SyntheticProvider
+from cbse.engine.llm.synthetic_provider import Goal, condition_goals
+from cbse.engine.rules_engine import _safe_eval
+from cbse.engine.schema_validator import SchemaValidator
+
+GAMES = ["cdi_game", "cdi_game_v2", "mist_harbor", "polish_solider"]
+MESSAGES = [{"role": "user", "content": "continue"}]
+
+
+def _content(game_id: str):
+    base_dir = Path(__file__).resolve().parents[1]
+    return ContentLoader(base_dir / "games").load_game(game_id)
+
+
+@pytest.mark.parametrize("game_id", GAMES)
+def test_every_game_gets_valid_updates(game_id):
+    content = _content(game_id)
+    provider = SyntheticProvider(content.definition, content.triggers, seed=3)
+    validator = SchemaValidator()
+    paths = set()
+    for _ in range(300):
+        output = validator.parse(provider.complete(MESSAGES))
+        paths.update(update.path.split(".")[0] for update in output.state_updates)
+
+    stats = provider.stats()
+    assert stats["turns"] == 300
+    assert stats["rejected"] == 0
+    assert stats["updates"] >= 300
+    # Most of the game's variables get touched, not a hardcoded few.
+    assert len(paths) >= len(content.definition.variables) // 2
+
+
+def test_same_seed_replays_the_same_turns():
+    content = _content("cdi_game")
+    runs = []
+    for seed in (7, 7, 8):
+        provider = SyntheticProvider(content.definition, content.triggers, seed=seed)
+        runs.append([provider.complete(MESSAGES) for _ in range(50)])
+    assert runs[0] == runs[1]
+    assert runs[0] != runs[2]
+
+
+@pytest.mark.parametrize("ending", ["win", "lose"])
+def test_bias_steers_toward_the_chosen_ending(ending):
+    content = _content("mist_harbor")
+    provider = SyntheticProvider(
+        content.definition, content.triggers, seed=1, ending=ending, bias=0.9
+    )
+    for _ in range(2000):
+        provider.complete(MESSAGES)
+    stats = provider.stats()
+    other = "lose" if ending == "win" else "win"
+    assert stats.get(ending, 0) > 2 * stats.get(other, 0)
+
+    with pytest.raises(ValueError):
+        SyntheticProvider(content.definition, ending="draw")
+
+
+def test_update_policies_and_readonly_are_respected():
+    content = _content("mist_harbor")
+    variables = {var.id: var for var in content.definition.variables}
+    variables["clues"].rules.readonly = True
+    variables["suspicion"].rules.update_policy = "set_only"
+    variables["flags"].rules.update_policy = "inc_dec_only"
+    state = content.definition.initial_state
+    provider = SyntheticProvider(
+        content.definition, content.triggers, ending="win", bias=1.0, state=lambda: state
+    )
+    updates = [
+        update
+        for _ in range(500)
+        for update in SchemaValidator().parse(provider.complete(MESSAGES)).state_updates
+    ]
+    roots = {update.path.split(".")[0] for update in updates}
+    assert "clues" not in roots and "flags" not in roots
+    assert {update.op for update in updates if update.path == "suspicion"} == {"set"}
+    locations = {update.value for update in updates if update.path == "location"}
+    assert locations and locations <= set(variables["location"].enum_values)
+
+
+def test_condition_goals_and_compiled_conditions():
+    goals = condition_goals("flags.leak_ready == true and 6 <= clues or time.hour < -1")
+    assert set(goals) == {
+        Goal("flags.leak_ready", "==", True),
+        Goal("clues", ">=", 6),
+        Goal("time.hour", "<", -1),
+    }
+
+    state = {"clues": 6, "flags": {"leak_ready": True}, "time": {"hour": 3}}
+    assert _safe_eval("flags.leak_ready == true and clues >= 6", state) is True
+    assert _safe_eval("clues > 6 or time.hour < 4", state) is True
+    assert _safe_eval("not (1 < clues < 6)", state) is True
+    # Short-circuiting still skips names that do not exist.
+    assert _safe_eval("clues < 0 and missing.value == 1", state) is False
+    with pytest.raises(ValueError):
+        _safe_eval("missing == 1", state)